@@ -10,6 +10,11 @@ from flask_cors import CORS
 # from scramble_video_pro
 from werkzeug.utils import secure_filename
 from config import UPLOAD_FOLDER, OUTPUTS_FOLDER
+from worker_pool import (get_worker_pool, WorkerTaskError, scramble_photo_task,
+                         scramble_photo_pro_task, scramble_video_task,
+                         scramble_video_pro_task, audio_embed_task, audio_extract_task)
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from jobs import get_job_manager
 import secrets
 from dataclasses import dataclass
 from typing import List, Dict, Any, Tuple
@@ -307,6 +312,58 @@ def list_files():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+def submit_async_job(kind, task, task_args):
+    """Queue a task as a background job and return the 202 response for the route"""
+    job = get_job_manager().submit(kind, task, **task_args)
+    print(f"📥 FLASK: Queued {kind} job {job.id}")
+    print("="*60 + "\n")
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'state': job.state,
+        'status_url': f'/jobs/{job.id}',
+        'cancel_url': f'/jobs/{job.id}/cancel',
+        'result_url': f'/jobs/{job.id}/result'
+    }), 202
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List known jobs (finished jobs are kept for an hour)"""
+    return jsonify({'jobs': [job.to_dict() for job in get_job_manager().list_jobs()]}), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """State, frames processed / total, fps and ETA of a job"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    print(f"🛑 FLASK: Cancel requested for job {job_id} (state: {job.state})")
+    return jsonify(job.to_dict()), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Download a finished job's output (?format=webm for the WebM copy)"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    if job.state != 'done':
+        return jsonify({'error': f'Job {job_id} is {job.state}', 'state': job.state}), 409
+
+    path = job.result.get('output_path')
+    if request.args.get('format') == 'webm':
+        path = job.result.get('webm_path')
+    if not path or not os.path.exists(path):
+        return jsonify({'error': 'Result file is no longer available'}), 404
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), as_attachment=True)
+
 @app.route('/audio-stegano-embed', methods=['POST'])
 def audio_stegano_embed():
     """
@@ -345,37 +402,30 @@ def audio_stegano_embed():
             print(f"❌ FLASK ERROR: Input file not found at: {input_path}")
             return jsonify({'error': f'Input file {input_file} not found'}), 404
 
-        # Build command to run the audio steganography script
-        # audio_stegano.py requires: --mode embed --original <input> --output <output> --data <message>
-        cmd = [
-            PYTHON_CMD, 'audio_stegano.py',
-            '--mode', 'embed',
-            '--original', input_path,
-            '--output', output_path,
-            '--data', secret_message
-        ]
-
-        print(f"\n🚀 FLASK: Executing command:")
-        print(f"  Command: {' '.join(cmd)}")
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        print(f"\n📤 FLASK: Command execution completed")
-        print(f"  - Return code: {result.returncode}")
-        if result.stdout:
-            print(f"  - STDOUT: {result.stdout}")
-        if result.stderr:
-            print(f"  - STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            print(f"❌ FLASK ERROR: Audio steganography command failed")
+        # Run AudioSteganography.embed_data in a warm worker process
+        task_args = {
+            'original_path': input_path,
+            'output_path': output_path,
+            'data': secret_message
+        }
+
+        if data.get('async'):
+            return submit_async_job('audio-stegano-embed', audio_embed_task, task_args)
+
+        print(f"\n🚀 FLASK: Running audio embed in worker pool")
+
+        try:
+            result = get_worker_pool().run(audio_embed_task, timeout=60, **task_args)
+        except WorkerTaskError as e:
+            print(f"❌ FLASK ERROR: Audio steganography failed: {e}")
             return jsonify({
                 'error': 'Audio steganography failed',
-                'details': result.stderr,
-                'stdout': result.stdout,
-                'returncode': result.returncode
+                'details': e.details,
+                'type': e.exc_type
             }), 500
 
+        print(f"\n📤 FLASK: Worker {result['pid']} finished in {result['elapsed_s']:.2f}s")
+
         # Check if output file was created
         if not os.path.exists(output_path):
             print(f"❌ FLASK ERROR: Output file was not created at: {output_path}")
@@ -396,7 +446,7 @@ def audio_stegano_embed():
         
         return jsonify(response_data), 200
 
-    except subprocess.TimeoutExpired:
+    except FuturesTimeoutError:
         print(f"❌ FLASK ERROR: Audio steganography operation timed out")
         print("="*60 + "\n")
         return jsonify({'error': 'Audio steganography operation timed out'}), 500
@@ -454,50 +504,34 @@ def audio_stegano_extract():
         else:
             original_path = leaked_path  # Use leaked as original for extraction
 
-        cmd = [
-            PYTHON_CMD, 'audio_stegano.py',
-            '--mode', 'extract',
-            '--original', original_path,
-            '--modified', leaked_path
-        ]
+        print(f"\n🚀 FLASK: Running audio extraction in worker pool")
 
-        print(f"\n🚀 FLASK: Executing extraction command:")
-        print(f"  Command: {' '.join(cmd)}")
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        print(f"\n📤 FLASK: Command execution completed")
-        print(f"  - Return code: {result.returncode}")
-        if result.stdout:
-            print(f"  - STDOUT: {result.stdout}")
-        if result.stderr:
-            print(f"  - STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            print(f"❌ FLASK ERROR: Audio extraction command failed")
+        try:
+            result = get_worker_pool().run(audio_extract_task, timeout=60,
+                                           original_path=original_path,
+                                           modified_path=leaked_path)
+        except WorkerTaskError as e:
+            print(f"❌ FLASK ERROR: Audio extraction failed: {e}")
             return jsonify({
                 'success': False,
                 'error': 'Audio extraction failed',
-                'details': result.stderr,
+                'details': e.details,
                 'extracted_code': None
             }), 500
 
-        # Parse the extracted code from stdout
-        extracted_code = None
-        if result.stdout:
-            # Look for "Extracted data:" in the output
-            for line in result.stdout.split('\n'):
-                if 'Extracted data:' in line or 'Data:' in line:
-                    extracted_code = line.split(':', 1)[1].strip()
-                    break
-        
-        if not extracted_code:
-            # Try to get the last non-empty line as the extracted code
-            lines = [l.strip() for l in result.stdout.split('\n') if l.strip()]
-            if lines:
-                extracted_code = lines[-1]
-        
-        print(f"🔑 FLASK: Extracted code: {extracted_code or 'None'}")
+        print(f"\n📤 FLASK: Worker {result['pid']} finished in {result['elapsed_s']:.2f}s")
+
+        extracted_code = result['extracted_data']
+        if extracted_code is None:
+            print(f"❌ FLASK ERROR: No data could be extracted")
+            return jsonify({
+                'success': False,
+                'error': 'Audio extraction failed',
+                'details': 'No valid message decoded',
+                'extracted_code': None
+            }), 500
+
+        print(f"🔑 FLASK: Extracted code: {extracted_code}")
 
         response_data = {
             'success': bool(extracted_code),
@@ -511,7 +545,7 @@ def audio_stegano_extract():
         
         return jsonify(response_data), 200
 
-    except subprocess.TimeoutExpired:
+    except FuturesTimeoutError:
         print(f"❌ FLASK ERROR: Audio extraction operation timed out")
         print("="*60 + "\n")
         return jsonify({
@@ -560,10 +594,7 @@ def scramble_photo():
         mode = data.get('mode', 'scramble')
         algorithm = data.get('algorithm', 'position')
         percentage = data.get('percentage', 100)
-        noise_seed = data.get('noise_seed')
         noise_intensity = data.get('noise_intensity')
-        noise_mode = data.get('noise_mode')
-        noise_prng = data.get('noise_prng')
         creator = data.get('creator')
         user_id = data.get('user_id')
         user_name = data.get('username')
@@ -607,27 +638,21 @@ def scramble_photo():
         
         print(f"✅ FLASK: Input file exists")
 
-        # Build command based on algorithm
-        cmd = []
-        
-        print(f"\n🔧 FLASK: Building command for algorithm: {algorithm}")
+        # Build task arguments based on algorithm
+        print(f"\n🔧 FLASK: Building task for algorithm: {algorithm}")
         rows = data.get('rows', 6)
         cols = data.get('cols', 6)
-        cmd = [
-                PYTHON_CMD, 'scramble_photo.py',
-                '--input', input_path,
-                '--output', output_path,
-                '--seed', str(seed),
-                '--rows', str(rows),
-                '--cols', str(cols),
-                '--mode', mode,
-                '--percentage', str(percentage),
-                '--noise_seed', str(noise_seed),
-                '--noise_intensity', str(noise_intensity),
-                '--noise_mode', str(noise_mode),
-                
-            ]
-        
+        task_args = {
+            'input_path': input_path,
+            'output_path': output_path,
+            'seed': int(seed),
+            'rows': int(rows),
+            'cols': int(cols),
+            'mode': mode,
+            'percentage': int(percentage),
+            'noise_intensity': int(noise_intensity or 0),
+        }
+
         # if algorithm == 'position':
         #     # Position scrambling (default tile shuffling)
         #     rows = data.get('rows', 6)
@@ -732,33 +757,30 @@ def scramble_photo():
         #     print(f"❌ FLASK ERROR: Unknown algorithm: {algorithm}")
         #     return jsonify({'error': f'Unknown algorithm: {algorithm}'}), 400
 
-        print(f"\n🚀 FLASK: Executing command:")
-        print(f"  Command: {' '.join(cmd)}")
-        
-        # Execute the scrambling command
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        print(f"\n📤 FLASK: Command execution completed")
-        print(f"  - Return code: {result.returncode}")
-        if result.stdout:
-            print(f"  - STDOUT: {result.stdout}")
-        if result.stderr:
-            print(f"  - STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            print(f"❌ FLASK ERROR: Scrambling command failed")
+        if data.get('async'):
+            return submit_async_job('scramble-photo', scramble_photo_task, task_args)
+
+        print(f"\n🚀 FLASK: Running scramble_photo in worker pool:")
+        print(f"  Args: {json.dumps(task_args)}")
+
+        # Execute the scrambling task
+        try:
+            result = get_worker_pool().run(scramble_photo_task, timeout=60, **task_args)
+        except WorkerTaskError as e:
+            print(f"❌ FLASK ERROR: Scrambling failed: {e}")
             return jsonify({
                 'error': 'Scrambling failed',
-                'details': result.stderr,
-                'stdout': result.stdout,
-                'returncode': result.returncode
+                'details': e.details,
+                'type': e.exc_type
             }), 500
 
+        print(f"\n📤 FLASK: Worker {result['pid']} finished in {result['elapsed_s']:.2f}s")
+
         # Check if output file was created
         if not os.path.exists(output_path):
             print(f"❌ FLASK ERROR: Output file was not created at: {output_path}")
             return jsonify({'error': 'Output file was not created'}), 500
-        
+
         print(f"✅ FLASK: Output file created successfully at: {output_path}")
 
         response_data = {
@@ -778,7 +800,7 @@ def scramble_photo():
         
         return jsonify(response_data), 200
 
-    except subprocess.TimeoutExpired:
+    except FuturesTimeoutError:
         print(f"❌ FLASK ERROR: Scrambling operation timed out")
         print("="*60 + "\n")
         return jsonify({'error': 'Scrambling operation timed out'}), 500
@@ -837,7 +859,8 @@ def unscramble_photo():
                 'noise_seed': params.get('noise_seed'),
                 'noise_intensity': params.get('noise_intensity'),
                 'noise_mode': params.get('noise_mode'),
-                'noise_prng': params.get('noise_prng')
+                'noise_prng': params.get('noise_prng'),
+                'async': data.get('async')
             }
 
             # Remove None values
@@ -930,36 +953,23 @@ def scramble_video():
         
         print(f"✅ FLASK: Input file exists")
 
-        # Build command based on algorithm
-        cmd = []
-        
-        print(f"\n🔧 FLASK: Building command for algorithm: {algorithm}")
+        # Build task arguments based on algorithm
+        print(f"\n🔧 FLASK: Building task for algorithm: {algorithm}")
         rows = data.get('rows', 6)
         cols = data.get('cols', 6)
+        task_args = {
+            'input_path': input_path,
+            'output_path': output_path,
+            'seed': int(seed),
+            'rows': int(rows),
+            'cols': int(cols),
+            'mode': mode,
+        }
         if percentage < 100:
             print("⚠️  FLASK WARNING: Partial percentage scrambling for videos may lead to unexpected results.")
-            cmd = [
-                PYTHON_CMD, 'scramble_video.py',
-                '--input', input_path,
-                '--output', output_path,
-                '--seed', str(seed),
-                '--rows', str(rows),
-                '--cols', str(cols),
-                '--mode', mode,
-                '--percentage', str(percentage)
-            ]
+            task_args['percentage'] = int(percentage)
         else:
             print("✅ FLASK: Full percentage scrambling for videos.")
-            cmd = [
-                PYTHON_CMD, 'scramble_video.py',
-                '--input', input_path,
-                '--output', output_path,
-                '--seed', str(seed),
-                '--rows', str(rows),
-                '--cols', str(cols),
-                '--mode', mode,
-                
-            ]
         # if algorithm == 'position':
         #     # Position scrambling (default tile shuffling)
         #     rows = data.get('rows', 6)
@@ -1058,33 +1068,30 @@ def scramble_video():
         #     print(f"❌ FLASK ERROR: Unknown algorithm: {algorithm}")
         #     return jsonify({'error': f'Unknown algorithm: {algorithm}'}), 400
 
-        print(f"\n🚀 FLASK: Executing command:")
-        print(f"  Command: {' '.join(cmd)}")
-        
-        # Execute the scrambling command with longer timeout for video processing
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        
-        print(f"\n📤 FLASK: Command execution completed")
-        print(f"  - Return code: {result.returncode}")
-        if result.stdout:
-            print(f"  - STDOUT: {result.stdout}")
-        if result.stderr:
-            print(f"  - STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            print(f"❌ FLASK ERROR: Scrambling command failed")
+        if data.get('async'):
+            return submit_async_job('scramble-video', scramble_video_task, dict(task_args, webm=True))
+
+        print(f"\n🚀 FLASK: Running scramble_video in worker pool:")
+        print(f"  Args: {json.dumps(task_args)}")
+
+        # Execute the scrambling task with longer timeout for video processing
+        try:
+            result = get_worker_pool().run(scramble_video_task, timeout=300, **task_args)
+        except WorkerTaskError as e:
+            print(f"❌ FLASK ERROR: Scrambling failed: {e}")
             return jsonify({
                 'error': 'Scrambling failed',
-                'details': result.stderr,
-                'stdout': result.stdout,
-                'returncode': result.returncode
+                'details': e.details,
+                'type': e.exc_type
             }), 500
 
+        print(f"\n📤 FLASK: Worker {result['pid']} finished in {result['elapsed_s']:.2f}s")
+
         # Check if output file was created
         if not os.path.exists(output_path):
             print(f"❌ FLASK ERROR: Output file was not created at: {output_path}")
             return jsonify({'error': 'Output file was not created'}), 500
-        
+
         print(f"✅ FLASK: Output file created successfully at: {output_path}")
 
         # Create WebM version if output is a video and not already WebM
@@ -1138,7 +1145,7 @@ def scramble_video():
         
         return jsonify(response_data), 200
 
-    except subprocess.TimeoutExpired:
+    except FuturesTimeoutError:
         print(f"❌ FLASK ERROR: Scrambling operation timed out")
         print("="*60 + "\n")
         return jsonify({'error': 'Scrambling operation timed out'}), 500
@@ -1197,7 +1204,8 @@ def unscramble_video():
                 'rows': params.get('rows'),
                 'cols': params.get('cols'),
                 'max_hue_shift': params.get('max_hue_shift'),
-                'max_intensity_shift': params.get('max_intensity_shift')
+                'max_intensity_shift': params.get('max_intensity_shift'),
+                'async': data.get('async')
             }
             # Remove None values
             normalized = {k: v for k, v in normalized.items() if v is not None}
@@ -1252,10 +1260,8 @@ def scramble_photo_pro():
         mode = data.get('mode', 'scramble')
         # algorithm = data.get('algorithm', 'position')
         percentage = data.get('percentage', 100)
-        noise_seed = data.get('noise_seed')
         noise_intensity = data.get('noise_intensity')
         # noise_mode = data.get('noise_mode')
-        noise_prng = data.get('noise_prng')
         creator = data.get('creator')
         user_id = data.get('user_id')
         user_name = data.get('username')
@@ -1301,56 +1307,45 @@ def scramble_photo_pro():
         
         print(f"✅ FLASK: Input file exists")
 
-        # Build command based on algorithm
-        cmd = []
-        
-        print(f"\n🔧 FLASK: Building command for algorithm: HPF")
-        
+        # Build task arguments based on algorithm
+        print(f"\n🔧 FLASK: Building task for algorithm: HPF")
+
         # if algorithm == 'position':
         # Position scrambling (default tile shuffling)
         rows = data.get('rows', 6)
         cols = data.get('cols', 6)
         print(f"  - Position algorithm: rows={rows}, cols={cols}")
-        cmd = [
-            PYTHON_CMD, 'scramble_photo_pro.py',
-            '--input', input_path,
-            '--output', output_path,
-            '--seed', str(seed),
-            '--rows', str(rows),
-            '--cols', str(cols),
-            '--mode', mode,
-            '--blur-ksize', str(percentage),
-            '--noise_seed', str(noise_seed),
-            '--noise_intensity', str(noise_intensity),
-            # '--noise_mode', str(noise_mode),
-            # '--algorithm', 'hpf',
-            '--watermark-rows', '2'
-            
-        ]
-       
+        task_args = {
+            'input_path': input_path,
+            'output_path': output_path,
+            'seed': int(seed),
+            'rows': int(rows),
+            'cols': int(cols),
+            'mode': mode,
+            'blur_ksize': int(percentage),
+            'noise_intensity': int(noise_intensity or 0),
+            'watermark_rows': 2,
+        }
 
-        print(f"\n🚀 FLASK: Executing command:")
-        print(f"  Command: {' '.join(cmd)}")
-        
-        # Execute the scrambling command
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-        
-        print(f"\n📤 FLASK: Command execution completed")
-        print(f"  - Return code: {result.returncode}")
-        if result.stdout:
-            print(f"  - STDOUT: {result.stdout}")
-        if result.stderr:
-            print(f"  - STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            print(f"❌ FLASK ERROR: Scrambling command failed")
+        if data.get('async'):
+            return submit_async_job('scramble-photo-pro', scramble_photo_pro_task, task_args)
+
+        print(f"\n🚀 FLASK: Running scramble_photo_pro in worker pool:")
+        print(f"  Args: {json.dumps(task_args)}")
+
+        # Execute the scrambling task
+        try:
+            result = get_worker_pool().run(scramble_photo_pro_task, timeout=60, **task_args)
+        except WorkerTaskError as e:
+            print(f"❌ FLASK ERROR: Scrambling failed: {e}")
             return jsonify({
                 'error': 'Scrambling failed',
-                'details': result.stderr,
-                'stdout': result.stdout,
-                'returncode': result.returncode
+                'details': e.details,
+                'type': e.exc_type
             }), 500
 
+        print(f"\n📤 FLASK: Worker {result['pid']} finished in {result['elapsed_s']:.2f}s")
+
         # Check if output file was created
         if not os.path.exists(output_path):
             print(f"❌ FLASK ERROR: Output file was not created at: {output_path}")
@@ -1375,7 +1370,7 @@ def scramble_photo_pro():
         
         return jsonify(response_data), 200
 
-    except subprocess.TimeoutExpired:
+    except FuturesTimeoutError:
         print(f"❌ FLASK ERROR: Scrambling operation timed out")
         print("="*60 + "\n")
         return jsonify({'error': 'Scrambling operation timed out'}), 500
@@ -1443,7 +1438,8 @@ def unscramble_photo_pro():
                 'wm-placement': params.get('wm_placement', 'custom'),
                 'wm-max-margin': params.get('wm_max_margin', 30),
                 'wm-min-margin': params.get('wm_min_margin', 5),
-                'watermark_rows': params.get('watermark_rows', 2)
+                'watermark_rows': params.get('watermark_rows', 2),
+                'async': data.get('async')
             }
 
             # Remove None values
@@ -1542,65 +1538,63 @@ def scramble_video_pro():
         
         print(f"✅ FLASK: Input file exists")
 
-        # Build command based on algorithm
-        cmd = []
-        
-        # print(f"\n🔧 FLASK: Building command for algorithm: {algorithm}")
-    
+        # Build task arguments based on algorithm
+        # print(f"\n🔧 FLASK: Building task for algorithm: {algorithm}")
+
         # Position scrambling (default tile shuffling)
         rows = data.get('rows', 6)
         cols = data.get('cols', 6)
         print(f"  - Position algorithm: rows={rows}, cols={cols}")
         # if percentage < 100:
             # print("⚠️  FLASK WARNING: Partial percentage scrambling for videos may lead to unexpected results.")
-        cmd = [
-            PYTHON_CMD, 'scramble_video_pro.py',
-
-            # HPF with all options
-            # -i video.mp4 
-            # -o hpf_scrambled.mp4 
-            # --algorithm hpf 
-            # --rows 4 
-            # --cols 4 
-            # --blur-ksize 21 
-            # --watermark-rows 3, 
-            # --seed 7777
-            '-i', input_path,
-            '-o', output_path,
-            '--algorithm', 'hpf',
-            '--seed', str(seed),
-            '--rows', str(rows),
-            '--cols', str(cols),
-            '--mode', mode,
-            '--watermark-rows', '2',
-            '--blur-ksize', str(blur_ksize if blur_ksize is not None else 50),
-            # # '--percentage', str(percentage if percentage is not None else 50),
-            # # '--mode', 'scramble'
-        ]
-
-
-        print(f"\n🚀 FLASK: Executing command:")
-        print(f"  Command: {' '.join(cmd)}")
-        
-        # Execute the scrambling command with longer timeout for video processing
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        
-        print(f"\n📤 FLASK: Command execution completed")
-        print(f"  - Return code: {result.returncode}")
-        if result.stdout:
-            print(f"  - STDOUT: {result.stdout}")
-        if result.stderr:
-            print(f"  - STDERR: {result.stderr}")
-        
-        if result.returncode != 0:
-            print(f"❌ FLASK ERROR: Scrambling command failed")
+        task_args = {
+            'input_path': input_path,
+            'output_path': output_path,
+            'algorithm': 'hpf',
+            'seed': int(seed),
+            'rows': int(rows),
+            'cols': int(cols),
+            'mode': mode,
+            'watermark_rows': 2,
+            'blur_ksize': int(blur_ksize if blur_ksize is not None else 50),
+            'lpf_mode': data.get('lpf_mode', 'gaussian'),
+        }
+
+        if mode == 'unscramble':
+            # Buyers share one cached clean unscramble; only their marker overlay differs
+            task_args['cache'] = bool(data.get('cache', True))
+            if data.get('wm-id') is not None:
+                task_args.update({
+                    'wm_id': int(data['wm-id']),
+                    'wm_alpha': float(data.get('wm-alpha', 0.025)),
+                    'wm_scale': float(data.get('wm-scale', 1.0)),
+                    'wm_count': int(data.get('wm-numbers', 4)),
+                    'wm_duration': int(data.get('wm-duration', 10)),
+                    'wm_placement': data.get('wm-placement', 'custom'),
+                    'wm_min_margin': float(data.get('wm-min-margin', 5)),
+                    'wm_max_margin': float(data.get('wm-max-margin', 30)),
+                })
+                print(f"  - Marker overlay: wm_id={task_args['wm_id']}")
+
+        if data.get('async'):
+            return submit_async_job('scramble-video-pro', scramble_video_pro_task, dict(task_args, webm=True))
+
+        print(f"\n🚀 FLASK: Running scramble_video_pro in worker pool:")
+        print(f"  Args: {json.dumps(task_args)}")
+
+        # Execute the scrambling task with longer timeout for video processing
+        try:
+            result = get_worker_pool().run(scramble_video_pro_task, timeout=300, **task_args)
+        except WorkerTaskError as e:
+            print(f"❌ FLASK ERROR: Scrambling failed: {e}")
             return jsonify({
                 'error': 'Scrambling failed',
-                'details': result.stderr,
-                'stdout': result.stdout,
-                'returncode': result.returncode
+                'details': e.details,
+                'type': e.exc_type
             }), 500
 
+        print(f"\n📤 FLASK: Worker {result['pid']} finished in {result['elapsed_s']:.2f}s")
+
         # Check if output file was created
         if not os.path.exists(output_path):
             print(f"❌ FLASK ERROR: Output file was not created at: {output_path}")
@@ -1647,6 +1641,8 @@ def scramble_video_pro():
             'seed': seed,
             'download_url': f'/download/{output_file}'
         }
+        if 'cache_hit' in result:
+            response_data['cache_hit'] = result['cache_hit']
         
         # Add WebM download URL if available
         if webm_file:
@@ -1659,7 +1655,7 @@ def scramble_video_pro():
         
         return jsonify(response_data), 200
 
-    except subprocess.TimeoutExpired:
+    except FuturesTimeoutError:
         print(f"❌ FLASK ERROR: Scrambling operation timed out")
         print("="*60 + "\n")
         return jsonify({'error': 'Scrambling operation timed out'}), 500
@@ -1725,7 +1721,8 @@ def unscramble_video_pro():
                 'wm-placement': params.get('wm_placement', 'custom'),
                 'wm-max-margin': params.get('wm_max_margin', 30),
                 'wm-min-margin': params.get('wm_min_margin', 5),
-                'watermark_rows': params.get('watermark_rows', 2)
+                'watermark_rows': params.get('watermark_rows', 2),
+                'async': data.get('async')
             }
 
             # Remove None values
@@ -2177,6 +2174,10 @@ def generate_watermark_route():
 if __name__ == '__main__':
     # Start auto-cleanup worker
     start_cleanup_worker()
+
+    # Start the media worker processes now so the first requests don't pay for imports
+    worker_pids = get_worker_pool().warm_up()
+    print(f"✅ Worker pool ready: {len(worker_pids)} process(es)")
     
     print("\n" + "="*60)
     print("🚀 Combined Media Processing & TTS Server")
@@ -2190,6 +2191,10 @@ if __name__ == '__main__':
     print("    POST /scramble - Scramble image/video")
     print("    POST /unscramble - Unscramble image/video")
     print("    GET  /outputs/<filename> - Download processed file")
+    print("\n  Jobs (send \"async\": true to a media route):")
+    print("    GET  /jobs/<id> - Job state, progress, fps and ETA")
+    print("    POST /jobs/<id>/cancel - Cancel a queued or running job")
+    print("    GET  /jobs/<id>/result - Download a finished job's output")
     print("\n  TTS (Text-to-Speech):")
     print("    GET  /tts/health - TTS health check")
     print("    GET  /tts/voices - List available voices")
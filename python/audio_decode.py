@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Decode audio inputs to int16 PCM with ffmpeg, through a decoded-PCM cache.
+
+The audio scripts each carried a convert_to_wav() that ran ffmpeg into a
+temp WAV file and read it back, for every non-WAV input on every request
+(so an extract against a popular mp3 original decoded it again each time).
+decode_audio() pipes `ffmpeg -f s16le` straight into a NumPy buffer instead,
+and open_audio() keeps what it decodes in PcmCache: a size-bounded on-disk
+LRU (disk_cache.py) keyed by the SHA-256 of the input plus the conversion
+params.  Entries are 16-bit WAV files, so a hit is just a WavReader mapping.
+
+WAV inputs are not converted, as before: they are mapped as they are.
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+import time
+from typing import Union
+
+import numpy as np
+
+from config import PCM_CACHE_FOLDER, PCM_CACHE_MAX_BYTES
+from disk_cache import DiskLRUCache, file_digest
+from wav_io import WavParams, WavReader, WavWriter
+
+# What convert_to_wav produced: 44.1 kHz mono (steganography works better with mono)
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CHANNELS = 1
+
+# Bump when the meaning of a cached file changes (e.g. the decode command)
+CACHE_FORMAT = 1
+
+DECODE_TIMEOUT_S = 120
+
+
+class PcmCache(DiskLRUCache):
+    """Size-bounded on-disk LRU of decoded 16-bit PCM (as WAV files)."""
+
+    label = "PCM cache"
+
+    def __init__(self, cache_dir: str = PCM_CACHE_FOLDER,
+                 max_bytes: int = PCM_CACHE_MAX_BYTES):
+        super().__init__(cache_dir, max_bytes, ".wav")
+
+    def key(self, input_path: str, sample_rate: int = DEFAULT_SAMPLE_RATE,
+            channels: int = DEFAULT_CHANNELS) -> str:
+        """Content address for decoding input_path at these params."""
+        parts = [f"v{CACHE_FORMAT}", file_digest(input_path),
+                 f"rate={int(sample_rate)}", f"channels={int(channels)}"]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def decode_audio(input_path: str, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 channels: int = DEFAULT_CHANNELS,
+                 timeout: float = DECODE_TIMEOUT_S) -> np.ndarray:
+    """Interleaved int16 PCM of any audio file ffmpeg can read, resampled and remixed."""
+    cmd = [
+        'ffmpeg', '-v', 'error',
+        '-i', input_path,
+        '-vn',
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ar', str(int(sample_rate)),
+        '-ac', str(int(channels)),
+        '-'
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise RuntimeError(
+            "FFmpeg not found. Please install ffmpeg:\n"
+            "  Ubuntu/Debian: sudo apt-get install ffmpeg\n"
+            "  macOS: brew install ffmpeg"
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Audio decoding timed out (>{timeout:g} seconds)")
+
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg decoding failed: {result.stderr.decode('utf-8', 'replace')}")
+    pcm = np.frombuffer(result.stdout, dtype="<i2")
+    return pcm[:len(pcm) - len(pcm) % channels]
+
+
+def open_audio(input_path: str, sample_rate: int = DEFAULT_SAMPLE_RATE,
+               channels: int = DEFAULT_CHANNELS,
+               cache: Union[PcmCache, bool, None] = None) -> WavReader:
+    """
+    WavReader over an audio file.
+
+    WAV files are mapped as they are; anything else is decoded to
+    sample_rate / channels int16 PCM, read from the cache if the same file
+    was decoded before.  cache=False decodes without the cache (for one-off
+    inputs such as leaked copies); None uses the default PcmCache.
+    """
+    if input_path.lower().endswith('.wav'):
+        return WavReader(input_path)
+
+    name = os.path.basename(input_path)
+    if cache is False:
+        print(f"🔄 Decoding {name} with ffmpeg...")
+        return WavReader.from_samples(decode_audio(input_path, sample_rate, channels),
+                                      sample_rate, channels, path=input_path)
+
+    cache = cache if isinstance(cache, PcmCache) else PcmCache()
+    key = cache.key(input_path, sample_rate, channels)
+    cached = cache.get(key)
+    if cached is not None:
+        try:
+            reader = WavReader(cached)
+            print(f"⚡ PCM cache hit for {name}: {key[:12]}…")
+            return reader
+        except FileNotFoundError:
+            pass  # evicted by another worker since get()
+
+    print(f"🔄 Decoding {name} with ffmpeg (PCM cache miss: {key[:12]}…)")
+    t0 = time.perf_counter()
+    samples = decode_audio(input_path, sample_rate, channels)
+    tmp_path = cache.temp_path(key)
+    try:
+        params = WavParams(channels, 2, sample_rate, len(samples) // channels,
+                           "NONE", "not compressed")
+        with WavWriter(tmp_path, params) as writer:
+            writer.write(samples)
+        if cache.put(key, tmp_path) is None:
+            print("PCM cache: entry larger than the cache budget, not stored")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"  decoded {len(samples) / channels / sample_rate:.1f}s of audio "
+          f"in {time.perf_counter() - t0:.2f}s")
+    return WavReader.from_samples(samples, sample_rate, channels, path=input_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the decoded-PCM cache.")
+    parser.add_argument("--cache-dir", default=PCM_CACHE_FOLDER,
+                        help=f"Cache directory (default: {PCM_CACHE_FOLDER})")
+    parser.add_argument("--max-gb", type=float, default=PCM_CACHE_MAX_BYTES / 1024 ** 3,
+                        help="Size budget in GB used by --evict")
+    parser.add_argument("--evict", action="store_true", help="Evict down to the size budget")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached entry")
+    args = parser.parse_args()
+
+    cache = PcmCache(args.cache_dir, int(args.max_gb * 1024 ** 3))
+    if args.clear:
+        cache.clear()
+    elif args.evict:
+        cache.evict()
+
+    entries = cache.entries()
+    for path, size, mtime in entries:
+        print(f"{os.path.basename(path)}  {size / 1024 ** 2:9.1f} MB  "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(mtime))}")
+    print(f"{len(entries)} entries, {sum(s for _, s, _ in entries) / 1024 ** 2:.1f} MB "
+          f"/ {cache.max_bytes / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
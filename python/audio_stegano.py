@@ -1,79 +1,16 @@
 import numpy as np
-import wave
 import hashlib
 import struct
 import argparse
 import sys
 import os
-import tempfile
-import subprocess
 
-def convert_to_wav(input_path):
-    """
-    Convert any audio format to WAV using ffmpeg.
-    Returns the path to the converted WAV file (temporary file).
-    If already WAV, returns the original path.
-    """
-    # Check if already a WAV file
-    if input_path.lower().endswith('.wav'):
-        return input_path, False  # Return original path, not converted
-    
-    print(f"🔄 Converting {os.path.basename(input_path)} to WAV format...")
-    
-    # Create temporary WAV file
-    temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    temp_wav_path = temp_wav.name
-    temp_wav.close()
-    
-    try:
-        # Use ffmpeg to convert to WAV
-        # -ar 44100: Sample rate 44.1kHz
-        # -ac 1: Mono (1 channel) - steganography works better with mono
-        # -sample_fmt s16: 16-bit signed integer samples
-        cmd = [
-            'ffmpeg',
-            '-i', input_path,
-            '-ar', '44100',
-            '-ac', '1',
-            '-sample_fmt', 's16',
-            '-y',  # Overwrite output file
-            temp_wav_path
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if result.returncode != 0:
-            # Clean up temp file
-            try:
-                os.unlink(temp_wav_path)
-            except:
-                pass
-            raise RuntimeError(f"FFmpeg conversion failed: {result.stderr}")
-        
-        print(f"✅ Converted to WAV: {temp_wav_path}")
-        return temp_wav_path, True  # Return temp path, was converted
-        
-    except FileNotFoundError:
-        try:
-            os.unlink(temp_wav_path)
-        except:
-            pass
-        raise RuntimeError(
-            "FFmpeg not found. Please install ffmpeg:\n"
-            "  Ubuntu/Debian: sudo apt-get install ffmpeg\n"
-            "  macOS: brew install ffmpeg"
-        )
-    except subprocess.TimeoutExpired:
-        try:
-            os.unlink(temp_wav_path)
-        except:
-            pass
-        raise RuntimeError("Audio conversion timed out (>60 seconds)")
+from audio_decode import open_audio
+from wav_io import WavWriter, iter_chunks
+
+# Blocks modulated or correlated per step in embed_data/extract_data
+# (~340k samples at 44.1 kHz)
+_CHUNK_BLOCKS = 256
 
 class AudioSteganography:
     def __init__(self, seed=42):
@@ -125,68 +62,100 @@ class AudioSteganography:
         
         return block_size, pn_sequence
     
-    def _modulate_block(self, block, bit_value, pn_sequence):
+    def _block_signs(self, encoding):
+        """
+        Bipolar bit (0 -> -1, 1 -> +1) carried by every block: each encoding
+        bit is spread over blocks_per_bit consecutive blocks.
         """
-        Modulate a block to encode a bit using PN sequence spreading.
+        return np.repeat(np.where(np.asarray(encoding) == 1, 1, -1), self.blocks_per_bit)
+    
+    def _modulation_envelope(self, block_signs, pn_sequence):
+        """
+        Gain of every sample of the given blocks, as (num_blocks, block_size).
+        
+        A block carrying bipolar bit s is scaled by 1 + s * strength * PN, so
+        a run of blocks is modulated in one multiply.
         
         Args:
-            block: Audio block (numpy array, float64)
-            bit_value: 0 or 1
-            pn_sequence: PN sequence to use for modulation
+            block_signs: Bipolar bit per block (see _block_signs)
+            pn_sequence: PN sequence, one chip per block sample
         
         Returns:
-            Modulated block (float64)
+            Per-sample gains (float64)
         """
-        # Convert bit to bipolar: 0 -> -1, 1 -> +1
-        bipolar_bit = 1 if bit_value == 1 else -1
-        
-        # Apply PN sequence modulation
         # For bit=1: boost volume slightly with PN pattern
         # For bit=0: reduce volume slightly with PN pattern
-        modulation = bipolar_bit * self.modulation_strength * pn_sequence[:len(block)]
-        
-        # Apply modulation: modified = original * (1 + modulation)
-        modulated = block * (1.0 + modulation)
-        
-        return modulated
+        modulation = (block_signs * self.modulation_strength)[:, None] * pn_sequence[None, :]
+        return 1.0 + modulation
     
-    def _compute_block_correlation(self, original_block, modified_block, pn_sequence):
+    def _block_correlations(self, original_data, modified_data, block_size, pn_sequence):
         """
-        Compute correlation between original and modified blocks to extract bit.
+        Correlate every block's watermark signal with the PN sequence.
         
         We embedded: modified = original * (1 + bipolar_bit * strength * PN)
         So: diff = modified - original = original * bipolar_bit * strength * PN
         
-        To extract: correlate (diff / original) with PN
-        This gives us: bipolar_bit * strength (positive or negative)
+        To extract: correlate (diff / original) with PN per block, which gives
+        bipolar_bit * strength (positive or negative).  The division keeps the
+        sign of original; dividing by |original| would flip the chip wherever
+        the waveform is negative and average the bit away on any zero-mean
+        audio.  Both signals are viewed as (num_blocks, block_size) and
+        reduced _CHUNK_BLOCKS blocks at a time into reused float64 scratch
+        rows, so the temporaries stay small on whole tracks.
         
         Args:
-            original_block: Original audio block
-            modified_block: Modified audio block
+            original_data: Original audio samples (int16, e.g. a WavReader map)
+            modified_data: Modified audio samples (int16), same length
+            block_size: Samples per block
             pn_sequence: PN sequence used for modulation
         
         Returns:
-            Extracted bit (0 or 1) and confidence score
+            (bits, confidences): uint8 bit per block (positive correlation ->
+            1) and |correlation|
         """
-        # Compute the difference (watermark signal)
-        diff = modified_block.astype(np.float64) - original_block.astype(np.float64)
-        original = original_block.astype(np.float64)
+        num_blocks = len(original_data) // block_size
+        original_blocks = original_data[:num_blocks * block_size].reshape(num_blocks, block_size)
+        modified_blocks = modified_data[:num_blocks * block_size].reshape(num_blocks, block_size)
+        pn = pn_sequence.astype(np.float64)
+        correlations = np.empty(num_blocks, dtype=np.float64)
+        
+        # Scratch rows reused by every chunk
+        rows = min(_CHUNK_BLOCKS, num_blocks)
+        original_rows = np.empty((rows, block_size), dtype=np.float64)
+        normalized_diff = np.empty((rows, block_size), dtype=np.float64)
+        scale = np.empty((rows, block_size), dtype=np.float64)
         
-        # Compute normalized difference: (modified - original) / original
         # To avoid division by zero, add small epsilon
         epsilon = 1e-6
-        normalized_diff = diff / (np.abs(original) + epsilon)
-        
-        # Correlate with PN sequence to detect the embedded bit
-        pn = pn_sequence[:len(normalized_diff)]
-        correlation = np.mean(normalized_diff * pn)
-        
-        # Positive correlation -> bit 1 (bipolar = +1)
-        # Negative correlation -> bit 0 (bipolar = -1)
-        bit = 1 if correlation > 0 else 0
-        confidence = abs(correlation)
-        
-        return bit, confidence
+        for start, stop in iter_chunks(num_blocks, _CHUNK_BLOCKS):
+            n = stop - start
+            original, diff, denominator = original_rows[:n], normalized_diff[:n], scale[:n]
+            np.copyto(original, original_blocks[start:stop])
+            np.subtract(modified_blocks[start:stop], original, out=diff)
+            diff *= np.sign(original, out=denominator)
+            np.abs(original, out=denominator)
+            denominator += epsilon
+            diff /= denominator
+            # Mean of normalized_diff * PN for every block in one product
+            correlations[start:start + n] = diff @ pn
+        correlations /= block_size
+        
+        return (correlations > 0).astype(np.uint8), np.abs(correlations)
+    
+    def _group_bits(self, bits, confidences):
+        """
+        Confidence-weighted majority vote over each bit's blocks_per_bit
+        blocks (plain majority where a group has zero total confidence).
+        """
+        num_groups = len(bits) // self.blocks_per_bit
+        group = bits[:num_groups * self.blocks_per_bit].reshape(num_groups, self.blocks_per_bit)
+        group_conf = confidences[:num_groups * self.blocks_per_bit].reshape(num_groups, self.blocks_per_bit)
+        
+        weighted_sum = (group * group_conf).sum(axis=1)
+        total_confidence = group_conf.sum(axis=1)
+        majority = group.sum(axis=1) > self.blocks_per_bit / 2
+        return np.where(total_confidence > 0, weighted_sum > total_confidence / 2,
+                        majority).astype(np.uint8)
     
     def embed_data(self, original_audio_path, output_audio_path, data):
         """
@@ -199,128 +168,97 @@ class AudioSteganography:
         4. Repeat entire message for redundancy
         5. Apply small volume modulation (±0.8%)
         """
-        # Convert input audio to WAV if needed
-        wav_path, was_converted = convert_to_wav(original_audio_path)
-        temp_files = [wav_path] if was_converted else []
-        
-        try:
-            # Read original audio
-            with wave.open(wav_path, 'rb') as wav:
-                params = wav.getparams()
-                frames = wav.readframes(params.nframes)
-                audio_data = np.frombuffer(frames, dtype=np.int16).astype(np.float64)
-                sample_rate = params.framerate
-            
-            if sample_rate != self.sample_rate:
-                print(f"Warning: Audio sample rate is {sample_rate} Hz, expected {self.sample_rate} Hz")
-            
-            # Get correct block size and PN sequence for this sample rate
-            block_size, pn_sequence = self._get_block_size_and_pn(sample_rate)
-            
-            print(f"Audio samples: {len(audio_data)}")
-            print(f"Sample rate: {sample_rate} Hz")
-            print(f"Block size: {block_size} samples ({self.block_duration_ms}ms)")
-            
-            # Prepare data: length prefix (1 byte) + data
-            data_bytes = data.encode('utf-8')
-            data_length = len(data_bytes)
-            
-            if data_length > 255:
-                raise ValueError("Data too long! Maximum 255 characters.")
-            
-            # Pack: 1-byte length + data
-            full_data = struct.pack('B', data_length) + data_bytes
-            
-            # Convert to bits
-            bits = []
-            for byte in full_data:
-                for i in range(7, -1, -1):
-                    bits.append((byte >> i) & 1)
-            
-            total_bits = len(bits)
-            
-            # Create encoding: sync + data repeated multiple times
-            encoding = []
-            
-            for copy_idx in range(self.redundancy):
-                # Add sync preamble
-                encoding.extend(self.sync_pattern)
-                # Add data bits
-                encoding.extend(bits)
-            
-            print(f"\nDebug - First 20 encoding bits: {encoding[:20]}")
-            print(f"Debug - Expected: sync repeated {self.redundancy} times + data...")
-            
-            total_encoding_bits = len(encoding)
-            blocks_needed = total_encoding_bits * self.blocks_per_bit
-            samples_needed = blocks_needed * block_size
-            
-            print(f"\nEncoding details:")
-            print(f"  Data: {data_length} chars = {total_bits} bits")
-            print(f"  Sync pattern: {self.sync_length} bits")
-            print(f"  Per copy: {self.sync_length + total_bits} bits")
-            print(f"  Redundancy: {self.redundancy} copies")
-            print(f"  Total bits: {total_encoding_bits}")
-            print(f"  Blocks per bit: {self.blocks_per_bit}")
-            print(f"  Total blocks: {blocks_needed}")
-            print(f"  Samples needed: {samples_needed}")
-            print(f"  Audio samples: {len(audio_data)}")
-            
-            if samples_needed > len(audio_data):
-                raise ValueError(
-                    f"Audio too short! Need {samples_needed} samples ({samples_needed/sample_rate:.1f}s), "
-                    f"have {len(audio_data)} samples ({len(audio_data)/sample_rate:.1f}s)"
-                )
-            
-            # Create modulated audio
-            modulated_audio = audio_data.copy()
-            
-            # Encode each bit across multiple blocks
-            block_idx = 0
-            for bit_position, bit in enumerate(encoding):
-                for redundant_idx in range(self.blocks_per_bit):
-                    start_sample = block_idx * block_size
-                    end_sample = start_sample + block_size
-                    
-                    if end_sample > len(audio_data):
-                        break
-                    
-                    # Get block
-                    block = audio_data[start_sample:end_sample].copy()
-                    
-                    # Modulate block with bit
-                    modulated_block = self._modulate_block(block, bit, pn_sequence)
-                    
-                    # Debug first few blocks
-                    if block_idx < 10:
-                        print(f"  Block {block_idx}: encoding bit_pos={bit_position}, bit={bit}, redundant_copy={redundant_idx}")
-                    
-                    # Write back to audio
-                    modulated_audio[start_sample:end_sample] = modulated_block
-                    
-                    block_idx += 1
-            
-            # Convert back to int16
-            modulated_audio = np.clip(modulated_audio, -32768, 32767).astype(np.int16)
-            
-            # Write modified audio
-            with wave.open(output_audio_path, 'wb') as wav:
-                wav.setparams(params)
-                wav.writeframes(modulated_audio.tobytes())
-            
-            print(f"\n✅ Embedded {data_length} characters into {blocks_needed} blocks")
-            print(f"   Modulation: ±{self.modulation_strength*100:.1f}% volume")
-            print(f"   Coverage: {samples_needed/len(audio_data)*100:.1f}% of audio")
-            return True
-            
-        finally:
-            # Clean up temporary converted files
-            for temp_file in temp_files:
-                try:
-                    os.unlink(temp_file)
-                    print(f"🗑️  Cleaned up temporary file: {temp_file}")
-                except:
-                    pass
+        # Map original audio (int16; upcast block by block below), decoding
+        # non-WAV input with ffmpeg
+        reader = open_audio(original_audio_path)
+        params = reader.params
+        audio_data = reader.samples
+        sample_rate = params.framerate
+        
+        if sample_rate != self.sample_rate:
+            print(f"Warning: Audio sample rate is {sample_rate} Hz, expected {self.sample_rate} Hz")
+        
+        # Get correct block size and PN sequence for this sample rate
+        block_size, pn_sequence = self._get_block_size_and_pn(sample_rate)
+        
+        print(f"Audio samples: {len(audio_data)}")
+        print(f"Sample rate: {sample_rate} Hz")
+        print(f"Block size: {block_size} samples ({self.block_duration_ms}ms)")
+        
+        # Prepare data: length prefix (1 byte) + data
+        data_bytes = data.encode('utf-8')
+        data_length = len(data_bytes)
+        
+        if data_length > 255:
+            raise ValueError("Data too long! Maximum 255 characters.")
+        
+        # Pack: 1-byte length + data
+        full_data = struct.pack('B', data_length) + data_bytes
+        
+        # Convert to bits
+        bits = []
+        for byte in full_data:
+            for i in range(7, -1, -1):
+                bits.append((byte >> i) & 1)
+        
+        total_bits = len(bits)
+        
+        # Create encoding: sync + data repeated multiple times
+        encoding = []
+        
+        for copy_idx in range(self.redundancy):
+            # Add sync preamble
+            encoding.extend(self.sync_pattern)
+            # Add data bits
+            encoding.extend(bits)
+        
+        print(f"\nDebug - First 20 encoding bits: {encoding[:20]}")
+        print(f"Debug - Expected: sync repeated {self.redundancy} times + data...")
+        
+        total_encoding_bits = len(encoding)
+        blocks_needed = total_encoding_bits * self.blocks_per_bit
+        samples_needed = blocks_needed * block_size
+        
+        print(f"\nEncoding details:")
+        print(f"  Data: {data_length} chars = {total_bits} bits")
+        print(f"  Sync pattern: {self.sync_length} bits")
+        print(f"  Per copy: {self.sync_length + total_bits} bits")
+        print(f"  Redundancy: {self.redundancy} copies")
+        print(f"  Total bits: {total_encoding_bits}")
+        print(f"  Blocks per bit: {self.blocks_per_bit}")
+        print(f"  Total blocks: {blocks_needed}")
+        print(f"  Samples needed: {samples_needed}")
+        print(f"  Audio samples: {len(audio_data)}")
+        
+        if samples_needed > len(audio_data):
+            raise ValueError(
+                f"Audio too short! Need {samples_needed} samples ({samples_needed/sample_rate:.1f}s), "
+                f"have {len(audio_data)} samples ({len(audio_data)/sample_rate:.1f}s)"
+            )
+        
+        # Debug first few blocks
+        for block_idx in range(min(10, blocks_needed)):
+            print(f"  Block {block_idx}: encoding bit_pos={block_idx // self.blocks_per_bit}, "
+                  f"bit={encoding[block_idx // self.blocks_per_bit]}, "
+                  f"redundant_copy={block_idx % self.blocks_per_bit}")
+        
+        # Stream the modulated audio out _CHUNK_BLOCKS blocks at a time:
+        # covered blocks get one gain per sample, the rest is copied
+        block_signs = self._block_signs(encoding)
+        with WavWriter(output_audio_path, params) as writer:
+            for start, stop in iter_chunks(len(audio_data), _CHUNK_BLOCKS * block_size):
+                chunk = audio_data[start:stop].astype(np.float64)
+                if start < samples_needed:
+                    first, last = start // block_size, min(stop, samples_needed) // block_size
+                    covered = chunk[:(last - first) * block_size].reshape(-1, block_size)
+                    covered *= self._modulation_envelope(block_signs[first:last], pn_sequence)
+                # Convert back to int16
+                writer.write(np.clip(chunk, -32768, 32767).astype(np.int16))
+        
+        print(f"\n✅ Embedded {data_length} characters into {blocks_needed} blocks")
+        print(f"   Modulation: ±{self.modulation_strength*100:.1f}% volume")
+        print(f"   Coverage: {samples_needed/len(audio_data)*100:.1f}% of audio")
+        return True
     
     def extract_data(self, original_audio_path, modified_audio_path):
         """
@@ -333,198 +271,137 @@ class AudioSteganography:
         4. Extract bits using majority voting across redundant copies
         5. Decode message with error checking
         """
-        # Convert both audio files to WAV if needed
-        original_wav, orig_converted = convert_to_wav(original_audio_path)
-        modified_wav, mod_converted = convert_to_wav(modified_audio_path)
-        temp_files = []
-        if orig_converted:
-            temp_files.append(original_wav)
-        if mod_converted:
-            temp_files.append(modified_wav)
-        
-        try:
-            # Read both audio files
-            with wave.open(original_wav, 'rb') as wav:
-                original_data = np.frombuffer(
-                    wav.readframes(wav.getnframes()), dtype=np.int16
-                ).astype(np.float64)
-                sample_rate = wav.getparams().framerate
-            
-            with wave.open(modified_wav, 'rb') as wav:
-                modified_data = np.frombuffer(
-                    wav.readframes(wav.getnframes()), dtype=np.int16
-                ).astype(np.float64)
-            
-            # Handle length mismatch
-            min_length = min(len(original_data), len(modified_data))
-            if len(original_data) != len(modified_data):
-                print(f"Warning: Audio lengths differ. Using first {min_length} samples.")
-                original_data = original_data[:min_length]
-                modified_data = modified_data[:min_length]
-            
-            if sample_rate != self.sample_rate:
-                print(f"Warning: Audio sample rate is {sample_rate} Hz, expected {self.sample_rate} Hz")
-            
-            # Get correct block size and PN sequence for this sample rate
-            block_size, pn_sequence = self._get_block_size_and_pn(sample_rate)
-            
-            print(f"\n{'='*70}")
-            print(f"Audio samples: {len(original_data)}")
-            print(f"Sample rate: {sample_rate} Hz")
-            print(f"Block size: {block_size} samples ({self.block_duration_ms}ms)")
-            print(f"PN sequence first 10: {pn_sequence[:10]}")
-            print(f"{'='*70}\n")
-            
-            # Extract bits from all blocks
-            num_blocks = len(original_data) // block_size
-            extracted_bits = []
-            confidences = []
-            
-            print(f"Extracting from {num_blocks} blocks...")
-            
-            for block_idx in range(num_blocks):
-                start_sample = block_idx * block_size
-                end_sample = start_sample + block_size
-                
-                if end_sample > len(original_data):
-                    break
-                
-                original_block = original_data[start_sample:end_sample]
-                modified_block = modified_data[start_sample:end_sample]
-                
-                bit, confidence = self._compute_block_correlation(original_block, modified_block, pn_sequence)
-                extracted_bits.append(bit)
-                confidences.append(confidence)
-            
-            print(f"Extracted {len(extracted_bits)} bits from blocks")
-            
-            # Debug: Check first few bits BEFORE grouping
-            print(f"\nDebug - First 16 raw bits: {extracted_bits[:16]}")
-            print(f"Debug - Expected sync (repeated {self.blocks_per_bit}x): {self.sync_pattern * self.blocks_per_bit}")
-            
-            # Group bits by blocks_per_bit and use majority voting
-            grouped_bits = []
-            for i in range(0, len(extracted_bits), self.blocks_per_bit):
-                group = extracted_bits[i:i+self.blocks_per_bit]
-                group_conf = confidences[i:i+self.blocks_per_bit]
-                
-                if len(group) < self.blocks_per_bit:
-                    break
-                
-                # Weighted majority vote (weight by confidence)
-                weighted_sum = sum(b * c for b, c in zip(group, group_conf))
-                total_confidence = sum(group_conf)
-                
-                if total_confidence > 0:
-                    bit = 1 if weighted_sum > total_confidence / 2 else 0
-                else:
-                    bit = 1 if sum(group) > len(group) / 2 else 0
-                
-                grouped_bits.append(bit)
-            
-            print(f"Grouped into {len(grouped_bits)} message bits")
-            
-            # Find sync patterns to locate message copies
-            sync_positions = self._find_sync_patterns(grouped_bits)
-            
-            if not sync_positions:
-                print("❌ No sync patterns found!")
-                return None
+        # Map both audio files (int16; upcast block by block below)
+        original_reader = open_audio(original_audio_path)
+        original_data = original_reader.samples
+        sample_rate = original_reader.framerate
+        modified_data = open_audio(modified_audio_path, cache=False).samples
+        
+        # Handle length mismatch
+        min_length = min(len(original_data), len(modified_data))
+        if len(original_data) != len(modified_data):
+            print(f"Warning: Audio lengths differ. Using first {min_length} samples.")
+            original_data = original_data[:min_length]
+            modified_data = modified_data[:min_length]
+        
+        if sample_rate != self.sample_rate:
+            print(f"Warning: Audio sample rate is {sample_rate} Hz, expected {self.sample_rate} Hz")
+        
+        # Get correct block size and PN sequence for this sample rate
+        block_size, pn_sequence = self._get_block_size_and_pn(sample_rate)
+        
+        print(f"\n{'='*70}")
+        print(f"Audio samples: {len(original_data)}")
+        print(f"Sample rate: {sample_rate} Hz")
+        print(f"Block size: {block_size} samples ({self.block_duration_ms}ms)")
+        print(f"PN sequence first 10: {pn_sequence[:10]}")
+        print(f"{'='*70}\n")
+        
+        # Extract bits from all blocks
+        num_blocks = len(original_data) // block_size
+        
+        print(f"Extracting from {num_blocks} blocks...")
+        
+        extracted_bits, confidences = self._block_correlations(
+            original_data, modified_data, block_size, pn_sequence)
+        
+        print(f"Extracted {len(extracted_bits)} bits from blocks")
+        
+        # Debug: Check first few bits BEFORE grouping
+        print(f"\nDebug - First 16 raw bits: {extracted_bits[:16].tolist()}")
+        print(f"Debug - Expected sync (repeated {self.blocks_per_bit}x): {self.sync_pattern * self.blocks_per_bit}")
+        
+        # Group bits by blocks_per_bit and use weighted majority voting
+        grouped_bits = self._group_bits(extracted_bits, confidences)
+        
+        print(f"Grouped into {len(grouped_bits)} message bits")
+        
+        # Find sync patterns to locate message copies
+        sync_positions = self._find_sync_patterns(grouped_bits)
+        
+        if not sync_positions:
+            print("❌ No sync patterns found!")
+            return None
+        
+        print(f"Found {len(sync_positions)} sync patterns at positions: {sync_positions[:10]}...")
+        
+        # Extract and vote on data from multiple copies
+        all_messages = []
+        
+        for sync_pos in sync_positions[:20]:  # Check first 20 sync positions
+            # Skip sync pattern
+            data_start = sync_pos + self.sync_length
             
-            print(f"Found {len(sync_positions)} sync patterns at positions: {sync_positions[:10]}...")
+            # Extract length byte (8 bits)
+            if data_start + 8 > len(grouped_bits):
+                continue
             
-            # Extract and vote on data from multiple copies
-            all_messages = []
+            data_length = int(np.packbits(grouped_bits[data_start:data_start+8])[0])
             
-            for sync_pos in sync_positions[:20]:  # Check first 20 sync positions
-                # Skip sync pattern
-                data_start = sync_pos + self.sync_length
-                
-                # Extract length byte (8 bits)
-                if data_start + 8 > len(grouped_bits):
-                    continue
-                
-                length_bits = grouped_bits[data_start:data_start+8]
-                data_length = 0
-                for bit in length_bits:
-                    data_length = (data_length << 1) | bit
-                
-                if data_length <= 0 or data_length > 255:
-                    continue
-                
-                print(f"  Sync at {sync_pos}: length={data_length}")
-                
-                # Extract data bits
-                data_bits_start = data_start + 8
-                data_bits_needed = data_length * 8
-                data_bits_end = data_bits_start + data_bits_needed
-                
-                if data_bits_end > len(grouped_bits):
-                    print(f"    Not enough bits: need {data_bits_end}, have {len(grouped_bits)}")
-                    continue
-                
-                data_bits = grouped_bits[data_bits_start:data_bits_end]
-                
-                # Convert bits to bytes
-                data_bytes = bytearray()
-                for i in range(0, len(data_bits), 8):
-                    if i + 8 <= len(data_bits):
-                        byte_val = 0
-                        for j in range(8):
-                            byte_val = (byte_val << 1) | data_bits[i + j]
-                        data_bytes.append(byte_val)
-                
-                try:
-                    decoded_text = data_bytes[:data_length].decode('utf-8')
-                    all_messages.append(decoded_text)
-                    print(f"    ✓ Decoded: '{decoded_text}'")
-                except Exception as e:
-                    print(f"    ✗ Decode error: {e}")
-                    continue
+            if data_length <= 0 or data_length > 255:
+                continue
             
-            if not all_messages:
-                print("❌ No valid messages decoded!")
-                return None
+            print(f"  Sync at {sync_pos}: length={data_length}")
             
-            # Use majority voting on messages
-            from collections import Counter
-            message_counts = Counter(all_messages)
-            best_message, count = message_counts.most_common(1)[0]
+            # Extract data bits
+            data_bits_start = data_start + 8
+            data_bits_needed = data_length * 8
+            data_bits_end = data_bits_start + data_bits_needed
             
-            print(f"\n{'='*70}")
-            print(f"✅ EXTRACTION SUCCESSFUL")
-            print(f"{'='*70}")
-            print(f"Found {len(all_messages)} message copies, {count} agreeing")
-            print(f"\nExtracted text ({len(best_message)} characters):")
-            print(f"┌{'─'*68}┐")
-            print(f"│ {best_message:<66} │")
-            print(f"└{'─'*68}┘\n")
+            if data_bits_end > len(grouped_bits):
+                print(f"    Not enough bits: need {data_bits_end}, have {len(grouped_bits)}")
+                continue
             
-            return best_message
+            # Convert bits to bytes
+            data_bytes = np.packbits(grouped_bits[data_bits_start:data_bits_end]).tobytes()
             
-        finally:
-            # Clean up temporary converted files
-            for temp_file in temp_files:
-                try:
-                    os.unlink(temp_file)
-                    print(f"🗑️  Cleaned up temporary file: {temp_file}")
-                except:
-                    pass
+            try:
+                decoded_text = data_bytes[:data_length].decode('utf-8')
+                all_messages.append(decoded_text)
+                print(f"    ✓ Decoded: '{decoded_text}'")
+            except Exception as e:
+                print(f"    ✗ Decode error: {e}")
+                continue
+        
+        if not all_messages:
+            print("❌ No valid messages decoded!")
+            return None
+        
+        # Use majority voting on messages
+        from collections import Counter
+        message_counts = Counter(all_messages)
+        best_message, count = message_counts.most_common(1)[0]
+        
+        print(f"\n{'='*70}")
+        print(f"✅ EXTRACTION SUCCESSFUL")
+        print(f"{'='*70}")
+        print(f"Found {len(all_messages)} message copies, {count} agreeing")
+        print(f"\nExtracted text ({len(best_message)} characters):")
+        print(f"┌{'─'*68}┐")
+        print(f"│ {best_message:<66} │")
+        print(f"└{'─'*68}┘\n")
+        
+        return best_message
     
     def _find_sync_patterns(self, bits):
-        """Find positions where sync pattern occurs in the bit stream"""
-        sync_positions = []
+        """
+        Find positions where the sync pattern occurs in the bit stream, with
+        at most 1 bit error.
+        
+        In bipolar form (0 -> -1, 1 -> +1) the correlation of a window with
+        the pattern is matches - mismatches = 2 * matches - sync_len, so one
+        np.correlate pass scores every position.
+        """
         sync_len = len(self.sync_pattern)
+        if len(bits) < sync_len:
+            return []
         
-        for i in range(len(bits) - sync_len + 1):
-            # Check if sync pattern matches exactly
-            matches = sum(1 for j in range(sync_len) if bits[i+j] == self.sync_pattern[j])
-            
-            # Require exact match or at most 1 bit error
-            if matches >= sync_len - 1:
-                sync_positions.append(i)
+        bipolar_bits = np.asarray(bits, dtype=np.int32) * 2 - 1
+        bipolar_sync = np.asarray(self.sync_pattern, dtype=np.int32) * 2 - 1
+        matches = (np.correlate(bipolar_bits, bipolar_sync, mode='valid') + sync_len) // 2
         
-        return sync_positions
+        # Require exact match or at most 1 bit error
+        return np.flatnonzero(matches >= sync_len - 1).tolist()
 
 
 def main():
@@ -1,159 +1,65 @@
 import numpy as np
-import wave
 import struct
 import argparse
-import os
-import tempfile
-import subprocess
 import zlib
 
-
-def convert_to_wav(input_path):
-    """Convert any audio format to WAV using ffmpeg. Returns (wav_path, was_converted)."""
-    if input_path.lower().endswith('.wav'):
-        return input_path, False
-
-    temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    temp_wav_path = temp_wav.name
-    temp_wav.close()
-
-    cmd = [
-        'ffmpeg', '-i', input_path,
-        '-ar', '44100',
-        '-ac', '1',
-        '-sample_fmt', 's16',
-        '-y',
-        temp_wav_path
-    ]
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-    except FileNotFoundError:
-        try:
-            os.unlink(temp_wav_path)
-        except Exception:
-            pass
-        raise RuntimeError(
-            "FFmpeg not found. Install it (e.g., sudo apt-get install ffmpeg)."
-        )
-    except subprocess.TimeoutExpired:
-        try:
-            os.unlink(temp_wav_path)
-        except Exception:
-            pass
-        raise RuntimeError("FFmpeg conversion timed out (>120s).")
-
-    if r.returncode != 0:
-        try:
-            os.unlink(temp_wav_path)
-        except Exception:
-            pass
-        raise RuntimeError(f"FFmpeg conversion failed: {r.stderr}")
-
-    return temp_wav_path, True
+from audio_decode import open_audio
+from audio_stft import frame_energy, istft, n_frames, stft
+from wav_io import STFT_CHUNK_FRAMES, WavWriter, stft_chunks
 
 
-def read_wav_mono_i16(path):
-    """Read WAV as mono int16 numpy array + params."""
-    with wave.open(path, 'rb') as w:
-        params = w.getparams()
-        frames = w.readframes(params.nframes)
-        data = np.frombuffer(frames, dtype=np.int16)
-        if params.nchannels > 1:
-            data = data.reshape(-1, params.nchannels).mean(axis=1).astype(np.int16)
-        return data, params
-
-
-def write_wav_from_i16(path, data_i16, params, force_mono=True):
-    """Write mono int16 WAV. If source params are multi-channel, writes mono by default."""
-    if force_mono:
-        out_params = (1, params.sampwidth, params.framerate, len(data_i16), params.comptype, params.compname)
-    else:
-        out_params = params
-
-    with wave.open(path, 'wb') as w:
-        w.setparams(out_params)
-        w.writeframes(data_i16.astype(np.int16).tobytes())
-
-
-def stft(x, n_fft=2048, hop=512):
-    """Simple STFT. Returns complex matrix [frames, freq_bins]."""
-    x = x.astype(np.float32)
-    win = np.hanning(n_fft).astype(np.float32)
-    n = len(x)
-    if n < n_fft:
-        pad = n_fft - n
-        x = np.pad(x, (0, pad))
-        n = len(x)
-    frames = 1 + (n - n_fft) // hop
-    X = np.empty((frames, n_fft // 2 + 1), dtype=np.complex64)
-    for i in range(frames):
-        start = i * hop
-        seg = x[start:start + n_fft]
-        seg = seg * win
-        X[i] = np.fft.rfft(seg)
-    return X
-
-
-def istft(X, n_fft=2048, hop=512, length=None):
-    """Simple ISTFT (overlap-add)."""
-    win = np.hanning(n_fft).astype(np.float32)
-    frames = X.shape[0]
-    out_len = n_fft + (frames - 1) * hop
-    y = np.zeros(out_len, dtype=np.float32)
-    wsum = np.zeros(out_len, dtype=np.float32)
-
-    for i in range(frames):
-        start = i * hop
-        seg = np.fft.irfft(X[i], n=n_fft).astype(np.float32)
-        y[start:start + n_fft] += seg * win
-        wsum[start:start + n_fft] += win * win
-
-    nz = wsum > 1e-8
-    y[nz] /= wsum[nz]
-    if length is not None:
-        y = y[:length]
-    return y
+def normalize_envelope(env):
+    return (env - env.mean()) / (env.std() + 1e-8)
 
 
 def energy_envelope(x, win=2048, hop=512):
     """Short-time energy envelope."""
-    x = x.astype(np.float32)
-    n = len(x)
+    return normalize_envelope(frame_energy(x, n_fft=win, hop=hop))
+
+
+def stream_envelope(reader, n, win=2048, hop=512):
+    """
+    energy_envelope of the first n mono samples of a WavReader, computed
+    STFT_CHUNK_FRAMES frames at a time.
+    """
     if n < win:
-        x = np.pad(x, (0, win - n))
-        n = len(x)
+        return energy_envelope(reader.mono(0, n), win=win, hop=hop)
     frames = 1 + (n - win) // hop
     env = np.empty(frames, dtype=np.float32)
-    w = np.hanning(win).astype(np.float32)
-    for i in range(frames):
-        s = i * hop
-        seg = x[s:s + win] * w
-        env[i] = np.sqrt(np.mean(seg * seg) + 1e-12)
-    # normalize
-    env = (env - env.mean()) / (env.std() + 1e-8)
-    return env
-
-
-def best_lag(a, b, max_lag_frames=400):
-    """Find best lag (in frames) aligning b to a via cross-correlation."""
-    # search lags in [-max, +max]
-    best = (0, -1e9)
-    for lag in range(-max_lag_frames, max_lag_frames + 1):
-        if lag < 0:
-            aa = a[-lag:]
-            bb = b[:len(aa)]
-        elif lag > 0:
-            aa = a[:-lag]
-            bb = b[lag:lag + len(aa)]
-        else:
-            aa = a
-            bb = b[:len(a)]
-        if len(aa) < 16:
-            continue
-        score = float(np.dot(aa, bb) / (len(aa) + 1e-9))
-        if score > best[1]:
-            best = (lag, score)
-    return best[0]
+    for _, start, stop in stft_chunks(frames, win, hop):
+        env[start:stop] = frame_energy(reader.mono(start * hop, (stop - 1) * hop + win),
+                                       n_fft=win, hop=hop)
+    return normalize_envelope(env)
+
+
+def cross_correlation(a, b):
+    """
+    c[k] = sum_i a[i] * b[i + k] for every lag k in (-len(a), len(b)), by FFT;
+    negative lags wrap around to the end (index k % len(c)).
+    """
+    n = len(a) + len(b) - 1
+    nfft = 1 << max(0, n - 1).bit_length()
+    A = np.fft.rfft(np.asarray(a, dtype=np.float64), nfft)
+    B = np.fft.rfft(np.asarray(b, dtype=np.float64), nfft)
+    return np.fft.irfft(B * np.conj(A), nfft)
+
+
+def best_lag(a, b, max_lag_frames=400, min_overlap=16):
+    """
+    Find best lag (in frames) aligning b to a via cross-correlation: the lag
+    in [-max_lag_frames, +max_lag_frames] maximizing the mean of
+    a[i] * b[i + lag] over the overlap.  All lags come out of one FFT, so
+    the window can span minutes at no extra cost.
+    """
+    lags = np.arange(-max_lag_frames, max_lag_frames + 1)
+    overlap = np.minimum(len(a), len(b) - lags) - np.maximum(0, -lags)
+    keep = overlap >= min_overlap
+    if not keep.any():
+        return 0
+    lags, overlap = lags[keep], overlap[keep]
+    corr = cross_correlation(a, b)
+    score = corr[lags % len(corr)] / (overlap + 1e-9)
+    return int(lags[np.argmax(score)])
 
 
 def bytes_to_bits(b: bytes):
@@ -177,6 +83,10 @@ def bits_to_bytes(bits: np.ndarray):
     return bytes(out)
 
 
+# Excerpt length for the sample-level alignment step (~0.75 s at 44.1 kHz)
+REFINE_SAMPLES = 1 << 15
+
+
 class HybridSTFTDiff:
     """Reference-based (hybrid) embedding/extraction using STFT magnitude differences.
 
@@ -196,6 +106,7 @@ class HybridSTFTDiff:
         repeat=3,
         alpha=0.018,
         key: str | None = None,
+        max_lag_s=300.0,
     ):
         self.n_fft = int(n_fft)
         self.hop = int(hop)
@@ -206,6 +117,7 @@ class HybridSTFTDiff:
         self.repeat = int(repeat)
         self.alpha = float(alpha)
         self.key = key or ""
+        self.max_lag_s = float(max_lag_s)
 
     def _select_bins(self, sr):
         freqs = np.fft.rfftfreq(self.n_fft, d=1.0 / sr)
@@ -248,177 +160,197 @@ class HybridSTFTDiff:
         except Exception:
             return None
 
+    def _embed_frames(self, X, first, bits_rep, bins, start_frame):
+        """
+        Apply the magnitude bias to STFT frames first.. (rows of X) and
+        return the reconstructed spectrum.
+        """
+        mag = np.abs(X).astype(np.float32)
+        ph = np.angle(X).astype(np.float32)
+
+        # Frames of this chunk that carry a bit, and the bit of each
+        lo = max(first, start_frame)
+        hi = min(first + len(X), start_frame + len(bits_rep) * self.frames_per_bit)
+        if lo < hi:
+            rows = np.arange(lo, hi)
+            bit = bits_rep[(rows - start_frame) // self.frames_per_bit]
+            base = mag[rows - first][:, bins]
+            # Relative change (codec-friendly): +/- alpha * base
+            delta = self.alpha * (base + 1e-6)
+            mag[(rows - first)[:, None], bins] = np.where(
+                bit[:, None] == 1, base + delta, np.maximum(0.0, base - delta))
+
+        return (mag * np.exp(1j * ph)).astype(np.complex64)
+
+    def _embedded_signal(self, reader, frames, bits_rep, bins, start_frame):
+        """
+        Yield the reconstructed signal in blocks, STFT_CHUNK_FRAMES frames at
+        a time, equal to istft() of the whole modified spectrum.
+        """
+        n_fft, hop = self.n_fft, self.hop
+        for first, start, stop in stft_chunks(frames, n_fft, hop):
+            x = reader.mono(first * hop, (stop - 1) * hop + n_fft).astype(np.float32)
+            Y = self._embed_frames(stft(x, n_fft=n_fft, hop=hop), first, bits_rep, bins, start_frame)
+            y = istft(Y, n_fft=n_fft, hop=hop)
+            # Samples before `start` still miss earlier frames; after the
+            # chunk's last hop they miss later ones (except at the very end)
+            end = len(y) if stop == frames else (stop - first) * hop
+            yield y[(start - first) * hop:end]
+
     def embed(self, original_path, output_path, text: str):
-        wav_path, conv = convert_to_wav(original_path)
-        temps = [wav_path] if conv else []
-        try:
-            x_i16, params = read_wav_mono_i16(wav_path)
-            sr = params.framerate
-            x = x_i16.astype(np.float32)
-
-            payload = self._pack_payload(text)
-            bits = bytes_to_bits(payload)
-
-            # repetition for robustness
-            bits_rep = np.tile(bits, self.repeat)
-
-            X = stft(x, n_fft=self.n_fft, hop=self.hop)
-            mag = np.abs(X).astype(np.float32)
-            ph = np.angle(X).astype(np.float32)
-
-            bins = self._select_bins(sr)
-            frames = X.shape[0]
-            needed_frames = len(bits_rep) * self.frames_per_bit
-            if needed_frames + 10 >= frames:
-                raise ValueError(
-                    f"Audio too short for payload: need ~{needed_frames} frames, have {frames}. "
-                    f"Try reducing message length, repeat, frames_per_bit, or increasing hop."
-                )
-
-            # embed starting a little after the beginning (avoid intro transients)
-            start_frame = 5
-            cur = start_frame
-
-            for bit in bits_rep:
-                # Over frames_per_bit frames, apply a relative magnitude bias
-                fr = slice(cur, cur + self.frames_per_bit)
-                base = mag[fr][:, bins]
-                # Relative change (codec-friendly): +/- alpha * base
-                delta = self.alpha * (base + 1e-6)
-                if bit == 1:
-                    mag[fr][:, bins] = base + delta
-                else:
-                    mag[fr][:, bins] = np.maximum(0.0, base - delta)
-                cur += self.frames_per_bit
-
-            # reconstruct
-            Y = (mag * np.exp(1j * ph)).astype(np.complex64)
-            y = istft(Y, n_fft=self.n_fft, hop=self.hop, length=len(x))
+        reader = open_audio(original_path)
+        params = reader.params
+        sr = params.framerate
+        n = reader.nframes
+
+        payload = self._pack_payload(text)
+        bits = bytes_to_bits(payload)
+
+        # repetition for robustness
+        bits_rep = np.tile(bits, self.repeat)
+
+        bins = self._select_bins(sr)
+        frames = n_frames(n, self.n_fft, self.hop)
+        needed_frames = len(bits_rep) * self.frames_per_bit
+        if needed_frames + 10 >= frames:
+            raise ValueError(
+                f"Audio too short for payload: need ~{needed_frames} frames, have {frames}. "
+                f"Try reducing message length, repeat, frames_per_bit, or increasing hop."
+            )
+
+        # embed starting a little after the beginning (avoid intro transients)
+        start_frame = 5
+
+        # Reconstruct chunk by chunk, straight into the output file.  The
+        # level match below needs the peak of the whole signal, so the
+        # rare track that ends up above it is reconstructed a second
+        # time with the gain applied.
+        scale = None
+        while True:
+            peak = np.float32(0.0)
+            with WavWriter(output_path, params, nchannels=1) as writer:
+                for y in self._embedded_signal(reader, frames, bits_rep, bins, start_frame):
+                    if scale is None:
+                        peak = max(peak, np.max(np.abs(y)))
+                    else:
+                        y *= scale
+                    writer.write(np.clip(np.round(y), -32768, 32767).astype(np.int16))
 
             # match original overall level very lightly
-            peak = np.max(np.abs(y)) + 1e-9
-            if peak > 32700:
-                y *= (32700.0 / peak)
-
-            y_i16 = np.clip(np.round(y), -32768, 32767).astype(np.int16)
-            write_wav_from_i16(output_path, y_i16, params, force_mono=True)
-            return True
-        finally:
-            for t in temps:
-                try:
-                    os.unlink(t)
-                except Exception:
-                    pass
+            peak = peak + 1e-9
+            if scale is not None or peak <= 32700:
+                return True
+            scale = 32700.0 / peak
+
+    def _bit_scores(self, reader_o, reader_m, offset_o, offset_m, n_bits, bins, start_frame):
+        """
+        Score of every embedded bit: the mean normalized magnitude
+        difference over its frames_per_bit frames and the selected bins,
+        computed for a bounded run of bits at a time.
+        """
+        n_fft, hop, fpb = self.n_fft, self.hop, self.frames_per_bit
+        scores = np.empty(n_bits, dtype=np.float32)
+        bits_per_chunk = max(1, STFT_CHUNK_FRAMES // fpb)
+        for b0 in range(0, n_bits, bits_per_chunk):
+            b1 = min(b0 + bits_per_chunk, n_bits)
+            f0 = start_frame + b0 * fpb
+            lo, hi = f0 * hop, (start_frame + b1 * fpb - 1) * hop + n_fft
+            o = np.abs(stft(reader_o.mono(offset_o + lo, offset_o + hi), n_fft=n_fft, hop=hop))[:, bins]
+            m = np.abs(stft(reader_m.mono(offset_m + lo, offset_m + hi), n_fft=n_fft, hop=hop))[:, bins]
+            # normalized diff (robust to global gain changes)
+            nd = ((m - o) / (o + 1e-6)).reshape(b1 - b0, fpb * len(bins))
+            scores[b0:b1] = nd.mean(axis=1)
+        return scores
+
+    def _refine_lag(self, reader_o, reader_m, env_o, lag_samples):
+        """
+        Sample-accurate lag near a hop-resolution one: cross-correlate a
+        REFINE_SAMPLES excerpt of the original around its loudest frame with
+        the modified audio within +/- hop of lag_samples.
+        """
+        hop, r = self.hop, self.hop
+        w = min(REFINE_SAMPLES, reader_o.nframes)
+        # Excerpt starts t whose counterpart [t + lag - r, t + lag + w + r)
+        # lies inside the modified file
+        lo = max(0, r - lag_samples)
+        hi = min(reader_o.nframes, reader_m.nframes - lag_samples - r) - w
+        if hi < lo:
+            return lag_samples
+
+        f_lo = -(-lo // hop)
+        f_hi = max(f_lo + 1, (hi + w - self.n_fft) // hop + 1)
+        loudest = f_lo + int(np.argmax(env_o[f_lo:f_hi])) if f_lo < len(env_o) else 0
+        t = int(np.clip(loudest * hop + (self.n_fft - w) // 2, lo, hi))
+
+        a = reader_o.mono(t, t + w)
+        b = reader_m.mono(t + lag_samples - r, t + lag_samples + w + r)
+        corr = cross_correlation(a, b)[:2 * r + 1]
+        return lag_samples + int(np.argmax(corr)) - r
 
     def extract(self, original_path, modified_path):
-        ow, oc = convert_to_wav(original_path)
-        mw, mc = convert_to_wav(modified_path)
-        temps = []
-        if oc:
-            temps.append(ow)
-        if mc:
-            temps.append(mw)
-        try:
-            xo_i16, op = read_wav_mono_i16(ow)
-            xm_i16, mp = read_wav_mono_i16(mw)
-            sr = op.framerate
-            if mp.framerate != sr:
-                raise ValueError("Sample rates differ after conversion; this should not happen.")
-
-            # Trim to same length
-            n = min(len(xo_i16), len(xm_i16))
-            xo = xo_i16[:n].astype(np.float32)
-            xm = xm_i16[:n].astype(np.float32)
-
-            # Coarse alignment by envelope cross-correlation
-            env_o = energy_envelope(xo, win=self.n_fft, hop=self.hop)
-            env_m = energy_envelope(xm, win=self.n_fft, hop=self.hop)
-            m = min(len(env_o), len(env_m))
-            env_o = env_o[:m]
-            env_m = env_m[:m]
-            lag_frames = best_lag(env_o, env_m, max_lag_frames=400)
-            lag_samples = lag_frames * self.hop
-
-            if lag_samples < 0:
-                xo2 = xo[-lag_samples:]
-                xm2 = xm[:len(xo2)]
-            elif lag_samples > 0:
-                xo2 = xo[:len(xo) - lag_samples]
-                xm2 = xm[lag_samples:lag_samples + len(xo2)]
-            else:
-                xo2 = xo
-                xm2 = xm[:len(xo)]
-
-            n2 = min(len(xo2), len(xm2))
-            xo2 = xo2[:n2]
-            xm2 = xm2[:n2]
-
-            Xo = stft(xo2, n_fft=self.n_fft, hop=self.hop)
-            Xm = stft(xm2, n_fft=self.n_fft, hop=self.hop)
-
-            frames = min(Xo.shape[0], Xm.shape[0])
-            Xo = Xo[:frames]
-            Xm = Xm[:frames]
-
-            mag_o = np.abs(Xo).astype(np.float32)
-            mag_m = np.abs(Xm).astype(np.float32)
-
-            bins = self._select_bins(sr)
-
-            # Decode by averaging normalized magnitude differences over bins+frames
-            start_frame = 5
-            cur = start_frame
-
-            # We don't know message length up front; decode a reasonable max payload
-            # 4+2+4+2048 bytes = 2058 bytes max => 16464 bits; with repeat maybe huge.
-            # We'll decode up to max_bits bits (before de-repetition).
-            max_bytes = 4096
-            max_bits = (4 + 2 + 4 + max_bytes) * 8
-
-            bits_rep = []
-            for _ in range(max_bits * self.repeat):
-                if cur + self.frames_per_bit >= frames:
-                    break
-                fr = slice(cur, cur + self.frames_per_bit)
-                o = mag_o[fr][:, bins]
-                m = mag_m[fr][:, bins]
-                # normalized diff (robust to global gain changes)
-                nd = (m - o) / (o + 1e-6)
-                score = float(nd.mean())
-                bits_rep.append(1 if score > 0 else 0)
-                cur += self.frames_per_bit
-
-            if len(bits_rep) < 80:
-                return None
-
-            bits_rep = np.array(bits_rep, dtype=np.int8)
-
-            # De-repetition by majority vote across repeat blocks
-            # We embedded as tile(bits, repeat) (concatenated repeats).
-            # So vote every k-th bit position across repeats.
-            # Let L be unknown; we search for a valid HYB1 payload.
-
-            # Try candidate lengths by scanning for the HYB1 marker after voting.
-            # We'll attempt progressively larger payload sizes until CRC passes.
-            best_text = None
-            for cand_total_bits in range(80, min(len(bits_rep) // self.repeat, max_bits) + 1, 8):
-                # vote across repeats for first cand_total_bits
-                chunk = bits_rep[:cand_total_bits * self.repeat]
-                chunk = chunk.reshape(self.repeat, cand_total_bits)
-                voted = (chunk.sum(axis=0) >= (self.repeat / 2)).astype(np.int8)
-                payload = bits_to_bytes(voted)
-                text = self._unpack_payload(payload)
-                if text is not None:
-                    best_text = text
-                    break
-
-            return best_text
-        finally:
-            for t in temps:
-                try:
-                    os.unlink(t)
-                except Exception:
-                    pass
+        reader_o = open_audio(original_path)
+        reader_m = open_audio(modified_path, cache=False)
+        sr = reader_o.framerate
+        if reader_m.framerate != sr:
+            raise ValueError("Sample rates differ after conversion; this should not happen.")
+
+        # Coarse alignment by envelope cross-correlation (hop resolution).
+        # Only lags keeping half of the shorter file in the overlap count,
+        # so a few loud frames at the edge of a long window can't win.
+        env_o = stream_envelope(reader_o, reader_o.nframes, win=self.n_fft, hop=self.hop)
+        env_m = stream_envelope(reader_m, reader_m.nframes, win=self.n_fft, hop=self.hop)
+        lag_frames = best_lag(env_o, env_m,
+                              max_lag_frames=int(self.max_lag_s * sr / self.hop),
+                              min_overlap=max(16, min(len(env_o), len(env_m)) // 2))
+        lag_samples = self._refine_lag(reader_o, reader_m, env_o, lag_frames * self.hop)
+
+        # Aligned ranges: original from offset_o, modified from offset_m
+        offset_o, offset_m = max(0, -lag_samples), max(0, lag_samples)
+        n2 = max(0, min(reader_o.nframes - offset_o, reader_m.nframes - offset_m))
+        if n2 < self.n_fft:
+            return None
+        frames = 1 + (n2 - self.n_fft) // self.hop
+
+        bins = self._select_bins(sr)
+
+        # Decode by averaging normalized magnitude differences over bins+frames
+        start_frame = 5
+
+        # We don't know message length up front; decode a reasonable max payload
+        # 4+2+4+2048 bytes = 2058 bytes max => 16464 bits; with repeat maybe huge.
+        # We'll decode up to max_bits bits (before de-repetition).
+        max_bytes = 4096
+        max_bits = (4 + 2 + 4 + max_bytes) * 8
+
+        # Every bit whose frames end before the last frame
+        n_bits = min(max_bits * self.repeat,
+                     max(0, (frames - start_frame - 1) // self.frames_per_bit))
+        if n_bits < 80:
+            return None
+
+        scores = self._bit_scores(reader_o, reader_m, offset_o, offset_m, n_bits, bins, start_frame)
+        bits_rep = (scores > 0).astype(np.int8)
+
+        # De-repetition by majority vote across repeat blocks
+        # We embedded as tile(bits, repeat) (concatenated repeats).
+        # So vote every k-th bit position across repeats.
+        # Let L be unknown; we search for a valid HYB1 payload.
+
+        # Try candidate lengths by scanning for the HYB1 marker after voting.
+        # We'll attempt progressively larger payload sizes until CRC passes.
+        best_text = None
+        for cand_total_bits in range(80, min(len(bits_rep) // self.repeat, max_bits) + 1, 8):
+            # vote across repeats for first cand_total_bits
+            chunk = bits_rep[:cand_total_bits * self.repeat]
+            chunk = chunk.reshape(self.repeat, cand_total_bits)
+            voted = (chunk.sum(axis=0) >= (self.repeat / 2)).astype(np.int8)
+            payload = bits_to_bytes(voted)
+            text = self._unpack_payload(payload)
+            if text is not None:
+                best_text = text
+                break
+
+        return best_text
 
 
 def main():
@@ -443,6 +375,8 @@ def main():
     p.add_argument('--repeat', type=int, default=3)
     p.add_argument('--alpha', type=float, default=0.018)
     p.add_argument('--key', type=str, default='', help='Optional: changes bin selection')
+    p.add_argument('--max-lag-s', type=float, default=300.0,
+                   help='Largest offset (seconds) between original and modified searched when aligning')
 
     args = p.parse_args()
 
@@ -456,6 +390,7 @@ def main():
         repeat=args.repeat,
         alpha=args.alpha,
         key=args.key,
+        max_lag_s=args.max_lag_s,
     )
 
     if args.mode == 'embed':
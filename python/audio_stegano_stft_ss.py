@@ -1,80 +1,14 @@
 import numpy as np
-import wave
 import hashlib
 import struct
 import zlib
 import argparse
 import sys
 import os
-import tempfile
-import subprocess
 
-def convert_to_wav(input_path):
-    """
-    Convert any audio format to WAV using ffmpeg.
-    Returns the path to the converted WAV file (temporary file).
-    If already WAV, returns the original path.
-    """
-    # Check if already a WAV file
-    if input_path.lower().endswith('.wav'):
-        return input_path, False  # Return original path, not converted
-    
-    print(f"🔄 Converting {os.path.basename(input_path)} to WAV format...")
-    
-    # Create temporary WAV file
-    temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    temp_wav_path = temp_wav.name
-    temp_wav.close()
-    
-    try:
-        # Use ffmpeg to convert to WAV
-        # -ar 44100: Sample rate 44.1kHz
-        # -ac 1: Mono (1 channel) - steganography works better with mono
-        # -sample_fmt s16: 16-bit signed integer samples
-        cmd = [
-            'ffmpeg',
-            '-i', input_path,
-            '-ar', '44100',
-            '-ac', '1',
-            '-sample_fmt', 's16',
-            '-y',  # Overwrite output file
-            temp_wav_path
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if result.returncode != 0:
-            # Clean up temp file
-            try:
-                os.unlink(temp_wav_path)
-            except:
-                pass
-            raise RuntimeError(f"FFmpeg conversion failed: {result.stderr}")
-        
-        print(f"✅ Converted to WAV: {temp_wav_path}")
-        return temp_wav_path, True  # Return temp path, was converted
-        
-    except FileNotFoundError:
-        try:
-            os.unlink(temp_wav_path)
-        except:
-            pass
-        raise RuntimeError(
-            "FFmpeg not found. Please install ffmpeg:\n"
-            "  Ubuntu/Debian: sudo apt-get install ffmpeg\n"
-            "  macOS: brew install ffmpeg"
-        )
-    except subprocess.TimeoutExpired:
-        try:
-            os.unlink(temp_wav_path)
-        except:
-            pass
-        raise RuntimeError("Audio conversion timed out (>60 seconds)")
+from audio_decode import open_audio
+from audio_stft import hann, istft, stft
+from wav_io import CHUNK_FRAMES, STFT_CHUNK_FRAMES, WavWriter, iter_chunks, stft_chunks
 
 class AudioSteganography:
     def __init__(self, seed=None):
@@ -88,221 +22,181 @@ class AudioSteganography:
         Embed data into audio file using linear redundancy with spacing.
         Repeats the entire message at regular intervals throughout the audio.
         """
-        # Convert input audio to WAV if needed
-        wav_path, was_converted = convert_to_wav(original_audio_path)
-        temp_files = [wav_path] if was_converted else []
+        # Map original audio (int16; copied out block by block below),
+        # decoding non-WAV input with ffmpeg
+        reader = open_audio(original_audio_path)
+        params = reader.params
+        audio_data = reader.samples
+        sample_rate = params.framerate
         
-        try:
-            # Read original audio
-            with wave.open(wav_path, 'rb') as wav:
-                params = wav.getparams()
-                frames = wav.readframes(params.nframes)
-                audio_data = np.frombuffer(frames, dtype=np.int16)
-                sample_rate = params.framerate
-            
-            print(f"Audio samples: {len(audio_data)}")
-            print(f"Sample rate: {sample_rate} Hz")
-            
-            # Prepare data: length prefix (4 bytes) + data
-            data_bytes = data.encode('utf-8')
-            data_length = len(data_bytes)
-            
-            if data_length > 255:
-                raise ValueError("Data too long! Maximum 255 characters.")
-            
-            # Pack: 4-byte length + data
-            full_data = struct.pack('>I', data_length) + data_bytes
-            
-            # Convert to bits
-            bits = []
-            for byte in full_data:
-                for i in range(7, -1, -1):
-                    bits.append((byte >> i) & 1)
-            
-            total_bits = len(bits)
-            
-            # Calculate space needed for one complete encoding
-            samples_per_bit = 1 + self.spacing  # 1 sample for data + spacing
-            samples_per_encoding = total_bits * samples_per_bit * self.redundancy
-            
-            # Determine repeat interval (1, 2, or 3 seconds)
-            for interval_seconds in [1, 2, 3]:
-                interval_samples = sample_rate * interval_seconds
-                if samples_per_encoding <= interval_samples:
-                    break
-            else:
-                # If even 3 seconds isn't enough, use the minimum needed
-                interval_seconds = (samples_per_encoding / sample_rate) + 0.5
-                interval_samples = int(interval_seconds * sample_rate)
-            
-            # Calculate how many complete copies we can fit
-            num_copies = len(audio_data) // interval_samples
-            
-            print(f"Data: {data_length} chars = {total_bits} bits")
-            print(f"With {self.redundancy}x redundancy and {self.spacing} spacing:")
-            print(f"  {samples_per_encoding} samples per encoding")
-            print(f"  Repeat interval: {interval_seconds} second(s) ({interval_samples} samples)")
-            print(f"  Number of complete copies: {num_copies}")
-            print(f"  Total coverage: {num_copies * interval_samples} / {len(audio_data)} samples")
-            
-            if samples_per_encoding > len(audio_data):
-                raise ValueError(
-                    f"Audio too short! Need {samples_per_encoding} samples, "
-                    f"have {len(audio_data)}"
-                )
-            
-            # Create modified audio
-            modified_audio = audio_data.copy().astype(np.int32)
-            
-            # Embed the message multiple times throughout the audio
-            for copy_num in range(num_copies):
-                base_position = copy_num * interval_samples
-                position = base_position
-                
-                # Embed all bits for this copy
-                for bit in bits:
-                    for redundant_copy in range(self.redundancy):
-                        # Embed the bit
-                        if bit == 1:
-                            modified_audio[position] += self.amplitude
-                        else:
-                            modified_audio[position] -= self.amplitude
-                        
-                        position += 1
-                        
-                        # Add spacing (zero-padding)
-                        position += self.spacing
-            
-            # Clip to valid int16 range
-            modified_audio = np.clip(modified_audio, -32768, 32767).astype(np.int16)
-            
-            # Write modified audio
-            with wave.open(output_audio_path, 'wb') as wav:
-                wav.setparams(params)
-                wav.writeframes(modified_audio.tobytes())
-            
-            print(f"✅ Embedded {data_length} characters into audio ({num_copies} copies)")
-            return True
-            
-        finally:
-            # Clean up temporary converted files
-            for temp_file in temp_files:
-                try:
-                    os.unlink(temp_file)
-                    print(f"🗑️  Cleaned up temporary file: {temp_file}")
-                except:
-                    pass
+        print(f"Audio samples: {len(audio_data)}")
+        print(f"Sample rate: {sample_rate} Hz")
+        
+        # Prepare data: length prefix (4 bytes) + data
+        data_bytes = data.encode('utf-8')
+        data_length = len(data_bytes)
+        
+        if data_length > 255:
+            raise ValueError("Data too long! Maximum 255 characters.")
+        
+        # Pack: 4-byte length + data
+        full_data = struct.pack('>I', data_length) + data_bytes
+        
+        # Convert to bits
+        bits = []
+        for byte in full_data:
+            for i in range(7, -1, -1):
+                bits.append((byte >> i) & 1)
+        
+        total_bits = len(bits)
+        
+        # Calculate space needed for one complete encoding
+        samples_per_bit = 1 + self.spacing  # 1 sample for data + spacing
+        samples_per_encoding = total_bits * samples_per_bit * self.redundancy
+        
+        # Determine repeat interval (1, 2, or 3 seconds)
+        for interval_seconds in [1, 2, 3]:
+            interval_samples = sample_rate * interval_seconds
+            if samples_per_encoding <= interval_samples:
+                break
+        else:
+            # If even 3 seconds isn't enough, use the minimum needed
+            interval_seconds = (samples_per_encoding / sample_rate) + 0.5
+            interval_samples = int(interval_seconds * sample_rate)
+        
+        # Calculate how many complete copies we can fit
+        num_copies = len(audio_data) // interval_samples
+        
+        print(f"Data: {data_length} chars = {total_bits} bits")
+        print(f"With {self.redundancy}x redundancy and {self.spacing} spacing:")
+        print(f"  {samples_per_encoding} samples per encoding")
+        print(f"  Repeat interval: {interval_seconds} second(s) ({interval_samples} samples)")
+        print(f"  Number of complete copies: {num_copies}")
+        print(f"  Total coverage: {num_copies * interval_samples} / {len(audio_data)} samples")
+        
+        if samples_per_encoding > len(audio_data):
+            raise ValueError(
+                f"Audio too short! Need {samples_per_encoding} samples, "
+                f"have {len(audio_data)}"
+            )
+        
+        # Every copy modifies the same offsets of its interval: bit j,
+        # redundant copy r sits at (j * redundancy + r) * samples_per_bit
+        offsets = np.arange(total_bits * self.redundancy) * samples_per_bit
+        deltas = np.repeat(np.where(np.array(bits) == 1, self.amplitude, -self.amplitude),
+                           self.redundancy)
+        
+        # Stream whole intervals at a time, embedding the message into each
+        # complete copy; the tail after the last copy is copied as is
+        copies_per_chunk = max(1, CHUNK_FRAMES // interval_samples)
+        covered = num_copies * interval_samples
+        with WavWriter(output_audio_path, params) as writer:
+            for start, stop in iter_chunks(len(audio_data), copies_per_chunk * interval_samples):
+                modified_audio = audio_data[start:stop].astype(np.int32)
+                copies = (min(stop, covered) - start) // interval_samples if start < covered else 0
+                if copies:
+                    intervals = modified_audio[:copies * interval_samples].reshape(copies, interval_samples)
+                    intervals[:, offsets] += deltas
+                # Clip to valid int16 range
+                writer.write(np.clip(modified_audio, -32768, 32767).astype(np.int16))
+        
+        print(f"✅ Embedded {data_length} characters into audio ({num_copies} copies)")
+        return True
     
     def extract_data(self, original_audio_path, modified_audio_path):
         """
         Extract data by comparing original and modified audio files.
         Tries to find valid encodings at regular intervals (every 1-3 seconds).
         """
-        # Convert both audio files to WAV if needed
-        original_wav, orig_converted = convert_to_wav(original_audio_path)
-        modified_wav, mod_converted = convert_to_wav(modified_audio_path)
-        temp_files = []
-        if orig_converted:
-            temp_files.append(original_wav)
-        if mod_converted:
-            temp_files.append(modified_wav)
+        # Map both audio files
+        original_reader = open_audio(original_audio_path)
+        original_data = original_reader.samples
+        sample_rate = original_reader.framerate
+        modified_data = open_audio(modified_audio_path, cache=False).samples
         
-        try:
-            # Read both audio files
-            with wave.open(original_wav, 'rb') as wav:
-                original_data = np.frombuffer(
-                    wav.readframes(wav.getnframes()), dtype=np.int16
-                ).astype(np.int32)
-                sample_rate = wav.getparams().framerate
-            
-            with wave.open(modified_wav, 'rb') as wav:
-                modified_data = np.frombuffer(
-                    wav.readframes(wav.getnframes()), dtype=np.int16
-                ).astype(np.int32)
-            
-            if len(original_data) != len(modified_data):
-                if len(original_data) < len(modified_data):
-                    print(f"Warning: Original audio has {len(original_data)} samples, "
-                          f"but modified audio has {len(modified_data)} samples. "
-                          f"Truncating modified audio to match original.")
-                    modified_data = modified_data[:len(original_data)]
-                else:
-                    print(f"Warning: Original audio has {len(original_data)} samples, "
-                          f"but modified audio has {len(modified_data)} samples. "
-                          f"Truncating original audio to match modified.")
-                    original_data = original_data[:len(modified_data)]
-                # raise ValueError("Original and modified audio files have different lengths!")
-            
-            # Calculate difference (this reveals the embedded data)
-            diff = modified_data - original_data
-            
-            print(f"\n{'='*70}")
-            print(f"Audio samples: {len(original_data)}")
-            print(f"Sample rate: {sample_rate} Hz")
-            print(f"Non-zero differences: {np.count_nonzero(diff)}")
-            print(f"{'='*70}\n")
-            
-            # Try to extract from different starting positions (1, 2, or 3 second intervals)
-            samples_per_bit = 1 + self.spacing
-            
-            # First, try to detect the interval by finding the repeat pattern
-            # Look for encodings at 1s, 2s, and 3s intervals
-            found_encodings = []
-            
-            for interval_seconds in [1, 2, 3]:
-                interval_samples = sample_rate * interval_seconds
-                
-                # Try extracting from the first position
-                result = self._extract_single_encoding(diff, 0, samples_per_bit)
-                
-                if result and result['valid']:
-                    # Check if there's a repeat at the expected interval
-                    if interval_samples < len(diff):
-                        result2 = self._extract_single_encoding(diff, interval_samples, samples_per_bit)
-                        if result2 and result2['valid'] and result2['text'] == result['text']:
-                            print(f"✅ Found valid encoding with {interval_seconds}s interval")
-                            found_encodings.append({
-                                'interval': interval_seconds,
-                                'result': result
-                            })
-                            break
-            
-            if not found_encodings:
-                # Fallback: just try position 0
-                print(f"Trying to extract from position 0...")
-                result = self._extract_single_encoding(diff, 0, samples_per_bit)
-                if result and result['valid']:
-                    found_encodings.append({
-                        'interval': None,
-                        'result': result
-                    })
-            
-            if not found_encodings:
-                print(f"❌ No valid encodings found!")
-                return None
-            
-            # Use the first valid encoding found
-            encoding = found_encodings[0]
-            result = encoding['result']
-            
-            print(f"\n{'='*70}")
-            print(f"✅ EXTRACTION SUCCESSFUL")
-            print(f"{'='*70}")
-            print(f"\nExtracted text ({len(result['text'])} characters):")
-            print(f"┌{'─'*68}┐")
-            print(f"│ {result['text']:<66} │")
-            print(f"└{'─'*68}┘\n")
-            
-            return result['text']
-            
-        finally:
-            # Clean up temporary converted files
-            for temp_file in temp_files:
-                try:
-                    os.unlink(temp_file)
-                    print(f"🗑️  Cleaned up temporary file: {temp_file}")
-                except:
-                    pass
+        if len(original_data) != len(modified_data):
+            if len(original_data) < len(modified_data):
+                print(f"Warning: Original audio has {len(original_data)} samples, "
+                      f"but modified audio has {len(modified_data)} samples. "
+                      f"Truncating modified audio to match original.")
+                modified_data = modified_data[:len(original_data)]
+            else:
+                print(f"Warning: Original audio has {len(original_data)} samples, "
+                      f"but modified audio has {len(modified_data)} samples. "
+                      f"Truncating original audio to match modified.")
+                original_data = original_data[:len(modified_data)]
+            # raise ValueError("Original and modified audio files have different lengths!")
+        
+        # Count the changed samples block by block
+        non_zero = 0
+        for start, stop in iter_chunks(len(original_data)):
+            non_zero += int(np.count_nonzero(modified_data[start:stop] != original_data[start:stop]))
+        
+        print(f"\n{'='*70}")
+        print(f"Audio samples: {len(original_data)}")
+        print(f"Sample rate: {sample_rate} Hz")
+        print(f"Non-zero differences: {non_zero}")
+        print(f"{'='*70}\n")
+        
+        # Try to extract from different starting positions (1, 2, or 3 second intervals)
+        samples_per_bit = 1 + self.spacing
+        
+        # Calculate difference (this reveals the embedded data) -- only as
+        # far as the encodings read below can reach: one at 0 and one at
+        # up to 3 s, each at most a 32-bit length plus 255 bytes
+        reach = 3 * sample_rate + (32 + 255 * 8 + 1) * samples_per_bit * self.redundancy
+        reach = min(len(original_data), reach)
+        diff = modified_data[:reach].astype(np.int32) - original_data[:reach]
+        
+        # First, try to detect the interval by finding the repeat pattern
+        # Look for encodings at 1s, 2s, and 3s intervals
+        found_encodings = []
+        
+        for interval_seconds in [1, 2, 3]:
+            interval_samples = sample_rate * interval_seconds
+            
+            # Try extracting from the first position
+            result = self._extract_single_encoding(diff, 0, samples_per_bit)
+            
+            if result and result['valid']:
+                # Check if there's a repeat at the expected interval
+                if interval_samples < len(diff):
+                    result2 = self._extract_single_encoding(diff, interval_samples, samples_per_bit)
+                    if result2 and result2['valid'] and result2['text'] == result['text']:
+                        print(f"✅ Found valid encoding with {interval_seconds}s interval")
+                        found_encodings.append({
+                            'interval': interval_seconds,
+                            'result': result
+                        })
+                        break
+        
+        if not found_encodings:
+            # Fallback: just try position 0
+            print(f"Trying to extract from position 0...")
+            result = self._extract_single_encoding(diff, 0, samples_per_bit)
+            if result and result['valid']:
+                found_encodings.append({
+                    'interval': None,
+                    'result': result
+                })
+        
+        if not found_encodings:
+            print(f"❌ No valid encodings found!")
+            return None
+        
+        # Use the first valid encoding found
+        encoding = found_encodings[0]
+        result = encoding['result']
+        
+        print(f"\n{'='*70}")
+        print(f"✅ EXTRACTION SUCCESSFUL")
+        print(f"{'='*70}")
+        print(f"\nExtracted text ({len(result['text'])} characters):")
+        print(f"┌{'─'*68}┐")
+        print(f"│ {result['text']:<66} │")
+        print(f"└{'─'*68}┘\n")
+        
+        return result['text']
     
     def _extract_single_encoding(self, diff, start_position, samples_per_bit):
         """Extract a single encoding starting at the given position"""
@@ -414,48 +308,35 @@ def _from_float32_pcm(x: np.ndarray) -> np.ndarray:
     x = np.clip(x, -1.0, 1.0)
     return (x * 32767.0).astype(np.int16)
 
+def _reflect_segment(x_int16: np.ndarray, pad: int, lo: int, hi: int) -> np.ndarray:
+    """
+    Samples [lo, hi) of np.pad(_to_float32_pcm(x_int16), pad, mode="reflect"),
+    reading only the part of x_int16 they come from (len(x_int16) > pad).
+    """
+    n = len(x_int16)
+    idx = np.abs(np.arange(lo - pad, hi - pad))
+    idx = np.where(idx >= n, 2 * (n - 1) - idx, idx)
+    return _to_float32_pcm(x_int16[idx])
+
 def stft_np(x: np.ndarray, n_fft: int = 2048, hop: int = 512, window: str = "hann"):
     """
     Minimal STFT (numpy-only) returning complex matrix [freq_bins, frames].
     """
-    if window == "hann":
-        win = np.hanning(n_fft).astype(np.float32)
-    else:
+    if window != "hann":
         raise ValueError("Only hann window is supported currently.")
+    win = hann(n_fft)
 
     # Pad so we can reconstruct cleanly
     pad = n_fft
     x_pad = np.pad(x.astype(np.float32), (pad, pad), mode="reflect")
-    n_frames = 1 + (len(x_pad) - n_fft) // hop
-    frames = np.lib.stride_tricks.as_strided(
-        x_pad,
-        shape=(n_frames, n_fft),
-        strides=(x_pad.strides[0] * hop, x_pad.strides[0]),
-        writeable=False
-    )
-    frames_win = frames * win[None, :]
-    X = np.fft.rfft(frames_win, n=n_fft, axis=1)
+    X = stft(x_pad, n_fft=n_fft, hop=hop)
     return X.T, win, pad
 
 def istft_np(X: np.ndarray, win: np.ndarray, hop: int = 512, length: int | None = None, pad: int = 0):
     """
     Inverse STFT for stft_np output. X shape [freq_bins, frames].
     """
-    n_fft = (win.shape[0])
-    n_frames = X.shape[1]
-    y_len = n_fft + hop * (n_frames - 1)
-    y = np.zeros(y_len, dtype=np.float32)
-    wsum = np.zeros(y_len, dtype=np.float32)
-
-    frames = np.fft.irfft(X.T, n=n_fft, axis=1).astype(np.float32)
-    for i in range(n_frames):
-        start = i * hop
-        y[start:start+n_fft] += frames[i] * win
-        wsum[start:start+n_fft] += (win * win)
-
-    # Normalize overlap-add
-    nz = wsum > 1e-8
-    y[nz] /= wsum[nz]
+    y = istft(X.T, n_fft=win.shape[0], hop=hop)
 
     # Remove padding applied in stft_np
     if pad > 0:
@@ -594,175 +475,189 @@ class STFTSpreadSpectrumStegano:
         """
         Embed message into a single channel of the audio (default: channel 0).
         """
-        wav_path, converted = convert_to_wav(input_audio_path)
-        temp_files = [wav_path] if converted else []
-        try:
-            with wave.open(wav_path, "rb") as w:
-                params = w.getparams()
-                sr = params.framerate
-                n_channels = params.nchannels
-                frames = w.readframes(w.getnframes())
-                audio_i16 = np.frombuffer(frames, dtype=np.int16)
-
-            audio_i16 = audio_i16.reshape(-1, n_channels)
-            x = _to_float32_pcm(audio_i16[:, channel])
-
-            X, win, pad = stft_np(x, n_fft=self.n_fft, hop=self.hop)
-            bins = self._select_bins(sr)
-            pn = self._pn_pattern(len(bins))
-
-            payload_bits = self._build_payload_bits(message)
-            bits = self.PREAMBLE_BITS + payload_bits
-
-            start_frame = int((self.start_offset_s * sr) / self.hop)
-            frames_needed = len(bits) * self.frames_per_bit
-            if start_frame + frames_needed >= X.shape[1]:
-                dur_s = (X.shape[1] * self.hop) / sr
-                need_s = ((start_frame + frames_needed) * self.hop) / sr
-                raise ValueError(
-                    f"Audio too short for payload. Duration={dur_s:.2f}s, need≈{need_s:.2f}s. "
-                    "Shorten message or lower frames_per_bit / repeat."
-                )
-
-            # Modulate magnitudes in selected bins
-            for bi, bit in enumerate(bits):
-                s = 1.0 if bit == 1 else -1.0
-                f0 = start_frame + bi * self.frames_per_bit
-                f1 = f0 + self.frames_per_bit
-                # Apply multiplicative perturbation with PN
-                # Keep phase unchanged; only magnitude slightly biased
-                mag = np.abs(X[bins, f0:f1])
-                ph = np.angle(X[bins, f0:f1])
-                mag2 = mag * (1.0 + (self.alpha * s * pn[:, None]))
-                X[bins, f0:f1] = mag2 * np.exp(1j * ph)
-
-            y = istft_np(X, win, hop=self.hop, length=len(x), pad=pad)
-
-            # Put back into audio
-            out = audio_i16.astype(np.int32)
-            out[:, channel] = _from_float32_pcm(y).astype(np.int32)
-            out = np.clip(out, -32768, 32767).astype(np.int16)
-
-            with wave.open(output_audio_path, "wb") as w:
-                w.setparams(params)
-                w.writeframes(out.tobytes())
-
-            print(f"✅ Embedded {len(message.encode('utf-8'))} bytes using stft_ss into: {output_audio_path}")
-
-        finally:
-            for t in temp_files:
-                try:
-                    os.remove(t)
-                except Exception:
-                    pass
+        reader = open_audio(input_audio_path)
+        params = reader.params
+        sr = params.framerate
+        x_i16 = reader.frames[:, channel]
+        n = len(x_i16)
+
+        # Same framing as stft_np/istft_np (reflect pad of n_fft), worked
+        # through in chunks of frames below
+        pad = self.n_fft
+        n_frames = 1 + (n + 2 * pad - self.n_fft) // self.hop
+        bins = self._select_bins(sr)
+        pn = self._pn_pattern(len(bins))
+
+        payload_bits = self._build_payload_bits(message)
+        bits = self.PREAMBLE_BITS + payload_bits
+
+        start_frame = int((self.start_offset_s * sr) / self.hop)
+        frames_needed = len(bits) * self.frames_per_bit
+        if start_frame + frames_needed >= n_frames:
+            dur_s = (n_frames * self.hop) / sr
+            need_s = ((start_frame + frames_needed) * self.hop) / sr
+            raise ValueError(
+                f"Audio too short for payload. Duration={dur_s:.2f}s, need≈{need_s:.2f}s. "
+                "Shorten message or lower frames_per_bit / repeat."
+            )
+
+        # istft_np drops the padding and zero-fills up to len(x)
+        y_len = self.n_fft + self.hop * (n_frames - 1)
+        n_out = min(n, y_len - 2 * pad)
+
+        with WavWriter(output_audio_path, params) as writer:
+            for first, start, stop in stft_chunks(n_frames, self.n_fft, self.hop):
+                x_pad = _reflect_segment(x_i16, pad, first * self.hop,
+                                         (stop - 1) * self.hop + self.n_fft)
+                X_frames = stft(x_pad, n_fft=self.n_fft, hop=self.hop)
+                X = X_frames.T
+
+                # Modulate magnitudes in selected bins of the frames in
+                # this chunk (bits may straddle two chunks)
+                b0 = max(0, (first - start_frame) // self.frames_per_bit)
+                b1 = min(len(bits), -(-(stop - start_frame) // self.frames_per_bit))
+                for bi in range(b0, b1):
+                    s = 1.0 if bits[bi] == 1 else -1.0
+                    f0 = max(first, start_frame + bi * self.frames_per_bit) - first
+                    f1 = min(stop, start_frame + (bi + 1) * self.frames_per_bit) - first
+                    # Apply multiplicative perturbation with PN
+                    # Keep phase unchanged; only magnitude slightly biased
+                    mag = np.abs(X[bins, f0:f1])
+                    ph = np.angle(X[bins, f0:f1])
+                    mag2 = mag * (1.0 + (self.alpha * s * pn[:, None]))
+                    X[bins, f0:f1] = mag2 * np.exp(1j * ph)
+
+                y = istft(X_frames, n_fft=self.n_fft, hop=self.hop)
+
+                # Samples of the padded signal this chunk completes,
+                # shifted back to the unpadded timeline
+                end = stop * self.hop if stop < n_frames else y_len
+                t0 = max(0, start * self.hop - pad)
+                t1 = min(n_out, end - pad)
+                if t1 <= t0:
+                    continue
+                # Put back into audio
+                out = np.array(reader.frames[t0:t1])
+                out[:, channel] = _from_float32_pcm(y[t0 + pad - first * self.hop:t1 + pad - first * self.hop])
+                writer.write(out)
+
+            if n_out < n:
+                out = np.array(reader.frames[n_out:])
+                out[:, channel] = 0
+                writer.write(out)
+
+        print(f"✅ Embedded {len(message.encode('utf-8'))} bytes using stft_ss into: {output_audio_path}")
 
     def extract(self, audio_path: str, channel: int = 0, max_search_seconds: float = 30.0) -> str | None:
         """
         Blind extraction from a single audio file.
         Searches for the preamble in the first `max_search_seconds`.
         """
-        wav_path, converted = convert_to_wav(audio_path)
-        temp_files = [wav_path] if converted else []
-        try:
-            with wave.open(wav_path, "rb") as w:
-                params = w.getparams()
-                sr = params.framerate
-                n_channels = params.nchannels
-                frames = w.readframes(w.getnframes())
-                audio_i16 = np.frombuffer(frames, dtype=np.int16)
-
-            audio_i16 = audio_i16.reshape(-1, n_channels)
-            x = _to_float32_pcm(audio_i16[:, channel])
-
-            X, win, pad = stft_np(x, n_fft=self.n_fft, hop=self.hop)
-            bins = self._select_bins(sr)
-            pn = self._pn_pattern(len(bins))
-
-            # helper to decode one bit at a given bit index (frame start)
-            def decode_bit_at(frame_start: int) -> float:
-                f0 = frame_start
-                f1 = f0 + self.frames_per_bit
-                if f1 > X.shape[1]:
-                    return 0.0
-                # Use log-magnitude for better codec robustness
-                mag = np.abs(X[bins, f0:f1]) + 1e-9
-                feat = np.log(mag)
-                # correlation with PN across bins, sum across frames
-                score = float(np.sum((pn[:, None] * feat)))
-                return score
-
-            # Search window in frames
-            max_frames = int((max_search_seconds * sr) / self.hop)
-            max_frames = min(max_frames, X.shape[1] - (len(self.PREAMBLE_BITS) * self.frames_per_bit) - 1)
-            if max_frames <= 1:
-                return None
-
-            # Precompute bit scores for candidate starts in steps of frames_per_bit/2 for robustness
-            step = max(1, self.frames_per_bit // 2)
-
-            best = None  # (matches, start_frame)
-            for start_frame in range(0, max_frames, step):
-                # decode preamble bits
-                scores = []
-                for i in range(len(self.PREAMBLE_BITS)):
-                    scores.append(decode_bit_at(start_frame + i * self.frames_per_bit))
-                # Convert to bits by sign
-                cand = [1 if s >= 0 else 0 for s in scores]
-                matches = sum(1 for a, b in zip(cand, self.PREAMBLE_BITS) if a == b)
-                if best is None or matches > best[0]:
-                    best = (matches, start_frame)
-
-                # early exit if strong match
-                if matches >= len(self.PREAMBLE_BITS) - 1:
-                    best = (matches, start_frame)
-                    break
-
-            if best is None or best[0] < int(0.80 * len(self.PREAMBLE_BITS)):
-                print("❌ stft_ss: preamble not found (try increasing alpha/frames_per_bit, or search window).")
-                return None
+        reader = open_audio(audio_path, cache=False)
+        sr = reader.framerate
+        x_i16 = reader.frames[:, channel]
+        n = len(x_i16)
+
+        # Same framing as stft_np; frames are only computed for the
+        # chunks the search and the payload actually read
+        pad = self.n_fft
+        n_frames = 1 + (n + 2 * pad - self.n_fft) // self.hop
+        bins = self._select_bins(sr)
+        pn = self._pn_pattern(len(bins))
+        chunk_features = {}
+
+        def features(f0: int, f1: int) -> np.ndarray:
+            """Log-magnitude of the selected bins, [bins, f0:f1] (contiguous)."""
+            parts = []
+            for c in range(f0 // STFT_CHUNK_FRAMES, (f1 - 1) // STFT_CHUNK_FRAMES + 1):
+                first = c * STFT_CHUNK_FRAMES
+                if c not in chunk_features:
+                    stop = min(n_frames, first + STFT_CHUNK_FRAMES)
+                    x_pad = _reflect_segment(x_i16, pad, first * self.hop,
+                                             (stop - 1) * self.hop + self.n_fft)
+                    X = stft(x_pad, n_fft=self.n_fft, hop=self.hop).T
+                    # Use log-magnitude for better codec robustness
+                    mag = np.abs(X[bins]) + 1e-9
+                    chunk_features[c] = np.log(mag)
+                parts.append(chunk_features[c][:, max(f0, first) - first:f1 - first])
+            return np.concatenate(parts, axis=1) if len(parts) > 1 else np.ascontiguousarray(parts[0])
+
+        # helper to decode one bit at a given bit index (frame start)
+        def decode_bit_at(frame_start: int) -> float:
+            f0 = frame_start
+            f1 = f0 + self.frames_per_bit
+            if f1 > n_frames:
+                return 0.0
+            feat = features(f0, f1)
+            # correlation with PN across bins, sum across frames
+            score = float(np.sum((pn[:, None] * feat)))
+            return score
+
+        # Search window in frames
+        max_frames = int((max_search_seconds * sr) / self.hop)
+        max_frames = min(max_frames, n_frames - (len(self.PREAMBLE_BITS) * self.frames_per_bit) - 1)
+        if max_frames <= 1:
+            return None
 
-            _, start_frame = best
-            payload_start = start_frame + len(self.PREAMBLE_BITS) * self.frames_per_bit
-
-            # Decode header first to know how many bits to read.
-            # But header bits are repetition-coded; read enough for 48 * repeat bits
-            hdr_bits_needed = 48 * self.repeat
-            hdr_scores = []
-            for i in range(hdr_bits_needed):
-                bit_i_frame = payload_start + i * self.frames_per_bit
-                hdr_scores.append(decode_bit_at(bit_i_frame))
-            hdr_bits = [1 if s >= 0 else 0 for s in hdr_scores]
-
-            # Try to parse header; if fail, try flipping threshold (rare)
-            tmp = self._majority_vote(hdr_bits, self.repeat)
-            if len(tmp) < 48:
-                return None
-            header = self._bits_to_bytes(tmp[:48])
-            msg_len = struct.unpack(">H", header[:2])[0]
-
-            total_payload_bits = (48 + msg_len*8) * self.repeat
-            payload_scores = []
-            for i in range(total_payload_bits):
-                bit_i_frame = payload_start + i * self.frames_per_bit
-                if bit_i_frame + self.frames_per_bit > X.shape[1]:
-                    break
-                payload_scores.append(decode_bit_at(bit_i_frame))
-            payload_bits = [1 if s >= 0 else 0 for s in payload_scores]
+        # Precompute bit scores for candidate starts in steps of frames_per_bit/2 for robustness
+        step = max(1, self.frames_per_bit // 2)
+
+        best = None  # (matches, start_frame)
+        for start_frame in range(0, max_frames, step):
+            # decode preamble bits
+            scores = []
+            for i in range(len(self.PREAMBLE_BITS)):
+                scores.append(decode_bit_at(start_frame + i * self.frames_per_bit))
+            # Convert to bits by sign
+            cand = [1 if s >= 0 else 0 for s in scores]
+            matches = sum(1 for a, b in zip(cand, self.PREAMBLE_BITS) if a == b)
+            if best is None or matches > best[0]:
+                best = (matches, start_frame)
+
+            # early exit if strong match
+            if matches >= len(self.PREAMBLE_BITS) - 1:
+                best = (matches, start_frame)
+                break
+
+        if best is None or best[0] < int(0.80 * len(self.PREAMBLE_BITS)):
+            print("❌ stft_ss: preamble not found (try increasing alpha/frames_per_bit, or search window).")
+            return None
 
-            msg = self._parse_payload_bits(payload_bits)
-            if msg is None:
-                print("❌ stft_ss: failed CRC/parse (try increasing alpha/frames_per_bit/repeat).")
-                return None
+        _, start_frame = best
+        payload_start = start_frame + len(self.PREAMBLE_BITS) * self.frames_per_bit
+
+        # Decode header first to know how many bits to read.
+        # But header bits are repetition-coded; read enough for 48 * repeat bits
+        hdr_bits_needed = 48 * self.repeat
+        hdr_scores = []
+        for i in range(hdr_bits_needed):
+            bit_i_frame = payload_start + i * self.frames_per_bit
+            hdr_scores.append(decode_bit_at(bit_i_frame))
+        hdr_bits = [1 if s >= 0 else 0 for s in hdr_scores]
+
+        # Try to parse header; if fail, try flipping threshold (rare)
+        tmp = self._majority_vote(hdr_bits, self.repeat)
+        if len(tmp) < 48:
+            return None
+        header = self._bits_to_bytes(tmp[:48])
+        msg_len = struct.unpack(">H", header[:2])[0]
 
-            print("✅ stft_ss: extracted message successfully.")
-            return msg
+        total_payload_bits = (48 + msg_len*8) * self.repeat
+        payload_scores = []
+        for i in range(total_payload_bits):
+            bit_i_frame = payload_start + i * self.frames_per_bit
+            if bit_i_frame + self.frames_per_bit > n_frames:
+                break
+            payload_scores.append(decode_bit_at(bit_i_frame))
+        payload_bits = [1 if s >= 0 else 0 for s in payload_scores]
+
+        msg = self._parse_payload_bits(payload_bits)
+        if msg is None:
+            print("❌ stft_ss: failed CRC/parse (try increasing alpha/frames_per_bit/repeat).")
+            return None
 
-        finally:
-            for t in temp_files:
-                try:
-                    os.remove(t)
-                except Exception:
-                    pass
+        print("✅ stft_ss: extracted message successfully.")
+        return msg
 
 
 
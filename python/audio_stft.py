@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Vectorized Hann STFT / ISTFT shared by the audio codecs.
+
+audio_stegano_hybrid and audio_stegano_stft_ss each had their own STFT,
+ISTFT and frame-energy code running one frame per Python iteration (an
+rfft or irfft call plus an overlap-add slice per frame), which for a
+minutes-long track means tens of thousands of calls per pass.  Here the
+frames are a strided view of the signal, transformed by batched
+rfft/irfft calls, and overlap-added in ceil(n_fft / hop) array additions: each
+frame is cut into hop-sized pieces and piece j of every frame is added to
+the hop-aligned output blocks j, j+1, ... at once.  Those additions run
+in frame order, as the per-frame loops did, so results are bit-identical
+to them.
+
+The window and the overlap-added window power (wsum) that normalizes the
+ISTFT depend only on (n_fft, hop, frames) and are cached; chunked callers
+(wav_io.stft_chunks) ask for the same few frame counts over and over.
+
+Transforms run BATCH_FRAMES frames at a time: one huge batch is slower
+than the per-frame loop it replaces (first-touch cost of the temporaries),
+a few hundred frames per call is faster than both.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from wav_io import STFT_CHUNK_FRAMES, iter_chunks
+
+# Frames per rfft/irfft call
+BATCH_FRAMES = STFT_CHUNK_FRAMES
+
+
+@lru_cache(maxsize=None)
+def hann(n_fft: int) -> np.ndarray:
+    """float32 Hann window (read-only, shared)."""
+    win = np.hanning(n_fft).astype(np.float32)
+    win.flags.writeable = False
+    return win
+
+
+def n_frames(n: int, n_fft: int, hop: int) -> int:
+    """Frames stft() returns for n samples."""
+    return 1 + (max(n, n_fft) - n_fft) // hop
+
+
+def frame_view(x: np.ndarray, n_fft: int, hop: int) -> np.ndarray:
+    """[frames, n_fft] read-only strided view of x; frame i starts at i * hop."""
+    return np.lib.stride_tricks.as_strided(
+        x,
+        shape=(n_frames(len(x), n_fft, hop), n_fft),
+        strides=(x.strides[0] * hop, x.strides[0]),
+        writeable=False
+    )
+
+
+def _float_frames(x: np.ndarray, n_fft: int, hop: int) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    if len(x) < n_fft:
+        x = np.pad(x, (0, n_fft - len(x)))
+    return frame_view(x, n_fft, hop)
+
+
+def stft(x: np.ndarray, n_fft: int = 2048, hop: int = 512) -> np.ndarray:
+    """
+    Hann-windowed STFT, complex64 [frames, freq_bins].  x is taken as
+    float32; shorter than n_fft, it is zero-padded to one frame.
+    """
+    frames = _float_frames(x, n_fft, hop)
+    win = hann(n_fft)
+    X = np.empty((len(frames), n_fft // 2 + 1), dtype=np.complex64)
+    for lo, hi in iter_chunks(len(frames), BATCH_FRAMES):
+        X[lo:hi] = np.fft.rfft(frames[lo:hi] * win, axis=1)
+    return X
+
+
+def frame_energy(x: np.ndarray, n_fft: int = 2048, hop: int = 512) -> np.ndarray:
+    """Short-time RMS energy of the Hann-windowed frames of x (as stft() frames them)."""
+    frames = _float_frames(x, n_fft, hop)
+    win = hann(n_fft)
+    env = np.empty(len(frames), dtype=np.float32)
+    for lo, hi in iter_chunks(len(frames), BATCH_FRAMES):
+        seg = frames[lo:hi] * win
+        env[lo:hi] = np.sqrt(np.mean(seg * seg, axis=1) + 1e-12)
+    return env
+
+
+def _output_blocks(count: int, n_fft: int, hop: int):
+    """Zeroed float32 output for `count` frames and its [blocks, hop] view."""
+    pieces = -(-n_fft // hop)
+    out = np.zeros((count + pieces - 1) * hop, dtype=np.float32)
+    return out, out.reshape(count + pieces - 1, hop)
+
+
+def _add_frames(blocks: np.ndarray, frames: np.ndarray, first: int, hop: int) -> None:
+    """Overlap-add frames [count, n_fft] as frames first, first + 1, ... of blocks."""
+    count, n_fft = frames.shape
+    # Output block b gets piece b - i of frame i; adding the last piece
+    # first adds frame b - pieces + 1 first, i.e. frames in ascending order
+    for j in reversed(range(-(-n_fft // hop))):
+        piece = frames[:, j * hop:(j + 1) * hop]
+        blocks[first + j:first + j + count, :piece.shape[1]] += piece
+
+
+def overlap_add(frames: np.ndarray, hop: int) -> np.ndarray:
+    """
+    Sum of float32 frames [frames, n_fft] placed hop samples apart; length
+    n_fft + hop * (frames - 1).
+    """
+    count, n_fft = frames.shape
+    out, blocks = _output_blocks(count, n_fft, hop)
+    _add_frames(blocks, frames, 0, hop)
+    return out[:n_fft + hop * (count - 1)]
+
+
+@lru_cache(maxsize=32)
+def window_sum(n_fft: int, hop: int, count: int) -> np.ndarray:
+    """Overlap-added squared window of `count` frames (read-only, shared)."""
+    win = hann(n_fft)
+    wsum = overlap_add(np.broadcast_to(win * win, (count, n_fft)), hop)
+    wsum.flags.writeable = False
+    return wsum
+
+
+def istft(X: np.ndarray, n_fft: int = 2048, hop: int = 512, length: int | None = None) -> np.ndarray:
+    """
+    Inverse of stft(): windowed overlap-add of irfft(X) for X [frames,
+    freq_bins], normalized by the window power.  float32, n_fft + hop *
+    (frames - 1) samples long unless cut to `length`.
+    """
+    count = X.shape[0]
+    win = hann(n_fft)
+    out, blocks = _output_blocks(count, n_fft, hop)
+    for lo, hi in iter_chunks(count, BATCH_FRAMES):
+        frames = np.fft.irfft(X[lo:hi], n=n_fft, axis=1).astype(np.float32)
+        _add_frames(blocks, frames * win, lo, hop)
+    y = out[:n_fft + hop * (count - 1)]
+    wsum = window_sum(n_fft, hop, count)
+
+    # Normalize overlap-add
+    nz = wsum > 1e-8
+    y[nz] /= wsum[nz]
+    if length is not None:
+        y = y[:length]
+    return y
@@ -27,3 +27,14 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'mp4', 'avi', 'mov', '
 HOST = '0.0.0.0'
 PORT = 5000
 DEBUG = True
+
+# Warm worker processes for media jobs (see worker_pool.py)
+WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', os.cpu_count() or 2))
+
+# Clean (marker-free) unscrambled videos reused across buyers (see unscramble_cache.py)
+UNSCRAMBLE_CACHE_FOLDER = os.environ.get('UNSCRAMBLE_CACHE_FOLDER', os.path.join(BASE_DIR, 'cache', 'unscrambled'))
+UNSCRAMBLE_CACHE_MAX_BYTES = int(float(os.environ.get('UNSCRAMBLE_CACHE_MAX_GB', 10)) * 1024 ** 3)
+
+# Decoded PCM of compressed audio inputs (mp3, m4a, ...) reused across requests (see audio_decode.py)
+PCM_CACHE_FOLDER = os.environ.get('PCM_CACHE_FOLDER', os.path.join(BASE_DIR, 'cache', 'pcm'))
+PCM_CACHE_MAX_BYTES = int(float(os.environ.get('PCM_CACHE_MAX_GB', 2)) * 1024 ** 3)
@@ -14,8 +14,11 @@ import numpy as np
 import os
 import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Optional
 
+from video_pipeline import probe_keyframes, split_frame_ranges
+
 try:
     from reedsolo import RSCodec
     HAS_REEDSOLO = True
@@ -63,12 +66,62 @@ def compute_section_difference(
     return float(diff_gray.mean())
 
 
+def _section_edges(size: int, divisions: int) -> np.ndarray:
+    """Section boundaries along one axis; the last section takes the remainder."""
+    step = size // divisions
+    return np.array([i * step for i in range(divisions)] + [size])
+
+
+def section_differences(
+    current_frame: np.ndarray,
+    previous_frame: np.ndarray,
+    h_divisions: int,
+    v_divisions: int,
+    scratch: Optional[dict] = None
+) -> np.ndarray:
+    """
+    compute_section_difference() for every section at once, row-major.
+
+    One absdiff + grayscale conversion over the whole frame, then each
+    section's mean comes from four lookups in the integral image.  The sums
+    are exact integers, so the means equal the per-section np.mean values.
+    Pass a dict as `scratch` to reuse the diff/gray/integral buffers across
+    frames.
+    """
+    h, w = current_frame.shape[:2]
+    if scratch is None:
+        scratch = {}
+    if scratch.get("shape") != current_frame.shape:
+        scratch.clear()
+        scratch["shape"] = current_frame.shape
+        scratch["diff"] = np.empty_like(current_frame)
+        scratch["gray"] = np.empty((h, w), dtype=np.uint8)
+        scratch["sums"] = np.empty((h + 1, w + 1), dtype=np.int32)
+
+    diff = cv2.absdiff(current_frame, previous_frame, dst=scratch["diff"])
+    if diff.ndim == 3:
+        diff_gray = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY, dst=scratch["gray"])
+    else:
+        diff_gray = diff
+    # int32 holds 255 * 2^23 pixels, far more than any frame
+    sums = cv2.integral(diff_gray, sum=scratch["sums"], sdepth=cv2.CV_32S)
+
+    ys = _section_edges(h, v_divisions)
+    xs = _section_edges(w, h_divisions)
+    y1, y2 = ys[:-1, None], ys[1:, None]
+    x1, x2 = xs[None, :-1], xs[None, 1:]
+    totals = (sums[y2, x2].astype(np.int64) - sums[y1, x2] - sums[y2, x1] + sums[y1, x1])
+    areas = (y2 - y1) * (x2 - x1)
+    return (totals / areas).ravel()
+
+
 def decode_frame_pair(
     current_frame: np.ndarray,
     previous_frame: np.ndarray,
     h_divisions: int,
     v_divisions: int,
-    threshold: Optional[float] = None
+    threshold: Optional[float] = None,
+    scratch: Optional[dict] = None
 ) -> List[int]:
     """
     Decode bits from a pair of consecutive frames by comparing sections.
@@ -77,38 +130,19 @@ def decode_frame_pair(
     - If section difference >= threshold: bit = 1 (not duplicated, natural change)
     
     Returns list of bits (one per section, in row-major order).
+    `scratch` is passed through to section_differences().
     """
-    bits = []
-    total_sections = h_divisions * v_divisions
-    
-    # Compute all differences first
-    differences = []
-    for idx in range(total_sections):
-        row = idx // h_divisions
-        col = idx % h_divisions
-        
-        diff = compute_section_difference(
-            current_frame,
-            previous_frame,
-            row, col,
-            h_divisions,
-            v_divisions
-        )
-        differences.append(diff)
+    differences = section_differences(current_frame, previous_frame,
+                                      h_divisions, v_divisions, scratch)
     
     # If no threshold provided, use adaptive threshold (between low and high values)
     if threshold is None:
         # Use the median as threshold - sections below median are 0, above are 1
         threshold = np.median(differences)
     
-    # Decode bits based on threshold
-    for diff in differences:
-        if diff < threshold:
-            bits.append(0)  # Duplicated section
-        else:
-            bits.append(1)  # Non-duplicated section
-    
-    return bits
+    # Decode bits based on threshold: below = duplicated section (0),
+    # otherwise natural change (1)
+    return (differences >= threshold).astype(int).tolist()
 
 
 def bits_to_bytes(bits: List[int], ecc_symbols: int = 0) -> bytes:
@@ -147,6 +181,78 @@ def bits_to_bytes(bits: List[int], ecc_symbols: int = 0) -> bytes:
     return bytes(byte_list)
 
 
+def _decode_frame_range(
+    input_path: str,
+    h_divisions: int,
+    v_divisions: int,
+    frame_interval: int,
+    difference_threshold: Optional[float],
+    start: int = 0,
+    end: Optional[int] = None,
+    verbose: bool = True,
+) -> Tuple[List[int], int, int]:
+    """
+    Decode the encoded frame pairs whose current frame lies in [start, end).
+
+    Only frame_interval-th frames and the frame before each are needed, so
+    every other frame is grab()bed (demuxed and decoded, but never converted
+    to BGR), and the two needed frames alternate between two reused buffers.
+    Returns (bits, encoded frames found, last frame index + 1).
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {input_path}")
+
+    # Start one frame early so the first pair in range has its previous frame
+    frame_idx = max(0, start - 1)
+    if frame_idx > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+
+    decoded_bits: List[int] = []
+    encoded_frames_found = 0
+    frames = [None, None]
+    previous_frame = None
+    scratch: dict = {}
+
+    try:
+        while end is None or frame_idx < end:
+            is_current = frame_idx >= max(start, 1) and frame_idx % frame_interval == 0
+            is_previous = (frame_idx + 1) % frame_interval == 0
+            if not (is_current or is_previous):
+                if not cap.grab():
+                    break
+                previous_frame = None
+                frame_idx += 1
+                continue
+
+            slot = frames[frame_idx % 2]
+            ok, frame = cap.read(slot)
+            if not ok:
+                break
+            frames[frame_idx % 2] = frame
+
+            if is_current and previous_frame is not None:
+                decoded_bits.extend(decode_frame_pair(
+                    frame,
+                    previous_frame,
+                    h_divisions,
+                    v_divisions,
+                    difference_threshold,
+                    scratch
+                ))
+                encoded_frames_found += 1
+
+                if verbose and encoded_frames_found % 10 == 0:
+                    print(f"  Decoded {encoded_frames_found} frames, {len(decoded_bits)} bits so far...")
+
+            previous_frame = frame
+            frame_idx += 1
+    finally:
+        cap.release()
+
+    return decoded_bits, encoded_frames_found, frame_idx
+
+
 def decode_code_from_video_duplicate(
     input_path: str,
     h_divisions: int = 4,
@@ -155,6 +261,7 @@ def decode_code_from_video_duplicate(
     difference_threshold: Optional[float] = None,
     max_frames: Optional[int] = None,
     ecc_symbols: int = 0,
+    workers: int = 1,
 ) -> bytes:
     """
     Decode secret data from a video using frame-to-frame section comparison.
@@ -167,6 +274,9 @@ def decode_code_from_video_duplicate(
         difference_threshold: Threshold for detecting duplicates (None = adaptive)
         max_frames: Maximum number of frames to process (None for all)
         ecc_symbols: Reed-Solomon error correction symbols (0 = disabled)
+        workers: > 1 splits the video into frame ranges decoded in parallel
+                 worker processes (each pair is decoded on its own, so the
+                 bits are identical to a serial run)
     
     Returns:
         Decoded bytes
@@ -177,6 +287,10 @@ def decode_code_from_video_duplicate(
     cap = cv2.VideoCapture(input_path)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open video: {input_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    frame_interval = max(1, frame_interval)
     
     total_sections = h_divisions * v_divisions
     bits_per_frame = total_sections
@@ -191,42 +305,34 @@ def decode_code_from_video_duplicate(
     if ecc_symbols > 0:
         print(f"Error correction: Reed-Solomon with {ecc_symbols} symbols")
     
-    decoded_bits: List[int] = []
-    frame_idx = 0
-    encoded_frames_found = 0
-    previous_frame = None
+    end = max_frames or None
+    span = max(total_frames, 0)
+    if end is not None:
+        span = min(span, end) if span else end
+    ranges = []
+    if workers > 1 and span > 0:
+        ranges = split_frame_ranges(span, workers, probe_keyframes(input_path, fps))
     
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-        
-        if max_frames and frame_idx >= max_frames:
-            break
-        
-        # Need at least 2 frames to decode
-        if previous_frame is not None and frame_idx > 0:
-            # Check if this frame should contain encoded data
-            if frame_idx % frame_interval == 0:
-                # Decode bits from this frame pair
-                bits = decode_frame_pair(
-                    frame,
-                    previous_frame,
-                    h_divisions,
-                    v_divisions,
-                    difference_threshold
-                )
-                
-                decoded_bits.extend(bits)
-                encoded_frames_found += 1
-                
-                if encoded_frames_found % 10 == 0:
-                    print(f"  Decoded {encoded_frames_found} frames, {len(decoded_bits)} bits so far...")
-        
-        previous_frame = frame.copy()
-        frame_idx += 1
-    
-    cap.release()
+    if len(ranges) > 1:
+        # Frame counts from container metadata can be off; the last range reads to EOF
+        ranges[-1] = (ranges[-1][0], end)
+        print(f"Decoding {len(ranges)} frame ranges in parallel, starting at frames "
+              f"{[r_start for r_start, _ in ranges]}")
+        with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [
+                pool.submit(_decode_frame_range, input_path, h_divisions, v_divisions,
+                            frame_interval, difference_threshold, r_start, r_end, False)
+                for r_start, r_end in ranges
+            ]
+            results = [f.result() for f in futures]
+        decoded_bits = [bit for bits, _, _ in results for bit in bits]
+        encoded_frames_found = sum(found for _, found, _ in results)
+        frame_idx = results[-1][2]
+    else:
+        decoded_bits, encoded_frames_found, frame_idx = _decode_frame_range(
+            input_path, h_divisions, v_divisions, frame_interval,
+            difference_threshold, 0, end
+        )
     
     print(f"\nDecoding complete.")
     print(f"Total frames processed: {frame_idx}")
@@ -273,6 +379,8 @@ def main():
     parser.add_argument("--ecc", type=int, default=10,
                         help="Reed-Solomon error correction symbols (must match encoding, 0=disabled)")
     parser.add_argument("--output", "-o", help="Output file to save decoded text")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Decode frame ranges in N parallel processes (default: 1)")
     
     args = parser.parse_args()
     
@@ -285,6 +393,7 @@ def main():
             difference_threshold=args.threshold,
             max_frames=args.max_frames,
             ecc_symbols=args.ecc,
+            workers=args.workers,
         )
         
         print("\n=== RAW BYTES (first 128) ===")
@@ -7,7 +7,53 @@ import argparse
 from typing import List, Tuple, Optional
 
 
-def detect_duplicate_rows(image: np.ndarray, tolerance: int = 0, diff_fraction: float = 0.0) -> List[int]:
+# embed_code_image duplicates 5 columns and 5 rows at cumulative sums of the
+# user_id's ASCII codes, and each insert shifts the later ones down by one, so
+# the k-th inserted line lands at index <= 127 * k + k.
+USER_ID_LINES = 5
+USER_ID_REACH = USER_ID_LINES * (127 + 1)
+
+# Lines compared per vectorized chunk (bounds the diff buffer on huge photos)
+_CHUNK_LINES = 256
+
+
+def _duplicate_lines(image: np.ndarray, axis: int, tolerance: int, diff_fraction: float,
+                     early_exit: bool) -> List[int]:
+    """
+    Indices i along `axis` (0 = rows, 1 = columns) where line i matches line
+    i - 1: at most int(line_length * diff_fraction) pixels have a channel
+    differing by more than `tolerance`.
+
+    Adjacent lines are compared a chunk at a time as whole arrays.  With
+    early_exit only the lines embed_code_image can reach (USER_ID_REACH) are
+    examined and the scan stops at the first USER_ID_LINES matches, which
+    are all reconstruct_user_id_from_positions() reads.
+    """
+    lines = image.shape[axis]
+    length = image.shape[1 - axis]
+    max_diff_pixels = int(length * diff_fraction)
+    stop = min(lines, USER_ID_REACH + 1) if early_exit else lines
+
+    duplicates: List[int] = []
+    for start in range(1, stop, _CHUNK_LINES):
+        end = min(start + _CHUNK_LINES, stop)
+        if axis == 0:
+            cur, prev = image[start:end], image[start - 1:end - 1]
+        else:
+            cur, prev = image[:, start:end], image[:, start - 1:end - 1]
+        # |cur - prev| without leaving uint8
+        diff = np.maximum(cur, prev)
+        diff -= np.minimum(cur, prev)
+        off = (diff.max(axis=2) > tolerance).sum(axis=1 - axis)
+        hits = np.flatnonzero(off <= max_diff_pixels) + start
+        duplicates.extend(int(i) for i in hits)
+        if early_exit and len(duplicates) >= USER_ID_LINES:
+            return duplicates[:USER_ID_LINES]
+    return duplicates
+
+
+def detect_duplicate_rows(image: np.ndarray, tolerance: int = 0, diff_fraction: float = 0.0,
+                          early_exit: bool = False) -> List[int]:
     """
     Detect rows that are duplicates of the previous row.
     Returns indices of detected duplicate rows (the inserted ones).
@@ -16,22 +62,17 @@ def detect_duplicate_rows(image: np.ndarray, tolerance: int = 0, diff_fraction:
         image: Input image (H, W, C)
         tolerance: Per-channel tolerance for matching (0 = exact)
         diff_fraction: Maximum fraction of pixels allowed to differ (0-0.05)
+        early_exit: Only scan rows a user_id can reach and stop after the
+                    first USER_ID_LINES duplicates
     
     Returns:
         List of row indices that are duplicates
     """
-    h, w, c = image.shape
-    duplicates = []
-    
-    for y in range(h - 1):
-        # Compare row y with row y+1
-        if rows_similar(image, y, y + 1, tolerance, diff_fraction):
-            duplicates.append(y + 1)
-    
-    return duplicates
+    return _duplicate_lines(image, 0, tolerance, diff_fraction, early_exit)
 
 
-def detect_duplicate_cols(image: np.ndarray, tolerance: int = 0, diff_fraction: float = 0.0) -> List[int]:
+def detect_duplicate_cols(image: np.ndarray, tolerance: int = 0, diff_fraction: float = 0.0,
+                          early_exit: bool = False) -> List[int]:
     """
     Detect columns that are duplicates of the previous column.
     Returns indices of detected duplicate columns (the inserted ones).
@@ -40,55 +81,30 @@ def detect_duplicate_cols(image: np.ndarray, tolerance: int = 0, diff_fraction:
         image: Input image (H, W, C)
         tolerance: Per-channel tolerance for matching (0 = exact)
         diff_fraction: Maximum fraction of pixels allowed to differ (0-0.05)
+        early_exit: Only scan columns a user_id can reach and stop after the
+                    first USER_ID_LINES duplicates
     
     Returns:
         List of column indices that are duplicates
     """
-    h, w, c = image.shape
-    duplicates = []
-    
-    for x in range(w - 1):
-        # Compare col x with col x+1
-        if cols_similar(image, x, x + 1, tolerance, diff_fraction):
-            duplicates.append(x + 1)
-    
-    return duplicates
+    return _duplicate_lines(image, 1, tolerance, diff_fraction, early_exit)
+
+
+def _lines_similar(line1: np.ndarray, line2: np.ndarray, tolerance: int,
+                   diff_fraction: float) -> bool:
+    max_diff_pixels = int(line1.shape[0] * diff_fraction)
+    diff = np.abs(line1.astype(int) - line2.astype(int))
+    return int((diff.max(axis=-1) > tolerance).sum()) <= max_diff_pixels
 
 
 def rows_similar(image: np.ndarray, y1: int, y2: int, tolerance: int, diff_fraction: float) -> bool:
     """Check if two rows are similar within tolerance."""
-    h, w, c = image.shape
-    max_diff_pixels = int(w * diff_fraction)
-    diff_pixels = 0
-    
-    for x in range(w):
-        pixel1 = image[y1, x]
-        pixel2 = image[y2, x]
-        
-        if np.any(np.abs(pixel1.astype(int) - pixel2.astype(int)) > tolerance):
-            diff_pixels += 1
-            if diff_pixels > max_diff_pixels:
-                return False
-    
-    return True
+    return _lines_similar(image[y1], image[y2], tolerance, diff_fraction)
 
 
 def cols_similar(image: np.ndarray, x1: int, x2: int, tolerance: int, diff_fraction: float) -> bool:
     """Check if two columns are similar within tolerance."""
-    h, w, c = image.shape
-    max_diff_pixels = int(h * diff_fraction)
-    diff_pixels = 0
-    
-    for y in range(h):
-        pixel1 = image[y, x1]
-        pixel2 = image[y, x2]
-        
-        if np.any(np.abs(pixel1.astype(int) - pixel2.astype(int)) > tolerance):
-            diff_pixels += 1
-            if diff_pixels > max_diff_pixels:
-                return False
-    
-    return True
+    return _lines_similar(image[:, x1], image[:, x2], tolerance, diff_fraction)
 
 
 def reconstruct_user_id_from_positions(col_positions: List[int], row_positions: List[int],
@@ -176,7 +192,8 @@ def reconstruct_user_id_from_positions(col_positions: List[int], row_positions:
     
 
 
-def decode_user_id_from_image(input_path: str, tolerance: int = 0, diff_fraction: float = 0.0) -> Optional[str]:
+def decode_user_id_from_image(input_path: str, tolerance: int = 0, diff_fraction: float = 0.0,
+                              early_exit: bool = False) -> Optional[str]:
     """
     Decode user tracking information from an image by detecting duplicated rows/columns.
     
@@ -184,6 +201,8 @@ def decode_user_id_from_image(input_path: str, tolerance: int = 0, diff_fraction
         input_path: Path to input image
         tolerance: Per-channel tolerance for duplicate detection (0 = exact match)
         diff_fraction: Max fraction of pixels allowed to differ (0.0 = none)
+        early_exit: Only scan the lines a user_id can reach and stop at the
+                    first 5 duplicates per axis (same user_id, less work)
     
     Returns:
         Reconstructed user_id or None
@@ -200,8 +219,8 @@ def decode_user_id_from_image(input_path: str, tolerance: int = 0, diff_fraction
     print(f"Detection parameters: tolerance={tolerance}, diff_fraction={diff_fraction}")
     
     # Detect duplicated rows and columns
-    col_duplicates = detect_duplicate_cols(image, tolerance, diff_fraction)
-    row_duplicates = detect_duplicate_rows(image, tolerance, diff_fraction)
+    col_duplicates = detect_duplicate_cols(image, tolerance, diff_fraction, early_exit)
+    row_duplicates = detect_duplicate_rows(image, tolerance, diff_fraction, early_exit)
     
     # Remove duplicates from the lists (in case of consecutive duplicates)
     col_duplicates = sorted(list(set(col_duplicates)))
@@ -230,6 +249,8 @@ def main():
                         help="Per-channel tolerance for duplicate detection (0-30, default: 0)")
     parser.add_argument("--diff-fraction", "-d", type=float, default=0.0,
                         help="Max fraction of pixels allowed to differ (0.0-0.05, default: 0.0)")
+    parser.add_argument("--early-exit", action="store_true",
+                        help="Only scan lines a user_id can reach and stop after 5 duplicates per axis")
     
     args = parser.parse_args()
     
@@ -237,7 +258,8 @@ def main():
         user_id = decode_user_id_from_image(
             input_path=args.input,
             tolerance=args.tolerance,
-            diff_fraction=args.diff_fraction
+            diff_fraction=args.diff_fraction,
+            early_exit=args.early_exit
         )
         
         if user_id:
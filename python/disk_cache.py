@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Size-bounded, content-addressed on-disk caches.
+
+DiskLRUCache is a directory of finished entries named <key><ext>.  Entries
+are written to a temp name and renamed into place, so concurrent workers
+never see half-written files.  The directory is bounded by size: least
+recently used entries (by mtime, refreshed on every hit) are evicted after
+each insert.  Subclasses define what the key is made of (see
+unscramble_cache.UnscrambleCache and audio_decode.PcmCache).
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+_HASH_CHUNK = 1024 * 1024
+
+# (path, size, mtime_ns) -> sha256, so repeat requests don't re-read the source
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents (memoized on path, size and mtime)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+class DiskLRUCache:
+    """Size-bounded on-disk LRU of files with extension `ext`."""
+
+    # Name used in log messages
+    label = "Cache"
+
+    def __init__(self, cache_dir: str, max_bytes: int, ext: str):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ext = ext
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.ext)
+
+    def temp_path(self, key: str) -> str:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, f"{key}.{os.getpid()}.tmp{self.ext}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached entry, or None. A hit marks it recently used."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, src_path: str) -> Optional[str]:
+        """
+        Move src_path into the cache under key and evict down to max_bytes.
+        Returns the cached path, or None if the entry alone exceeds the budget
+        (src_path is removed either way).
+        """
+        if os.path.getsize(src_path) > self.max_bytes:
+            os.remove(src_path)
+            return None
+        path = self.path_for(key)
+        os.replace(src_path, path)
+        self.evict(keep=path)
+        return path
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """(path, size, mtime) of finished entries, least recently used first."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        found = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.ext) or ".tmp" in name:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # evicted by another worker
+            found.append((path, st.st_size, st.st_mtime))
+        return sorted(found, key=lambda e: e[2])
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Remove least recently used entries until under max_bytes. Returns bytes freed."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            freed += size
+        if freed:
+            print(f"🧹 {self.label}: evicted {freed / 1024 ** 2:.1f} MB")
+        return freed
+
+    def clear(self) -> None:
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -4,7 +4,12 @@ import numpy as np
 import os
 import sys
 import argparse
-from typing import Tuple, List
+from typing import Tuple, List, Optional
+
+from video_io import (
+    VideoIOOptions, open_video_reader, open_video_writer,
+    add_video_io_args, video_io_options_from_args,
+)
 
 
 def text_to_bytes(text: str) -> List[int]:
@@ -88,15 +93,17 @@ def embed_code_frames(
     cell_size: int = 10,
     cell_gap: int = 20,
     frame_interval: int = 30,
+    io_options: Optional[VideoIOOptions] = None,
 ):
     """
     Read input video, insert an extra frame every `frame_interval` frames,
     where the extra frame contains a code grid encoding part of secret_text.
+    io_options selects the video I/O backend and encoder settings.
     """
     if not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input video not found: {input_path}")
 
-    cap = cv2.VideoCapture(input_path)
+    cap = open_video_reader(input_path, io_options)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open video: {input_path}")
 
@@ -110,7 +117,7 @@ def embed_code_frames(
 
     # Prepare output writer
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    out = open_video_writer(output_path, fps, (width, height), fourcc, io_options)
     if not out.isOpened():
         cap.release()
         raise RuntimeError(f"Could not create output video: {output_path}")
@@ -199,6 +206,8 @@ def main():
     parser.add_argument("--cell-size", type=int, default=3, help="Dot size in pixels")
     parser.add_argument("--cell-gap", type=int, default=2, help="Gap between cells in pixels")
 
+    add_video_io_args(parser)
+
     args = parser.parse_args()
 
     try:
@@ -211,6 +220,7 @@ def main():
             cell_size=args.cell_size,
             cell_gap=args.cell_gap,
             frame_interval=args.interval,
+            io_options=video_io_options_from_args(args),
         )
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
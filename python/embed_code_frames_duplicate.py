@@ -14,7 +14,12 @@ import numpy as np
 import os
 import sys
 import argparse
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from video_io import (
+    VideoIOOptions, open_video_reader, open_video_writer,
+    add_video_io_args, video_io_options_from_args,
+)
 
 try:
     from reedsolo import RSCodec
@@ -116,6 +121,7 @@ def embed_code_frames_duplicate(
     frame_interval: int = 1,
     ecc_symbols: int = 0,
     brightness_shift: int = 15,
+    io_options: Optional[VideoIOOptions] = None,
 ):
     """
     Embed data by duplicating sections from previous frame.
@@ -130,6 +136,7 @@ def embed_code_frames_duplicate(
         frame_interval: Encode every N frames (1 = every frame, 2 = every other frame)
         ecc_symbols: Reed-Solomon error correction symbols (0 = disabled)
         brightness_shift: Brightness adjustment for non-duplicated sections
+        io_options: Video I/O backend and encoder settings (None = ffmpeg if installed)
     """
     if not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input video not found: {input_path}")
@@ -140,7 +147,7 @@ def embed_code_frames_duplicate(
     if not (v_divisions & (v_divisions - 1)) == 0 or v_divisions < 1:
         raise ValueError(f"v_divisions must be a power of 2, got {v_divisions}")
     
-    cap = cv2.VideoCapture(input_path)
+    cap = open_video_reader(input_path, io_options)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open video: {input_path}")
     
@@ -154,7 +161,7 @@ def embed_code_frames_duplicate(
     
     # Prepare output writer
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    out = open_video_writer(output_path, fps, (width, height), fourcc, io_options)
     if not out.isOpened():
         cap.release()
         raise RuntimeError(f"Could not create output video: {output_path}")
@@ -245,6 +252,8 @@ def main():
     parser.add_argument("--brightness-shift", type=int, default=15,
                         help="Brightness adjustment for non-duplicated sections (0=disabled, 15=recommended)")
     
+    add_video_io_args(parser)
+
     args = parser.parse_args()
     
     try:
@@ -257,6 +266,7 @@ def main():
             frame_interval=args.interval,
             ecc_symbols=args.ecc,
             brightness_shift=args.brightness_shift,
+            io_options=video_io_options_from_args(args),
         )
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -4,7 +4,8 @@ import numpy as np
 import os
 import sys
 import argparse
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
 
 
 def calculate_positions_from_user_id(user_id: str, image_width: int, image_height: int):
@@ -46,6 +47,15 @@ def calculate_positions_from_user_id(user_id: str, image_width: int, image_heigh
     return col_positions, row_positions
 
 
+def duplicate_line_index(size: int, indices: List[int]) -> np.ndarray:
+    """
+    Gather index that repeats each of the sorted `indices` right after itself:
+    image.take(duplicate_line_index(h, rows), axis=0) duplicates those rows.
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    return np.insert(np.arange(size, dtype=np.intp), indices + 1, indices)
+
+
 def insert_duplicate_rows(image: np.ndarray, row_indices: List[int]) -> np.ndarray:
     """
     Insert duplicate rows after each specified row index.
@@ -60,30 +70,7 @@ def insert_duplicate_rows(image: np.ndarray, row_indices: List[int]) -> np.ndarr
     """
     if not row_indices:
         return image.copy()
-    
-    h, w, c = image.shape
-    new_h = h + len(row_indices)
-    out = np.zeros((new_h, w, c), dtype=image.dtype)
-    
-    src_y = 0
-    out_y = 0
-    r_ptr = 0
-    
-    while src_y < h:
-        # Copy current source row to output
-        out[out_y] = image[src_y]
-        
-        # If this row should be duplicated, insert another identical row beneath it
-        if r_ptr < len(row_indices) and row_indices[r_ptr] == src_y:
-            out[out_y + 1] = image[src_y]
-            out_y += 2
-            r_ptr += 1
-        else:
-            out_y += 1
-        
-        src_y += 1
-    
-    return out
+    return image[duplicate_line_index(image.shape[0], row_indices)]
 
 
 def insert_duplicate_cols(image: np.ndarray, col_indices: List[int]) -> np.ndarray:
@@ -100,31 +87,19 @@ def insert_duplicate_cols(image: np.ndarray, col_indices: List[int]) -> np.ndarr
     """
     if not col_indices:
         return image.copy()
-    
-    h, w, c = image.shape
-    new_w = w + len(col_indices)
-    out = np.zeros((h, new_w, c), dtype=image.dtype)
-    
-    for y in range(h):
-        src_x = 0
-        out_x = 0
-        c_ptr = 0
-        
-        while src_x < w:
-            # Copy pixel
-            out[y, out_x] = image[y, src_x]
-            
-            # Duplicate if needed: insert same pixel to the right
-            if c_ptr < len(col_indices) and col_indices[c_ptr] == src_x:
-                out[y, out_x + 1] = image[y, src_x]
-                out_x += 2
-                c_ptr += 1
-            else:
-                out_x += 1
-            
-            src_x += 1
-    
-    return out
+    return image[:, duplicate_line_index(image.shape[1], col_indices)]
+
+
+def personalize_image(image: np.ndarray, user_id: str) -> np.ndarray:
+    """
+    The tracking-coded copy of `image` for one user_id: the row inserts and
+    then the column inserts of embed_code_in_image, done as a single gather.
+    """
+    height, width = image.shape[:2]
+    col_positions, row_positions = calculate_positions_from_user_id(user_id, width, height)
+    rows = duplicate_line_index(height, row_positions)
+    cols = duplicate_line_index(width, col_positions)
+    return image[np.ix_(rows, cols)]
 
 
 def embed_code_in_image(
@@ -163,9 +138,8 @@ def embed_code_in_image(
     print(f"Column positions to duplicate: {col_positions}")
     print(f"Row positions to duplicate: {row_positions}")
 
-    # Apply row inserts first (height changes), then column inserts (width changes)
-    after_rows = insert_duplicate_rows(image, row_positions)
-    after_cols = insert_duplicate_cols(after_rows, col_positions)
+    # Row inserts first (height changes), then column inserts (width changes)
+    after_cols = personalize_image(image, user_id)
 
     # Write the output image
     success = cv2.imwrite(output_path, after_cols)
@@ -181,22 +155,108 @@ def embed_code_in_image(
     print(f"Cols inserted: {len(col_positions)}")
 
 
+def output_path_for_user(output_template: str, user_id: str) -> str:
+    """
+    Fill '{user_id}' in the output template, or add '_<user_id>' before the
+    extension when the template has no placeholder.
+    """
+    if "{user_id}" in output_template:
+        return output_template.replace("{user_id}", user_id)
+    base, ext = os.path.splitext(output_template)
+    return f"{base}_{user_id}{ext}"
+
+
+def embed_code_in_images(
+    input_path: str,
+    output_template: str,
+    user_ids: Sequence[str],
+    workers: Optional[int] = None,
+) -> Dict[str, str]:
+    """
+    Personalize one image for many users: the source is decoded once, then
+    each user_id gets its own gather (personalize_image) and encode, run on a
+    thread pool (cv2.imwrite releases the GIL while encoding).
+    
+    Args:
+        input_path: Path to input image
+        output_template: Output path, with '{user_id}' where the ID goes
+                         (see output_path_for_user)
+        user_ids: 10-character user identifiers
+        workers: Encode threads (None = min(8, CPU count))
+    
+    Returns:
+        {user_id: output_path}
+    """
+    if not os.path.isfile(input_path):
+        raise FileNotFoundError(f"Input image not found: {input_path}")
+    for user_id in user_ids:
+        if len(user_id) != 10:
+            raise ValueError(f"user_id must be exactly 10 characters, got {user_id!r}")
+
+    image = cv2.imread(input_path)
+    if image is None:
+        raise RuntimeError(f"Could not read image: {input_path}")
+
+    height, width = image.shape[:2]
+    print(f"Embedding user tracking codes for {len(user_ids)} user(s)...")
+    print(f"Resolution: {width}x{height}")
+
+    def embed_one(user_id: str) -> str:
+        path = output_path_for_user(output_template, user_id)
+        if not cv2.imwrite(path, personalize_image(image, user_id)):
+            raise RuntimeError(f"Could not write output image: {path}")
+        return path
+
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        paths = list(pool.map(embed_one, user_ids))
+
+    outputs = dict(zip(user_ids, paths))
+    print("Done.")
+    for user_id, path in outputs.items():
+        print(f"  {user_id} -> {path}")
+    return outputs
+
+
+def _read_user_ids(text: str) -> List[str]:
+    """'id1,id2' or '@file' with one user_id per line."""
+    if text.startswith("@"):
+        with open(text[1:], "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    return [u.strip() for u in text.split(",") if u.strip()]
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Embed user tracking code into an image by duplicating pixel rows/columns."
     )
     parser.add_argument("--input", "-i", required=True, help="Input image file")
-    parser.add_argument("--output", "-o", required=True, help="Output image file")
-    parser.add_argument("--user-id", "-u", required=True, help="10-character user ID for tracking")
+    parser.add_argument("--output", "-o", required=True,
+                        help="Output image file (with --user-ids: template containing {user_id})")
+    users = parser.add_mutually_exclusive_group(required=True)
+    users.add_argument("--user-id", "-u", help="10-character user ID for tracking")
+    users.add_argument("--user-ids",
+                       help="Batch mode: comma-separated user IDs, or @file with one per line")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Batch mode encode threads (default: min(8, CPUs))")
 
     args = parser.parse_args()
 
     try:
-        embed_code_in_image(
-            input_path=args.input,
-            output_path=args.output,
-            user_id=args.user_id,
-        )
+        if args.user_ids:
+            embed_code_in_images(
+                input_path=args.input,
+                output_template=args.output,
+                user_ids=_read_user_ids(args.user_ids),
+                workers=args.workers,
+            )
+        else:
+            embed_code_in_image(
+                input_path=args.input,
+                output_path=args.output,
+                user_id=args.user_id,
+            )
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Per-job frame buffers for the scramble_video modules.
+
+Each transform stage (remap, HSV round trip, LPF/HPF split, watermark) writes
+into `out=` arrays taken from a BufferPool instead of allocating its result.
+Buffers are keyed by name and kept per thread, so the transform threads of a
+threaded pipeline never share scratch space; after the first frame a serial
+run allocates nothing.  `allocations` counts every buffer the pool has handed
+out fresh, which lets a benchmark check that the count stays flat per frame.
+"""
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+class BufferPool:
+    """Named, reusable, per-thread numpy buffers with an allocation counter."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.bytes_allocated = 0
+
+    def _buffers(self) -> Dict[str, np.ndarray]:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        return buffers
+
+    def _count(self, buf: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self.allocations += 1
+            self.bytes_allocated += buf.nbytes
+        return buf
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.uint8,
+            zero: bool = False) -> np.ndarray:
+        """
+        The calling thread's buffer `name`, allocated on first use or when the
+        shape or dtype changes.  Contents carry over from the previous use;
+        zero=True only zero-fills a newly allocated buffer (e.g. a canvas whose
+        borders are never written).
+        """
+        buffers = self._buffers()
+        buf = buffers.get(name)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = buffers[name] = self.new(shape, dtype, zero)
+        return buf
+
+    def new(self, shape: Tuple[int, ...], dtype=np.uint8,
+            zero: bool = False) -> np.ndarray:
+        """A fresh (counted) buffer, for results that outlive the call, e.g. frames
+        queued for the writer by a threaded pipeline."""
+        buf = np.zeros(shape, dtype=dtype) if zero else np.empty(shape, dtype=dtype)
+        return self._count(buf)
+
+    def output(self, name: str, shape: Tuple[int, ...], reuse: bool,
+               dtype=np.uint8, zero: bool = False) -> np.ndarray:
+        """get() when the result is consumed before the next frame (reuse=True,
+        i.e. a serial pipeline), otherwise new()."""
+        if reuse:
+            return self.get(name, shape, dtype, zero)
+        return self.new(shape, dtype, zero)
+
+    def summary(self) -> str:
+        return (f"{self.allocations} buffer allocation(s), "
+                f"{self.bytes_allocated / 1024 ** 2:.1f} MB")
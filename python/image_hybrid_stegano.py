@@ -11,6 +11,9 @@ import numpy as np
 from PIL import Image
 import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from prng import mulberry32_floats
 
 # Reed-Solomon for error correction
 try:
@@ -20,8 +23,24 @@ except ImportError:
     HAS_REEDSOLO = False
     print("Warning: reedsolo not available. Install with: pip install reedsolo")
 
+# Bit slots per redundant copy: max 255 bytes data + 30 bytes RS = 2280 bits, rounded up
+BITS_PER_COPY = 2400
+
+# Position samplers.  Version 1 is the original full shuffle of every (y, x, c)
+# position with RandomState; version 2 draws only the positions it needs from
+# mulberry32.  Images must be extracted with the version they were embedded with.
+SAMPLER_LEGACY = 1
+SAMPLER_FAST = 2
+SAMPLER_VERSIONS = (SAMPLER_LEGACY, SAMPLER_FAST)
+
+# RS(30) codewords are at least 1 data byte + 30 ECC bytes
+RS_MIN_CODEWORD = 31
+# extract_seeds skips the RS decode when fewer of a seed's slots than this carry noise
+MIN_SEED_SIGNAL = 0.01
+
 class ImageHybridStegano:
-    def __init__(self, seed="default_seed", noise_intensity=64, redundancy=5):
+    def __init__(self, seed="default_seed", noise_intensity=64, redundancy=5,
+                 sampler_version=SAMPLER_LEGACY):
         """
         Initialize steganography with spatial domain noise embedding.
         
@@ -29,40 +48,70 @@ class ImageHybridStegano:
             seed: Seed for reproducible noise pattern generation
             noise_intensity: Fixed noise value (default 64 = 25% of 255)
             redundancy: Number of redundant copies of the data (default 5)
+            sampler_version: Position sampler (SAMPLER_LEGACY = 1, the format of
+                             existing images; SAMPLER_FAST = 2)
         """
+        if sampler_version not in SAMPLER_VERSIONS:
+            raise ValueError(f"Unknown sampler version: {sampler_version}")
         self.seed = seed
         self.noise_intensity = noise_intensity  # Fixed at 64 for 25% visibility
         self.redundancy = redundancy
+        self.sampler_version = sampler_version
         
-    def _generate_noise_pattern(self, shape, min_positions=None):
+    def _seed_int(self):
+        return int(hashlib.sha256(self.seed.encode()).hexdigest(), 16) % (2**32)
+
+    def _noise_positions(self, shape, count):
         """
-        Generate a deterministic noise pattern based on seed.
+        The first `count` embedding positions as flat indices into a C-order
+        (height, width, channels) array, i.e. (y * width + x) * channels + c.
         
         Args:
             shape: Image shape (height, width, channels)
-            min_positions: Minimum number of positions needed
+            count: Number of positions needed
             
         Returns:
-            List of (y, x, channel) positions
+            int64 array of min(count, total) distinct flat indices
         """
-        height, width, channels = shape
-        total_pixels = height * width * channels
-        
-        # Create deterministic random generator
-        seed_int = int(hashlib.sha256(self.seed.encode()).hexdigest(), 16) % (2**32)
-        rng = np.random.RandomState(seed_int)
-        
-        # Generate shuffled indices for all pixel positions
-        positions = []
-        for y in range(height):
-            for x in range(width):
-                for c in range(channels):
-                    positions.append((y, x, c))
-        
-        # Shuffle deterministically
-        rng.shuffle(positions)
-        
-        return positions
+        total = int(np.prod(shape))
+        count = min(count, total)
+        if self.sampler_version == SAMPLER_LEGACY:
+            return self._legacy_positions(total, count)
+        return self._fast_positions(total, count)
+
+    def _legacy_positions(self, total, count):
+        """
+        Version 1: RandomState(seed).shuffle of every position, as the old
+        list of (y, x, c) tuples did.  Shuffling a 1-D int array runs the same
+        Fisher-Yates loop with the same draws as shuffling that list, so the
+        order is identical at 4 bytes per position instead of a tuple each.
+        """
+        rng = np.random.RandomState(self._seed_int())
+        order = np.arange(total, dtype=np.int32 if total < 2**31 else np.int64)
+        rng.shuffle(order)
+        return order[:count].astype(np.int64)
+
+    def _fast_positions(self, total, count):
+        """
+        Version 2: distinct positions floor(u * total) from the mulberry32
+        stream, first occurrence wins, drawing more until `count` are found.
+        Costs O(count) instead of O(image).  When most of the image is needed
+        it is a full mulberry32-keyed permutation instead.
+        """
+        seed = self._seed_int()
+        if count * 4 >= total:
+            return np.argsort(mulberry32_floats(seed, total), kind="stable")[:count]
+
+        picked = np.empty(0, dtype=np.int64)
+        drawn = 0
+        while picked.size < count:
+            batch = 2 * (count - picked.size) + 64
+            draws = (mulberry32_floats(seed, batch, start=drawn) * total).astype(np.int64)
+            drawn += batch
+            candidates = np.concatenate([picked, draws])
+            _, first = np.unique(candidates, return_index=True)
+            picked = candidates[np.sort(first)]
+        return picked[:count]
     
     def embed(self, image_path, data, output_path):
         """
@@ -93,23 +142,20 @@ class ImageHybridStegano:
         # Convert to bit array
         bit_array = np.unpackbits(np.frombuffer(data_bytes, dtype=np.uint8))
         
-        # Generate noise pattern positions
-        noise_pattern = self._generate_noise_pattern(img_array.shape, len(bit_array))
-        
-        # Use fixed spacing for redundant copies (to match extraction)
-        bits_per_copy = 2400  # Same as extraction
-        
-        # Embed data redundantly with fixed 64-value noise (25% intensity)
+        # Embed data redundantly with fixed 64-value noise (25% intensity):
+        # copy `rep` uses positions rep * BITS_PER_COPY onward (fixed spacing,
+        # to match extraction); bits past the end of the image are dropped
+        positions = self._noise_positions(img_array.shape, self.redundancy * BITS_PER_COPY)
+        slots = (np.arange(self.redundancy)[:, None] * BITS_PER_COPY +
+                 np.arange(len(bit_array))[None, :]).ravel()
+        in_image = slots < len(positions)
+        # +64 for 1, -64 for 0
+        noise = np.where(np.tile(bit_array, self.redundancy) == 1,
+                         self.noise_intensity, -self.noise_intensity).astype(np.float32)
+
         modified_array = img_array.copy()
-        for rep in range(self.redundancy):
-            offset = rep * bits_per_copy
-            for i, bit in enumerate(bit_array):
-                idx = offset + i
-                if idx < len(noise_pattern):
-                    y, x, c = noise_pattern[idx]
-                    # Embed bit as uniform noise: +64 for 1, -64 for 0
-                    noise_value = self.noise_intensity if bit else -self.noise_intensity
-                    modified_array[y, x, c] += noise_value
+        # Positions are distinct, so a fancy-index add touches each one once
+        modified_array.reshape(-1)[positions[slots[in_image]]] += noise[in_image]
         
         # Clip values to valid range
         modified_array = np.clip(modified_array, 0, 255).astype(np.uint8)
@@ -130,6 +176,7 @@ class ImageHybridStegano:
             "redundancy": self.redundancy,
             "noise_intensity": self.noise_intensity,
             "noise_percentage": f"{self.noise_intensity/255*100:.1f}%",
+            "sampler_version": self.sampler_version,
             "image_shape": list(img_array.shape),
             "output_format": "PNG",
             "output_path": output_path
@@ -146,98 +193,192 @@ class ImageHybridStegano:
         Returns:
             Extracted string data or None if extraction fails
         """
-        # Load images
-        original_img = Image.open(original_path).convert('RGB')
-        modified_img = Image.open(modified_path).convert('RGB')
-        
-        original_array = np.array(original_img, dtype=np.float32)
-        modified_array = np.array(modified_img, dtype=np.float32)
+        original_array, modified_array = _load_image_pair(original_path, modified_path)
         
-        # Calculate difference (the noise we added)
-        diff = modified_array - original_array
-        
-        # Generate the same noise pattern
-        noise_pattern = self._generate_noise_pattern(original_array.shape, None)
-        
-        # Extract bits from each redundant copy
-        # We need to extract enough bits to account for max data + error correction
-        # Max: 255 bytes data + 30 bytes RS = 285 bytes = 2280 bits, round to 2400
-        bits_per_copy = 2400
-        
-        all_bits = []
-        for rep in range(self.redundancy):
-            bits = []
-            offset = rep * bits_per_copy
-            
-            for i in range(bits_per_copy):
-                idx = offset + i
-                if idx >= len(noise_pattern):
-                    break
-                    
-                y, x, c = noise_pattern[idx]
-                noise_val = diff[y, x, c]
-                
-                # Decode bit: positive noise = 1, negative = 0
-                # Use 0 as threshold since we add +64 or -64
-                bit = 1 if noise_val > 0 else 0
-                bits.append(bit)
-            
-            if bits:
-                all_bits.append(bits)
-        
-        if not all_bits:
+        # Read the same positions: copy `rep` holds up to BITS_PER_COPY bits
+        # (enough for max data + error correction), cut short at the image end
+        positions = self._noise_positions(original_array.shape, self.redundancy * BITS_PER_COPY)
+        if len(positions) == 0:
             print("Error: No bits extracted")
             return None
         
-        # Use majority voting across redundant copies
-        max_len = max(len(bits) for bits in all_bits)
-        consensus_bits = []
-        
-        for i in range(max_len):
-            votes = [bits[i] for bits in all_bits if i < len(bits)]
-            if votes:
-                # Majority vote
-                consensus_bits.append(1 if sum(votes) > len(votes) / 2 else 0)
-        
-        # Convert bits back to bytes
-        bit_array = np.array(consensus_bits[:len(consensus_bits) - len(consensus_bits) % 8], dtype=np.uint8)
-        byte_array = np.packbits(bit_array)
+        diffs = _noise_diffs(original_array, modified_array, positions)
+        length, _ = _payload_length(diffs, self.noise_intensity)
+        data, _ = _decode_payload(_vote_bits(diffs > 0), length)
+        return data
+    
+    def extract_seeds(self, original_path, modified_path, seeds, stop_at_first=True, workers=1):
+        """
+        Try many candidate seeds (e.g. every possible recipient of a leak)
+        against one image pair.  The images are loaded once; each seed costs
+        its position sampling plus a K-element gather, vote and RS decode.
         
-        # Try to decode with error correction
-        if HAS_REEDSOLO:
+        Args:
+            original_path: Path to the original image
+            modified_path: Path to the leaked image
+            seeds: Candidate seed strings, tried in order
+            stop_at_first: Stop at the first seed whose payload passes the
+                           Reed-Solomon check
+            workers: Processes computing seed positions in parallel (> 1 helps
+                     sampler version 1, where sampling shuffles the whole image)
+            
+        Returns:
+            List of {"seed", "data", "valid"} for the seeds tried, in order.
+            "valid" needs reedsolo; without it every seed is tried and none
+            is marked valid.
+        """
+        original_array, modified_array = _load_image_pair(original_path, modified_path)
+        count = self.redundancy * BITS_PER_COPY
+        seeds = list(seeds)
+
+        def scan(seed_positions):
+            results = []
+            for seed, positions in zip(seeds, seed_positions):
+                result = {"seed": seed, "data": None, "valid": False}
+                results.append(result)
+                if len(positions) == 0:
+                    continue
+                diffs = _noise_diffs(original_array, modified_array, positions)
+                length, signal = _payload_length(diffs, self.noise_intensity)
+                # A wrong seed lands on unmodified pixels: skip its RS decode
+                if signal < MIN_SEED_SIGNAL:
+                    continue
+                result["data"], result["valid"] = _decode_payload(_vote_bits(diffs > 0), length,
+                                                                  verbose=False)
+                if stop_at_first and result["valid"]:
+                    break
+            return results
+
+        args = [[a] * len(seeds) for a in (self.noise_intensity, self.redundancy,
+                                           self.sampler_version, original_array.shape, count)]
+        if workers > 1 and len(seeds) > 1:
+            pool = ProcessPoolExecutor(max_workers=workers)
             try:
-                rs = RSCodec(30)
-                corrected_bytes = rs.decode(bytes(byte_array))
+                # map() yields in seed order
+                return scan(pool.map(_seed_positions, seeds, *args))
+            finally:
+                # An early stop cancels the positions nobody will look at
+                pool.shutdown(cancel_futures=True)
+        return scan(map(_seed_positions, seeds, *args))
+
+
+def _seed_positions(seed, noise_intensity, redundancy, sampler_version, shape, count):
+    """Positions of one candidate seed (module level so worker processes can run it)."""
+    stegano = ImageHybridStegano(seed, noise_intensity, redundancy, sampler_version)
+    return stegano._noise_positions(shape, count)
+
+
+def _load_image_pair(original_path, modified_path):
+    """Both images as uint8 RGB arrays of the same shape."""
+    original_array = np.asarray(Image.open(original_path).convert('RGB'))
+    modified_array = np.asarray(Image.open(modified_path).convert('RGB'))
+    if original_array.shape != modified_array.shape:
+        raise ValueError(f"Image sizes differ: {original_array.shape} vs {modified_array.shape}")
+    return original_array, modified_array
+
+
+def _noise_diffs(original_array, modified_array, positions):
+    """modified - original at the flat positions (the noise we added, +-64)."""
+    return (modified_array.reshape(-1)[positions].astype(np.int16) -
+            original_array.reshape(-1)[positions])
+
+
+def _payload_length(diffs, noise_intensity):
+    """
+    (estimated RS codeword length in bytes, fraction of slots carrying noise).
+
+    Only the first len(codeword) * 8 slots of each copy were modified, so the
+    last slot where most copies show noise marks the codeword's end.  A wrong
+    seed reads unmodified pixels and shows almost no noise anywhere.
+    """
+    marked = np.abs(diffs) > noise_intensity / 4
+    copies = -(-len(diffs) // BITS_PER_COPY)
+    padded = np.zeros(copies * BITS_PER_COPY, dtype=bool)
+    padded[:len(marked)] = marked
+    present = np.zeros_like(padded)
+    present[:len(marked)] = True
+    hits = padded.reshape(copies, BITS_PER_COPY).sum(axis=0)
+    votes = np.maximum(present.reshape(copies, BITS_PER_COPY).sum(axis=0), 1)
+    carrying = np.flatnonzero(hits * 2 > votes)
+    n_bits = int(carrying[-1]) + 1 if carrying.size else 0
+    return -(-n_bits // 8), float(marked.mean()) if len(marked) else 0.0
+
+
+def _vote_bits(bits):
+    """Majority vote per bit across the BITS_PER_COPY-long copies that reach it."""
+    copies = -(-len(bits) // BITS_PER_COPY)
+    padded = np.zeros(copies * BITS_PER_COPY, dtype=bool)
+    padded[:len(bits)] = bits
+    present = np.zeros_like(padded)
+    present[:len(bits)] = True
+    
+    ones = padded.reshape(copies, BITS_PER_COPY).sum(axis=0)
+    votes = present.reshape(copies, BITS_PER_COPY).sum(axis=0)
+    max_len = min(len(bits), BITS_PER_COPY)
+    return (ones > votes / 2)[:max_len].astype(np.uint8)
+
+
+def _decode_payload(consensus_bits, codeword_length=None, verbose=True):
+    """
+    Bits -> text: Reed-Solomon decode when available, else (or on failure)
+    the printable prefix of the raw bytes.  Returns (data, passed RS check).
+
+    The bits cover a whole BITS_PER_COPY copy, longer than the codeword.  A
+    codeword followed by zero bytes is itself a valid codeword (message + ECC
+    + zeros), so decoding the full buffer "succeeds" with the ECC bytes
+    appended to the text; the estimated codeword_length (see _payload_length)
+    and its neighbours are tried first, shortest first, and the full buffer
+    last.
+    """
+    # Convert bits back to bytes
+    bit_array = consensus_bits[:len(consensus_bits) - len(consensus_bits) % 8]
+    byte_array = np.packbits(bit_array)
+    
+    # Try to decode with error correction
+    if HAS_REEDSOLO:
+        rs = RSCodec(30)
+        lengths = []
+        if codeword_length:
+            lengths = [n for n in (codeword_length - 1, codeword_length, codeword_length + 1)
+                       if RS_MIN_CODEWORD <= n < len(byte_array)]
+        lengths.append(len(byte_array))
+        error = None
+        for n in lengths:
+            try:
+                corrected_bytes = rs.decode(bytes(byte_array[:n]))
                 data = corrected_bytes[0].decode('utf-8', errors='ignore').strip('\x00')
-                return data
+                return data, True
             except Exception as e:
-                print(f"Error correction failed: {e}, trying fallback...")
-        
-        # Fallback: try direct decode
-        try:
-            data = byte_array.tobytes().decode('utf-8', errors='ignore')
-            # Clean up: keep only printable characters and stop at first unusual pattern
-            cleaned = []
-            for c in data:
-                if c.isprintable() or c in '\n\r\t':
-                    cleaned.append(c)
-                elif c == '\x00':
-                    break  # Stop at null byte
-                else:
-                    # Stop at first non-printable non-whitespace
-                    break
-            return ''.join(cleaned).rstrip()
-        except Exception as e:
+                error = error or e
+        if verbose:
+            print(f"Error correction failed: {error}, trying fallback...")
+    
+    # Fallback: try direct decode
+    try:
+        data = byte_array.tobytes().decode('utf-8', errors='ignore')
+        # Clean up: keep only printable characters and stop at first unusual pattern
+        cleaned = []
+        for c in data:
+            if c.isprintable() or c in '\n\r\t':
+                cleaned.append(c)
+            elif c == '\x00':
+                break  # Stop at null byte
+            else:
+                # Stop at first non-printable non-whitespace
+                break
+        return ''.join(cleaned).rstrip(), False
+    except Exception as e:
+        if verbose:
             print(f"Direct decode failed: {e}")
-            return None
+        return None, False
 
 
 def main():
     parser = argparse.ArgumentParser(
         description='Hybrid Image Steganography with 25% spatial noise'
     )
-    parser.add_argument('--mode', choices=['embed', 'extract'], required=True,
-                        help='Operation mode')
+    parser.add_argument('--mode', choices=['embed', 'extract', 'scan'], required=True,
+                        help='Operation mode (scan: try many --seeds against one leaked image)')
     parser.add_argument('--original', required=True,
                         help='Path to original image')
     parser.add_argument('--modified',
@@ -246,10 +387,20 @@ def main():
                         help='Data to embed (embed mode)')
     parser.add_argument('--seed', default='default_seed',
                         help='Seed for noise pattern generation')
+    parser.add_argument('--seeds',
+                        help='Scan mode: comma-separated candidate seeds, or @file with one per line')
+    parser.add_argument('--all-seeds', action='store_true',
+                        help='Scan mode: keep going after the first valid payload')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Scan mode: processes sampling seed positions (default: 1)')
     parser.add_argument('--intensity', type=int, default=64,
                         help='Noise intensity (default: 64 = 25%% of 255)')
     parser.add_argument('--redundancy', type=int, default=5,
                         help='Number of redundant copies (default: 5)')
+    parser.add_argument('--sampler-version', type=int, choices=SAMPLER_VERSIONS,
+                        default=SAMPLER_LEGACY,
+                        help='Position sampler: 1 = original full shuffle, 2 = fast '
+                             '(must match the one used to embed; default: 1)')
     parser.add_argument('--json', action='store_true',
                         help='Output results as JSON')
     
@@ -259,7 +410,8 @@ def main():
     stegano = ImageHybridStegano(
         seed=args.seed,
         noise_intensity=args.intensity,
-        redundancy=args.redundancy
+        redundancy=args.redundancy,
+        sampler_version=args.sampler_version
     )
     
     if args.mode == 'embed':
@@ -286,6 +438,38 @@ def main():
             print(f"Error during embedding: {e}")
             sys.exit(1)
     
+    elif args.mode == 'scan':
+        if not args.modified or not args.seeds:
+            print("Error: --modified and --seeds required for scan mode")
+            sys.exit(1)
+        
+        try:
+            if args.seeds.startswith('@'):
+                with open(args.seeds[1:], 'r', encoding='utf-8') as f:
+                    seeds = [line.strip() for line in f if line.strip()]
+            else:
+                seeds = [seed for seed in args.seeds.split(',') if seed]
+            results = stegano.extract_seeds(args.original, args.modified, seeds,
+                                            stop_at_first=not args.all_seeds,
+                                            workers=args.workers)
+            valid = [r for r in results if r["valid"]]
+            
+            if args.json:
+                print(json.dumps({"success": bool(valid), "tried": len(results),
+                                  "matches": valid}, indent=2))
+            else:
+                print(f"Tried {len(results)} of {len(seeds)} seed(s)")
+                for r in valid:
+                    print(f"✓ Seed {r['seed']!r}: {r['data']}")
+            if not valid:
+                if not args.json:
+                    print("✗ No seed produced a valid payload")
+                sys.exit(1)
+        
+        except Exception as e:
+            print(f"Error during scan: {e}")
+            sys.exit(1)
+    
     elif args.mode == 'extract':
         if not args.modified:
             print("Error: --modified required for extract mode")
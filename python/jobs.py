@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Asynchronous media jobs for the Flask routes.
+
+A route that receives `"async": true` submits its task through JobManager
+instead of waiting for it: the client gets a job id back immediately and polls
+GET /jobs/<id> for state, frames processed / total, fps and ETA.  Jobs run on
+the warm worker pool (worker_pool.py) without a timeout; video tasks report
+progress from inside their frame loops and can be cancelled mid-run.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from worker_pool import WorkerPool, WorkerTaskError, get_worker_pool
+
+# Job states: queued → running → done | failed | cancelled
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Finished jobs are forgotten after this long
+JOB_RETENTION_S = 60 * 60
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    output_path: Optional[str] = None
+    state: str = QUEUED
+    stage: Optional[str] = None  # e.g. "processing", "webm"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    frames_done: int = 0
+    frames_total: int = 0
+    elapsed_s: float = 0.0       # worker-side time at the last progress event
+    cancel_requested: bool = False
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def fps(self) -> float:
+        return self.frames_done / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def eta_s(self) -> Optional[float]:
+        if self.state != RUNNING or self.fps <= 0 or self.frames_total <= 0:
+            return None
+        return max(0, self.frames_total - self.frames_done) / self.fps
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'stage': self.stage,
+            'frames_processed': self.frames_done,
+            'frames_total': self.frames_total,
+            'progress': (self.frames_done / self.frames_total) if self.frames_total > 0 else None,
+            'fps': round(self.fps, 2),
+            'eta_seconds': round(self.eta_s, 1) if self.eta_s is not None else None,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'cancel_requested': self.cancel_requested,
+        }
+        if self.state == DONE and self.result:
+            data['output_file'] = os.path.basename(self.result.get('output_path') or '')
+            data['download_url'] = f'/jobs/{self.id}/result'
+            if self.result.get('webm_path'):
+                data['webm_file'] = os.path.basename(self.result['webm_path'])
+                data['webm_download_url'] = f'/jobs/{self.id}/result?format=webm'
+            if self.result.get('params_path'):
+                data['params_file'] = os.path.basename(self.result['params_path'])
+            data['processing_seconds'] = round(self.result.get('elapsed_s', 0.0), 2)
+            if 'cache_hit' in self.result:
+                data['cache_hit'] = self.result['cache_hit']
+        if self.error:
+            data['error'] = self.error
+            data['error_type'] = self.error_type
+        return data
+
+
+class JobManager:
+    """In-memory job registry fed by the worker pool's event queue."""
+
+    def __init__(self, pool: WorkerPool):
+        self.pool = pool
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._listener = threading.Thread(target=self._listen, name="job-events", daemon=True)
+        self._listener.start()
+
+    def submit(self, kind: str, fn: Callable[..., Dict[str, Any]], **kwargs) -> Job:
+        """Queue fn(**kwargs) on the worker pool as a new job."""
+        self.prune()
+        job = Job(id=uuid.uuid4().hex, kind=kind, output_path=kwargs.get('output_path'))
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self.pool.submit_job(job.id, fn, **kwargs)
+        job.future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job. Queued jobs never start; running video jobs stop at their
+        next progress callback. Tasks without progress reporting run to completion.
+        """
+        job = self.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return job
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            return job  # _finish marks it cancelled
+        self.pool.cancel_job(job_id)
+        return job
+
+    def prune(self, max_age_s: float = JOB_RETENTION_S) -> None:
+        cutoff = time.time() - max_age_s
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values()
+                           if j.state in FINISHED_STATES and (j.finished_at or 0) < cutoff]:
+                del self._jobs[job_id]
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                event = self.pool.events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            kind, job_id = event[0], event[1]
+            job = self.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                continue
+            if kind == "started":
+                job.state = RUNNING
+                job.stage = "processing"
+                job.started_at = job.started_at or time.time()
+            elif kind == "progress":
+                job.state = RUNNING
+                job.frames_done, job.frames_total, job.elapsed_s = event[2], event[3], event[4]
+            elif kind == "stage":
+                job.stage = event[2]
+
+    def _finish(self, job: Job, future: Future) -> None:
+        job.finished_at = time.time()
+        job.stage = None
+        self.pool.forget_job(job.id)
+        try:
+            job.result = future.result()
+        except CancelledError:
+            job.state = CANCELLED
+            return
+        except WorkerTaskError as e:
+            job.error, job.error_type = e.message, e.exc_type
+            if e.exc_type == "JobCancelled":
+                job.state = CANCELLED
+                job.error = None
+                _remove_partial_output(job.output_path)
+            else:
+                job.state = FAILED
+            return
+        except Exception as e:
+            job.error, job.error_type = str(e), type(e).__name__
+            job.state = FAILED
+            return
+
+        if job.frames_total > 0:
+            job.frames_done = job.frames_total
+        job.state = DONE
+
+
+def _remove_partial_output(output_path: Optional[str]) -> None:
+    if output_path and os.path.exists(output_path):
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """The process-wide JobManager (created on first use)."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(get_worker_pool())
+        return _manager
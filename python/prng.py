@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Vectorized mulberry32 shared by the scramble_* modules.
+
+mulberry32's state advances by a constant (state_k = seed + k * 0x6D2B79F5),
+so the k-th output does not depend on the previous outputs and a whole run of
+them can be computed as one NumPy expression.  uint32 arrays wrap on overflow
+exactly like Math.imul / the `& 0xFFFFFFFF` masks in the per-module
+mulberry32() closures, so every value here is bit-identical to calling that
+closure the same number of times (and to the JS version).
+"""
+from typing import List
+
+import numpy as np
+
+MULBERRY32_INCREMENT = 0x6D2B79F5
+
+
+def mulberry32_uint32(seed: int, count: int, start: int = 0) -> np.ndarray:
+    """
+    Raw 32-bit outputs number start .. start+count-1 of mulberry32(seed).
+    start lets a caller continue a stream it has already partly consumed.
+    """
+    k = np.arange(start + 1, start + count + 1, dtype=np.uint64)
+    a = ((seed & 0xFFFFFFFF) + k * np.uint64(MULBERRY32_INCREMENT)) & np.uint64(0xFFFFFFFF)
+    t = a.astype(np.uint32)
+
+    # t = Math.imul(t ^ t >>> 15, t | 1)
+    t ^= t >> np.uint32(15)
+    t *= t | np.uint32(1)
+
+    # u = Math.imul(t ^ t >>> 7, t | 61)
+    u = t ^ (t >> np.uint32(7))
+    u *= t | np.uint32(61)
+
+    t ^= t + u
+    t ^= t >> np.uint32(14)
+    return t
+
+
+def mulberry32_floats(seed: int, count: int, start: int = 0) -> np.ndarray:
+    """The same outputs as float64 in [0, 1), i.e. what rand() returns."""
+    return mulberry32_uint32(seed, count, start).astype(np.float64) / 4294967296.0
+
+
+def fisher_yates_permutation(size: int, seed: int) -> List[int]:
+    """
+    seeded_permutation(size, seed): Fisher–Yates shuffle of 0..size-1.
+
+    All swap targets j = floor(rand() * (i + 1)) are drawn in one vectorized
+    call; only the swaps themselves, which depend on each other, stay a loop.
+    """
+    srcs = list(range(size))
+    if size < 2:
+        return srcs
+
+    i = np.arange(size - 1, 0, -1)
+    js = np.floor(mulberry32_floats(seed, size - 1) * (i + 1)).astype(np.int64).tolist()
+
+    for i, j in zip(range(size - 1, 0, -1), js):
+        srcs[i], srcs[j] = srcs[j], srcs[i]
+
+    return srcs
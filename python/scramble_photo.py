@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import argparse
-import subprocess
 import cv2
 import json
 import math
@@ -8,14 +7,16 @@ import os
 import secrets
 import sys
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
 
 import numpy as np
 
-
-# Configure Python executable path for venv
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PYTHON_CMD = os.path.join(BASE_DIR, 'venv', 'bin', 'python3')
+from embed_code_image import personalize_image
+from prng import fisher_yates_permutation, mulberry32_floats
+from scramble_plan import get_scramble_plan
+from tile_noise import apply_noise_add_mod256, apply_noise_sub_mod256
+from wm_marker import bits_key, blend_sprite, marker_sprite
 
 
 def mulberry32(seed: int):
@@ -61,15 +62,8 @@ def seeded_permutation(size: int, seed: int) -> List[int]:
     Create a Fisher–Yates shuffled permutation array.
     dest index i will take from source srcs[i]
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
-    srcs = list(range(size))
-
-    # Fisher–Yates shuffle
-    for i in range(size - 1, 0, -1):
-        j = math.floor(rand() * (i + 1))
-        srcs[i], srcs[j] = srcs[j], srcs[i]
-
-    return srcs
+    # Swap targets come from one vectorized mulberry32 draw (see prng.py)
+    return fisher_yates_permutation(size, seed)
 
 def one_based(a: List[int]) -> List[int]:
     return [x + 1 for x in a]
@@ -161,82 +155,12 @@ def generate_noise_tile_offsets(tile_size: int, seed: int, intensity: int) -> np
     Returns:
         numpy array of int16 offsets for RGB channels
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
     px_count = tile_size * tile_size
-    
-    # Store offsets per pixel per channel (RGB)
-    offsets = np.zeros(px_count * 3, dtype=np.int16)
-    
-    for p in range(px_count):
-        base = p * 3
-        # Uniform integer in [-intensity, +intensity]
-        offsets[base + 0] = round((rand() * 2 - 1) * intensity)
-        offsets[base + 1] = round((rand() * 2 - 1) * intensity)
-        offsets[base + 2] = round((rand() * 2 - 1) * intensity)
-    
-    return offsets
 
-
-def apply_noise_add_mod256(frame: np.ndarray, tile_offsets: np.ndarray, tile_size: int) -> np.ndarray:
-    """
-    Add tileable noise to an image (for scrambling).
-    Applies modulo 256 arithmetic to handle overflow.
-    
-    Args:
-        frame: Input image (H, W, C) where C >= 3
-        tile_offsets: Noise offsets from generate_noise_tile_offsets
-        tile_size: Size of the tile pattern
-    
-    Returns:
-        Image with noise added
-    """
-    h, w, c = frame.shape
-    out = frame.copy()
-    
-    for y in range(h):
-        ty = y % tile_size
-        for x in range(w):
-            tx = x % tile_size
-            tile_index = (ty * tile_size + tx) * 3
-            
-            # Apply noise with modulo 256 (prevents overflow)
-            out[y, x, 0] = mod(int(frame[y, x, 0]) + int(tile_offsets[tile_index + 0]), 256)
-            out[y, x, 1] = mod(int(frame[y, x, 1]) + int(tile_offsets[tile_index + 1]), 256)
-            out[y, x, 2] = mod(int(frame[y, x, 2]) + int(tile_offsets[tile_index + 2]), 256)
-            # Alpha channel (if exists) unchanged
-    
-    return out
-
-
-def apply_noise_sub_mod256(frame: np.ndarray, tile_offsets: np.ndarray, tile_size: int) -> np.ndarray:
-    """
-    Remove tileable noise from an image (for unscrambling).
-    Applies modulo 256 arithmetic to handle underflow.
-    
-    Args:
-        frame: Input image (H, W, C) where C >= 3
-        tile_offsets: Same noise offsets used in apply_noise_add_mod256
-        tile_size: Size of the tile pattern
-    
-    Returns:
-        Image with noise removed
-    """
-    h, w, c = frame.shape
-    out = frame.copy()
-    
-    for y in range(h):
-        ty = y % tile_size
-        for x in range(w):
-            tx = x % tile_size
-            tile_index = (ty * tile_size + tx) * 3
-            
-            # Subtract noise with modulo 256 (prevents underflow)
-            out[y, x, 0] = mod(int(frame[y, x, 0]) - int(tile_offsets[tile_index + 0]), 256)
-            out[y, x, 1] = mod(int(frame[y, x, 1]) - int(tile_offsets[tile_index + 1]), 256)
-            out[y, x, 2] = mod(int(frame[y, x, 2]) - int(tile_offsets[tile_index + 2]), 256)
-            # Alpha channel (if exists) unchanged
-    
-    return out
+    # Offsets per pixel per channel (RGB), drawn in stream order p*3 + channel.
+    # Uniform integer in [-intensity, +intensity]; np.rint rounds half to even like round()
+    rand = mulberry32_floats(seed & 0xFFFFFFFF, px_count * 3)
+    return np.rint((rand * 2 - 1) * intensity).astype(np.int16)
 
 
 # ============================================================================
@@ -345,8 +269,20 @@ def wm_get_positions(
     margin_min_pct: float,
     margin_max_pct: float,
 ) -> List[tuple]:
-    """Compute up to `count` non-overlapping (x, y) marker positions."""
+    """
+    Compute up to `count` non-overlapping (x, y) marker positions.
+    Positions only change every frames_per_pos frames, so each epoch is
+    searched once (_wm_epoch_positions).
+    """
     epoch = frame_idx // max(1, frames_per_pos)
+    return list(_wm_epoch_positions(epoch, count, width, height, marker_w, marker_h,
+                                    mode, margin_min_pct, margin_max_pct))
+
+
+@lru_cache(maxsize=64)
+def _wm_epoch_positions(epoch: int, count: int, width: int, height: int,
+                        marker_w: int, marker_h: int, mode: str,
+                        margin_min_pct: float, margin_max_pct: float) -> Tuple[tuple, ...]:
     seed  = (epoch * 99991 + count * 31337 + 7) & 0xFFFFFFFF
     rng   = mulberry32(seed)
 
@@ -398,25 +334,7 @@ def wm_get_positions(
         )
         if not overlap:
             positions.append((ix, iy))
-    return positions
-
-
-_WM_FINDER_P = [[1, 1, 1], [1, 0, 1], [1, 1, 1]]
-_WM_BIT_MAP_P: Optional[Dict[str, int]] = None
-
-
-def _wm_bit_map_p() -> Dict[str, int]:
-    global _WM_BIT_MAP_P
-    if _WM_BIT_MAP_P is None:
-        bmap: Dict[str, int] = {}
-        idx = 0
-        for row in range(5):
-            for col in range(5):
-                if not (1 <= row <= 3 and 1 <= col <= 3):
-                    bmap[f"{row}-{col}"] = idx
-                    idx += 1
-        _WM_BIT_MAP_P = bmap
-    return _WM_BIT_MAP_P
+    return tuple(positions)
 
 
 def draw_wm_marker(
@@ -425,29 +343,7 @@ def draw_wm_marker(
 ) -> None:
     """Blend a 5×5 binary-grid watermark marker onto frame in-place (BGR)."""
     cell = max(1, int(8 * scale))
-    size = cell * 5
-    bit_map = _wm_bit_map_p()
-    fh, fw = frame.shape[:2]
-    marker = np.zeros((size, size, 3), dtype=np.uint8)
-    for row in range(5):
-        for col in range(5):
-            is_f = 1 <= row <= 3 and 1 <= col <= 3
-            if is_f:
-                val = _WM_FINDER_P[row-1][col-1]
-                color = (0,0,0) if val else (255,255,255)
-            else:
-                bi = bit_map[f"{row}-{col}"]
-                color = (255,255,255) if (binary_data[bi] if bi < len(binary_data) else 0) else (0,0,0)
-            r0, c0 = row*cell, col*cell
-            marker[r0:r0+cell, c0:c0+cell] = color
-    cv2.rectangle(marker, (0,0), (size-1,size-1), (128,128,128), 1)
-    x1, y1 = min(x+size, fw), min(y+size, fh)
-    mw, mh = x1-x, y1-y
-    if mw <= 0 or mh <= 0:
-        return
-    roi = frame[y:y1, x:x1].astype(np.float32)
-    blended = roi*(1-alpha) + marker[:mh,:mw].astype(np.float32)*alpha
-    frame[y:y1, x:x1] = blended.astype(np.uint8)
+    blend_sprite(frame, marker_sprite(bits_key(binary_data), cell), x, y, alpha)
 
 
 def apply_watermark(
@@ -485,81 +381,32 @@ def scramble_frame(frame: np.ndarray,
                    n: int,
                    m: int,
                    perm_dest_to_src_0: list[int],
-                   src_rects: list[Rect],
-                   dest_rects: list[Rect]) -> np.ndarray:
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Scramble a single frame according to the permutation.
     perm_dest_to_src_0: index = dest tile, value = source tile.
-    """
-    h, w, c = frame.shape
-    out = np.zeros_like(frame)
 
-    N = n * m
-    if len(perm_dest_to_src_0) != N:
-        raise ValueError("Permutation length does not equal n*m")
-
-    for dest_idx in range(N):
-        src_idx = perm_dest_to_src_0[dest_idx]
-        sR = src_rects[src_idx]
-        dR = dest_rects[dest_idx]
-
-        # slice ranges
-        sy0, sy1 = sR.y0, sR.y1
-        sx0, sx1 = sR.x0, sR.x1
-        dy0, dy1 = dR.y0, dR.y1
-        dx0, dx1 = dR.x0, dR.x1
-
-        # Apply mirroring based on XOR of src and dest permutation indices.
-        # Using XOR gives more varied distribution than src alone, and is symmetric
-        # so unscramble_frame (which calls this with inv_perm) automatically
-        # re-applies the same flip, undoing it correctly.
-        # 0: no mirror, 1: horizontal, 2: vertical, 3: both
-        mirror_mode = (src_idx ^ dest_idx) % 4
-
-        # Extract source region first, then flip the pixel data in-place
-        src_region = frame[sy0:sy1, sx0:sx1, :]
-
-        if mirror_mode == 1:
-            # horizontal mirror (flip left-right)
-            src_region = src_region[:, ::-1, :]
-        elif mirror_mode == 2:
-            # vertical mirror (flip top-bottom)
-            src_region = src_region[::-1, :, :]
-        elif mirror_mode == 3:
-            # both horizontal and vertical
-            src_region = src_region[::-1, ::-1, :]
-        
-        # Get destination dimensions
-        dest_h = dy1 - dy0
-        dest_w = dx1 - dx0
-        src_h = sy1 - sy0
-        src_w = sx1 - sx0
-        
-        # If dimensions don't match, resize the source region to fit destination
-        if src_h != dest_h or src_w != dest_w:
-            src_region = cv2.resize(src_region, (dest_w, dest_h), interpolation=cv2.INTER_LINEAR)
-        
-        # Copy region (height, width, channels)
-        out[dy0:dy1, dx0:dx1, :] = src_region
-
-    return out
+    Delegates to a cached ScramblePlan (one cv2.remap per frame), which
+    derives the cell_rects() layout itself.  Pass `out` to reuse a buffer.
+    """
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0)
+    return plan.scramble(frame, out)
 
 
 def unscramble_frame(frame: np.ndarray,
                      n: int,
                      m: int,
                      perm_dest_to_src_0: list[int],
-                     src_rects: list[Rect],
-                     dest_rects: list[Rect]) -> np.ndarray:
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Unscramble a single frame by using the inverse permutation.
-    If perm maps dest -> src, then inv maps src -> dest.
+    If perm maps dest -> src, then inv maps src -> dest; the plan precomputes
+    the inverse once instead of per frame.
     """
-    inv_perm = inverse_permutation(perm_dest_to_src_0)
-    # Now inv_perm[index = dest] = src ? No: arr[dest] = src -> inv[src] = dest
-    # For unscramble, we want dest cell to get pixels from original (scrambled) frame's corresponding cell.
-    # Reusing the scramble_frame function with inv_perm achieves that.
-    return scramble_frame(frame, n, m, inv_perm, src_rects, dest_rects)
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0)
+    return plan.unscramble(frame, out)
 
 def process_photo(input_path: str,
                   output_path: str,
@@ -642,24 +489,20 @@ def process_photo(input_path: str,
     else:
         raise ValueError("mode must be 'scramble' or 'unscramble'")
 
-    # Precompute rectangles for the photo (src and dest shapes are same)
-    src_rects = cell_rects(width, height, n, m)
-    dest_rects = cell_rects(width, height, n, m)
-
     # Process the single frame
     if mode == "scramble":
         # Apply noise BEFORE scrambling
         if noise_offsets is not None:
-            frame = apply_noise_add_mod256(frame, noise_offsets, noise_tile_size)
+            frame = apply_noise_add_mod256(frame, noise_offsets, noise_tile_size, out=frame)
         
-        processed = scramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+        processed = scramble_frame(frame, n, m, perm_dest_to_src_0)
     else:
         # Unscramble first
-        processed = unscramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+        processed = unscramble_frame(frame, n, m, perm_dest_to_src_0)
         
         # Remove noise AFTER unscrambling
         if noise_offsets is not None:
-            processed = apply_noise_sub_mod256(processed, noise_offsets, noise_tile_size)
+            processed = apply_noise_sub_mod256(processed, noise_offsets, noise_tile_size, out=processed)
 
     # Apply watermark marker overlay (single-frame: frame_idx=0 gives a fixed position)
     if wm_id is not None:
@@ -672,27 +515,23 @@ def process_photo(input_path: str,
         print(f"  - Watermark marker embedded (ID={wm_id}, alpha={wm_alpha}, scale={wm_scale}, "
               f"count={wm_count}, placement={wm_placement})")
 
-    # Write the output image
-    cv2.imwrite(output_path, processed)
-    
-    # Embed user tracking code after writing the image (only for unscramble mode)
+    # Embed user tracking code (only for unscramble mode) in memory, so the
+    # output is encoded once instead of written, re-read and re-written
     if mode == "unscramble" and user_id and len(str(user_id)) == 10:
         print(f"  - Embedding user tracking code for user_id: {user_id}")
-        embed_script = os.path.join(os.path.dirname(__file__), 'embed_code_image.py')
-        cmd = [
-            PYTHON_CMD, embed_script,
-            '--input', output_path,
-            '--output', output_path,
-            '--user-id', str(user_id),
-        ]
         try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            processed = personalize_image(processed, str(user_id))
             print(f"  - User tracking code embedded successfully")
-        except subprocess.CalledProcessError as e:
-            print(f"  - Warning: Failed to embed tracking code: {e.stderr}")
+        except Exception as e:
+            # As with the old embed_code_image.py subprocess, a failed embed
+            # leaves the image untracked rather than failing the request
+            print(f"  - Warning: Failed to embed tracking code: {e}")
     elif mode == "unscramble":
         print(f"  - Skipping user tracking code embedding (user_id not valid or not 10 chars)")
 
+    # Write the output image
+    cv2.imwrite(output_path, processed)
+
     # Save params JSON (only for scramble mode)
     params_path = ""
     if mode == "scramble":
@@ -858,24 +697,20 @@ def process_photo_by_percentage(input_path: str,
     else:
         raise ValueError("mode must be 'scramble' or 'unscramble'")
 
-    # Precompute rectangles for the photo (src and dest shapes are same)
-    src_rects = cell_rects(width, height, n, m)
-    dest_rects = cell_rects(width, height, n, m)
-
     # Process the single frame
     if mode == "scramble":
         # Apply noise BEFORE scrambling
         if noise_offsets is not None:
-            frame = apply_noise_add_mod256(frame, noise_offsets, noise_tile_size)
+            frame = apply_noise_add_mod256(frame, noise_offsets, noise_tile_size, out=frame)
         
-        processed = scramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+        processed = scramble_frame(frame, n, m, perm_dest_to_src_0)
     else:
         # Unscramble first
-        processed = unscramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+        processed = unscramble_frame(frame, n, m, perm_dest_to_src_0)
         
         # Remove noise AFTER unscrambling
         if noise_offsets is not None:
-            processed = apply_noise_sub_mod256(processed, noise_offsets, noise_tile_size)
+            processed = apply_noise_sub_mod256(processed, noise_offsets, noise_tile_size, out=processed)
 
     # Apply watermark marker overlay (single-frame)
     if wm_id is not None:
@@ -888,27 +723,23 @@ def process_photo_by_percentage(input_path: str,
         print(f"  - Watermark marker embedded (ID={wm_id}, alpha={wm_alpha}, scale={wm_scale}, "
               f"count={wm_count}, placement={wm_placement})")
 
-    # Write the output image
-    cv2.imwrite(output_path, processed)
-    
-    # Embed user tracking code after writing the image (only for unscramble mode)
+    # Embed user tracking code (only for unscramble mode) in memory, so the
+    # output is encoded once instead of written, re-read and re-written
     if mode == "unscramble" and user_id and len(str(user_id)) == 10:
         print(f"  - Embedding user tracking code for user_id: {user_id}")
-        embed_script = os.path.join(os.path.dirname(__file__), 'embed_code_image.py')
-        cmd = [
-            PYTHON_CMD, embed_script,
-            '--input', output_path,
-            '--output', output_path,
-            '--user-id', str(user_id),
-        ]
         try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            processed = personalize_image(processed, str(user_id))
             print(f"  - User tracking code embedded successfully")
-        except subprocess.CalledProcessError as e:
-            print(f"  - Warning: Failed to embed tracking code: {e.stderr}")
+        except Exception as e:
+            # As with the old embed_code_image.py subprocess, a failed embed
+            # leaves the image untracked rather than failing the request
+            print(f"  - Warning: Failed to embed tracking code: {e}")
     elif mode == "unscramble":
         print(f"  - Skipping user tracking code embedding (user_id not valid or not 10 chars)")
 
+    # Write the output image
+    cv2.imwrite(output_path, processed)
+
     # Save params JSON (only for scramble mode)
     params_path = ""
     if mode == "scramble":
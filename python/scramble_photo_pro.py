@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import argparse
-import subprocess
 import cv2
 import json
 import math
@@ -8,14 +7,16 @@ import os
 import secrets
 import sys
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
 
 import numpy as np
 
-
-# Configure Python executable path for venv
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PYTHON_CMD = os.path.join(BASE_DIR, 'venv', 'bin', 'python3')
+from embed_code_image import personalize_image
+from prng import fisher_yates_permutation, mulberry32_floats
+from scramble_plan import get_scramble_plan
+from tile_noise import apply_noise_add_mod256, apply_noise_sub_mod256
+from wm_marker import P2_BIT_CELLS, P2_GRID, blend_sprite, grid_sprite
 
 
 def mulberry32(seed: int):
@@ -61,15 +62,8 @@ def seeded_permutation(size: int, seed: int) -> List[int]:
     Create a Fisher–Yates shuffled permutation array.
     dest index i will take from source srcs[i]
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
-    srcs = list(range(size))
-
-    # Fisher–Yates shuffle
-    for i in range(size - 1, 0, -1):
-        j = math.floor(rand() * (i + 1))
-        srcs[i], srcs[j] = srcs[j], srcs[i]
-
-    return srcs
+    # Swap targets come from one vectorized mulberry32 draw (see prng.py)
+    return fisher_yates_permutation(size, seed)
 
 def one_based(a: List[int]) -> List[int]:
     return [x + 1 for x in a]
@@ -161,82 +155,12 @@ def generate_noise_tile_offsets(tile_size: int, seed: int, intensity: int) -> np
     Returns:
         numpy array of int16 offsets for RGB channels
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
     px_count = tile_size * tile_size
-    
-    # Store offsets per pixel per channel (RGB)
-    offsets = np.zeros(px_count * 3, dtype=np.int16)
-    
-    for p in range(px_count):
-        base = p * 3
-        # Uniform integer in [-intensity, +intensity]
-        offsets[base + 0] = round((rand() * 2 - 1) * intensity)
-        offsets[base + 1] = round((rand() * 2 - 1) * intensity)
-        offsets[base + 2] = round((rand() * 2 - 1) * intensity)
-    
-    return offsets
-
-
-def apply_noise_add_mod256(frame: np.ndarray, tile_offsets: np.ndarray, tile_size: int) -> np.ndarray:
-    """
-    Add tileable noise to an image (for scrambling).
-    Applies modulo 256 arithmetic to handle overflow.
-    
-    Args:
-        frame: Input image (H, W, C) where C >= 3
-        tile_offsets: Noise offsets from generate_noise_tile_offsets
-        tile_size: Size of the tile pattern
-    
-    Returns:
-        Image with noise added
-    """
-    h, w, c = frame.shape
-    out = frame.copy()
-    
-    for y in range(h):
-        ty = y % tile_size
-        for x in range(w):
-            tx = x % tile_size
-            tile_index = (ty * tile_size + tx) * 3
-            
-            # Apply noise with modulo 256 (prevents overflow)
-            out[y, x, 0] = mod(int(frame[y, x, 0]) + int(tile_offsets[tile_index + 0]), 256)
-            out[y, x, 1] = mod(int(frame[y, x, 1]) + int(tile_offsets[tile_index + 1]), 256)
-            out[y, x, 2] = mod(int(frame[y, x, 2]) + int(tile_offsets[tile_index + 2]), 256)
-            # Alpha channel (if exists) unchanged
-    
-    return out
 
-
-def apply_noise_sub_mod256(frame: np.ndarray, tile_offsets: np.ndarray, tile_size: int) -> np.ndarray:
-    """
-    Remove tileable noise from an image (for unscrambling).
-    Applies modulo 256 arithmetic to handle underflow.
-    
-    Args:
-        frame: Input image (H, W, C) where C >= 3
-        tile_offsets: Same noise offsets used in apply_noise_add_mod256
-        tile_size: Size of the tile pattern
-    
-    Returns:
-        Image with noise removed
-    """
-    h, w, c = frame.shape
-    out = frame.copy()
-    
-    for y in range(h):
-        ty = y % tile_size
-        for x in range(w):
-            tx = x % tile_size
-            tile_index = (ty * tile_size + tx) * 3
-            
-            # Subtract noise with modulo 256 (prevents underflow)
-            out[y, x, 0] = mod(int(frame[y, x, 0]) - int(tile_offsets[tile_index + 0]), 256)
-            out[y, x, 1] = mod(int(frame[y, x, 1]) - int(tile_offsets[tile_index + 1]), 256)
-            out[y, x, 2] = mod(int(frame[y, x, 2]) - int(tile_offsets[tile_index + 2]), 256)
-            # Alpha channel (if exists) unchanged
-    
-    return out
+    # Offsets per pixel per channel (RGB), drawn in stream order p*3 + channel.
+    # Uniform integer in [-intensity, +intensity]; np.rint rounds half to even like round()
+    rand = mulberry32_floats(seed & 0xFFFFFFFF, px_count * 3)
+    return np.rint((rand * 2 - 1) * intensity).astype(np.int16)
 
 
 # ============================================================================
@@ -560,20 +484,12 @@ def hpf_params_to_json(seed: int, n: int, m: int, perm_dest_to_src_0: List[int],
 
 
 # ─── Watermark Marker Helpers ────────────────────────────────────────────────
-_WM_FINDER_P2 = [
-    [1,1,1,1,1],
-    [1,0,0,0,1],
-    [1,0,1,0,1],
-    [1,0,0,0,1],
-    [1,1,1,1,1],
-]
 _WM_BIT_MAP_P2 = None
 
 def _wm_bit_map_p2(wm_id: int) -> list:
     bits = [(wm_id >> (15 - i)) & 1 for i in range(16)]
-    grid = [row[:] for row in _WM_FINDER_P2]
-    data_pos = [(0,1),(0,2),(0,3),(1,0),(2,0),(3,0),(4,0),(4,1),(4,2),(4,3),(3,4),(2,4),(1,4),(0,4),(1,3),(1,1)]
-    for idx, (r, c) in enumerate(data_pos):
+    grid = [list(row) for row in P2_GRID]
+    for idx, (r, c) in enumerate(P2_BIT_CELLS):
         grid[r][c] = bits[idx]
     return grid
 
@@ -583,6 +499,14 @@ def wm_to_binary_p2(wm_id: int, wm_count: int) -> list:
 def wm_get_positions_p2(frame_w: int, frame_h: int, marker_size: int,
                         count: int, frame_idx: int, duration: int,
                         placement: str, min_margin: float, max_margin: float) -> list:
+    epoch = frame_idx // max(1, duration)
+    return list(_wm_epoch_positions_p2(frame_w, frame_h, marker_size, count, epoch,
+                                       placement, min_margin, max_margin))
+
+@lru_cache(maxsize=64)
+def _wm_epoch_positions_p2(frame_w: int, frame_h: int, marker_size: int,
+                           count: int, epoch: int, placement: str,
+                           min_margin: float, max_margin: float) -> tuple:
     def mulb(seed):
         def r():
             nonlocal seed
@@ -592,7 +516,6 @@ def wm_get_positions_p2(frame_w: int, frame_h: int, marker_size: int,
             z = (z ^ (z + ((z ^ (z >> 7)) * (z | 61)))) & 0xFFFFFFFF
             return ((z ^ (z >> 14)) & 0xFFFFFFFF) / 0xFFFFFFFF
         return r
-    epoch = frame_idx // max(1, duration)
     positions = []
     reserved = []
     for i in range(count):
@@ -643,24 +566,13 @@ def wm_get_positions_p2(frame_w: int, frame_h: int, marker_size: int,
                 break
         reserved.append((px, py, marker_size))
         positions.append((px, py))
-    return positions
+    return tuple(positions)
 
 def draw_wm_marker_p2(img: np.ndarray, grid: list, x: int, y: int,
                       cell: int, alpha: float) -> np.ndarray:
-    out = img.astype(np.float32)
-    for r, row in enumerate(grid):
-        for c, val in enumerate(row):
-            color = 255.0 if val == 1 else 0.0
-            y0, y1 = y + r * cell, y + (r + 1) * cell
-            x0, x1 = x + c * cell, x + (c + 1) * cell
-            y0, y1 = max(0, y0), min(img.shape[0], y1)
-            x0, x1 = max(0, x0), min(img.shape[1], x1)
-            if y0 >= y1 or x0 >= x1:
-                continue
-            roi = out[y0:y1, x0:x1]
-            patch = np.full_like(roi, color)
-            out[y0:y1, x0:x1] = roi * (1 - alpha) + patch * alpha
-    return out.astype(np.uint8)
+    """Blend one marker grid onto img in place (cached sprite, ROI only) and return img."""
+    blend_sprite(img, grid_sprite(tuple(tuple(row) for row in grid), cell), x, y, alpha)
+    return img
 
 def apply_watermark_p2(frame: np.ndarray, frame_idx: int,
                        wm_id: int, wm_alpha: float, wm_scale: float,
@@ -687,84 +599,33 @@ def scramble_frame(frame: np.ndarray,
                    n: int,
                    m: int,
                    perm_dest_to_src_0: list[int],
-                   src_rects: list[Rect],
-                   dest_rects: list[Rect]) -> np.ndarray:
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Scramble a single frame according to the permutation.
     perm_dest_to_src_0: index = dest tile, value = source tile.
-    """
-    h, w, c = frame.shape
-    out = np.zeros_like(frame)
-
-    N = n * m
-    if len(perm_dest_to_src_0) != N:
-        raise ValueError("Permutation length does not equal n*m")
+    Tiles are copied without mirroring.
 
-    for dest_idx in range(N):
-        src_idx = perm_dest_to_src_0[dest_idx]
-        sR = src_rects[src_idx]
-        dR = dest_rects[dest_idx]
-
-        # slice ranges
-        sy0, sy1 = sR.y0, sR.y1
-        sx0, sx1 = sR.x0, sR.x1
-        dy0, dy1 = dR.y0, dR.y1
-        dx0, dx1 = dR.x0, dR.x1
-
-        # Apply mirroring based on XOR of src and dest permutation indices.
-        # Using XOR gives more varied distribution than src alone, and is symmetric
-        # so unscramble_frame (which calls this with inv_perm) automatically
-        # re-applies the same flip, undoing it correctly.
-        # 0: no mirror, 1: horizontal, 2: vertical, 3: both
-        mirror_mode = (src_idx ^ dest_idx) % 4
-
-        # Extract source region first, then flip the pixel data in-place
-        src_region = frame[sy0:sy1, sx0:sx1, :]
-
-        if mirror_mode == 1:
-            # horizontal mirror (flip left-right)
-            src_region = src_region[:, ::-1, :]
-        elif mirror_mode == 2:
-            # vertical mirror (flip top-bottom)
-            src_region = src_region[::-1, :, :]
-        elif mirror_mode == 3:
-            # both horizontal and vertical
-            src_region = src_region[::-1, ::-1, :]
-
-        # Extract source region
-        src_region = frame[sy0:sy1, sx0:sx1, :]
-        
-        # Get destination dimensions
-        dest_h = dy1 - dy0
-        dest_w = dx1 - dx0
-        src_h = sy1 - sy0
-        src_w = sx1 - sx0
-        
-        # If dimensions don't match, resize the source region to fit destination
-        if src_h != dest_h or src_w != dest_w:
-            src_region = cv2.resize(src_region, (dest_w, dest_h), interpolation=cv2.INTER_LINEAR)
-        
-        # Copy region (height, width, channels)
-        out[dy0:dy1, dx0:dx1, :] = src_region
-
-    return out
+    Delegates to a cached ScramblePlan (one cv2.remap per frame), which
+    derives the cell_rects() layout itself.  Pass `out` to reuse a buffer.
+    """
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0, mirror=False)
+    return plan.scramble(frame, out)
 
 
 def unscramble_frame(frame: np.ndarray,
                      n: int,
                      m: int,
                      perm_dest_to_src_0: list[int],
-                     src_rects: list[Rect],
-                     dest_rects: list[Rect]) -> np.ndarray:
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Unscramble a single frame by using the inverse permutation.
-    If perm maps dest -> src, then inv maps src -> dest.
+    If perm maps dest -> src, then inv maps src -> dest; the plan precomputes
+    the inverse once instead of per frame.
     """
-    inv_perm = inverse_permutation(perm_dest_to_src_0)
-    # Now inv_perm[index = dest] = src ? No: arr[dest] = src -> inv[src] = dest
-    # For unscramble, we want dest cell to get pixels from original (scrambled) frame's corresponding cell.
-    # Reusing the scramble_frame function with inv_perm achieves that.
-    return scramble_frame(frame, n, m, inv_perm, src_rects, dest_rects)
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0, mirror=False)
+    return plan.unscramble(frame, out)
 
 def process_photo(input_path: str,
                   output_path: str,
@@ -895,11 +756,11 @@ def process_photo(input_path: str,
                                        hpf_tile_h, hpf_tile_w)
         # Apply noise AFTER scrambling (last encryption step)
         if noise_offsets is not None:
-            processed = apply_noise_add_mod256(processed, noise_offsets, noise_tile_size)
+            processed = apply_noise_add_mod256(processed, noise_offsets, noise_tile_size, out=processed)
     else:
         # Remove noise FIRST (reverse the last encryption step before HPF unscramble)
         if noise_offsets is not None:
-            frame = apply_noise_sub_mod256(frame, noise_offsets, noise_tile_size)
+            frame = apply_noise_sub_mod256(frame, noise_offsets, noise_tile_size, out=frame)
         processed = hpf_unscramble_frame(frame, n, m, perm_dest_to_src_0,
                                          hpf_k_lr, hpf_k_tb, hpf_border_positions,
                                          hpf_tile_h, hpf_tile_w,
@@ -916,27 +777,23 @@ def process_photo(input_path: str,
         print(f"  - Watermark marker embedded (ID={wm_id}, alpha={wm_alpha}, scale={wm_scale}, "
               f"count={wm_count}, placement={wm_placement})")
 
-    # Write the output image
-    cv2.imwrite(output_path, processed)
-    
-    # Embed user tracking code after writing the image (only for unscramble mode)
+    # Embed user tracking code (only for unscramble mode) in memory, so the
+    # output is encoded once instead of written, re-read and re-written
     if mode == "unscramble" and user_id and len(str(user_id)) == 10:
         print(f"  - Embedding user tracking code for user_id: {user_id}")
-        embed_script = os.path.join(os.path.dirname(__file__), 'embed_code_image.py')
-        cmd = [
-            PYTHON_CMD, embed_script,
-            '--input', output_path,
-            '--output', output_path,
-            '--user-id', str(user_id),
-        ]
         try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
+            processed = personalize_image(processed, str(user_id))
             print(f"  - User tracking code embedded successfully")
-        except subprocess.CalledProcessError as e:
-            print(f"  - Warning: Failed to embed tracking code: {e.stderr}")
+        except Exception as e:
+            # As with the old embed_code_image.py subprocess, a failed embed
+            # leaves the image untracked rather than failing the request
+            print(f"  - Warning: Failed to embed tracking code: {e}")
     elif mode == "unscramble":
         print(f"  - Skipping user tracking code embedding (user_id not valid or not 10 chars)")
 
+    # Write the output image
+    cv2.imwrite(output_path, processed)
+
     # Save params JSON (only for scramble mode)
     params_path = ""
     if mode == "scramble":
@@ -20,11 +20,15 @@ import secrets
 import subprocess
 import sys
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Any
 
 import cv2
 import numpy as np
 
+from prng import fisher_yates_permutation
+from wm_marker import bits_key, blend_sprite, marker_sprite
+
 # ── paths ─────────────────────────────────────────────────────────────────────
 BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
 PYTHON_CMD = os.path.join(BASE_DIR, "venv", "bin", "python3")
@@ -65,12 +69,8 @@ def seeded_permutation(size: int, seed: int) -> List[int]:
     Fisher-Yates shuffle → permutation of 0..size-1.
     Convention: result[dest] = src
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
-    arr  = list(range(size))
-    for i in range(size - 1, 0, -1):
-        j = math.floor(rand() * (i + 1))
-        arr[i], arr[j] = arr[j], arr[i]
-    return arr
+    # Swap targets come from one vectorized mulberry32 draw (see prng.py)
+    return fisher_yates_permutation(size, seed)
 
 
 def inverse_permutation(perm: List[int]) -> List[int]:
@@ -317,36 +317,21 @@ def _wm_to_binary(num: int, bits: int = 16) -> List[int]:
     return [(num >> i) & 1 for i in range(bits - 1, -1, -1)]
 
 
-_WM_FINDER = [[1, 1, 1], [1, 0, 1], [1, 1, 1]]
-
-
-def _wm_bit_map() -> Dict[str, int]:
-    bmap: Dict[str, int] = {}
-    idx = 0
-    for row in range(5):
-        for col in range(5):
-            if not (1 <= row <= 3 and 1 <= col <= 3):
-                bmap[f"{row}-{col}"] = idx
-                idx += 1
-    return bmap
-
-
-_BIT_MAP_CACHE: Optional[Dict[str, int]] = None
-
-
-def _get_bit_map() -> Dict[str, int]:
-    global _BIT_MAP_CACHE
-    if _BIT_MAP_CACHE is None:
-        _BIT_MAP_CACHE = _wm_bit_map()
-    return _BIT_MAP_CACHE
-
-
 def _wm_positions(
     frame_idx: int, frames_per_pos: int, count: int,
     width: int, height: int, marker_w: int, marker_h: int,
     mode: str, margin_min_pct: float, margin_max_pct: float,
 ) -> List[Tuple[int, int]]:
+    """Marker positions for frame_idx; each epoch is searched once (_wm_epoch_positions)."""
     epoch = frame_idx // max(1, frames_per_pos)
+    return list(_wm_epoch_positions(epoch, count, width, height, marker_w, marker_h,
+                                    mode, margin_min_pct, margin_max_pct))
+
+
+@lru_cache(maxsize=64)
+def _wm_epoch_positions(epoch: int, count: int, width: int, height: int,
+                        marker_w: int, marker_h: int, mode: str,
+                        margin_min_pct: float, margin_max_pct: float) -> Tuple[tuple, ...]:
     seed  = (epoch * 99991 + count * 31337 + 7) & 0xFFFFFFFF
     rng   = mulberry32(seed)
 
@@ -398,7 +383,7 @@ def _wm_positions(
         if not overlap:
             positions.append((ix, iy))
 
-    return positions
+    return tuple(positions)
 
 
 def _draw_marker(
@@ -406,32 +391,8 @@ def _draw_marker(
     binary_data: List[int], alpha: float, scale: float,
 ) -> None:
     """Blend a 5×5 binary-grid watermark marker onto frame in-place (BGR)."""
-    cell    = max(1, int(8 * scale))
-    size    = cell * 5
-    bit_map = _get_bit_map()
-    fh, fw  = frame.shape[:2]
-    marker  = np.zeros((size, size, 3), dtype=np.uint8)
-
-    for row in range(5):
-        for col in range(5):
-            is_finder = 1 <= row <= 3 and 1 <= col <= 3
-            if is_finder:
-                val   = _WM_FINDER[row - 1][col - 1]
-                color = (0, 0, 0) if val else (255, 255, 255)
-            else:
-                bi    = bit_map[f"{row}-{col}"]
-                color = (255, 255, 255) if (binary_data[bi] if bi < len(binary_data) else 0) else (0, 0, 0)
-            marker[row*cell:(row+1)*cell, col*cell:(col+1)*cell] = color
-
-    cv2.rectangle(marker, (0, 0), (size - 1, size - 1), (128, 128, 128), 1)
-    x1, y1 = min(x + size, fw), min(y + size, fh)
-    mw, mh = x1 - x, y1 - y
-    if mw <= 0 or mh <= 0:
-        return
-
-    roi     = frame[y:y1, x:x1].astype(np.float32)
-    blended = roi * (1 - alpha) + marker[:mh, :mw].astype(np.float32) * alpha
-    frame[y:y1, x:x1] = blended.astype(np.uint8)
+    cell = max(1, int(8 * scale))
+    blend_sprite(frame, marker_sprite(bits_key(binary_data), cell), x, y, alpha)
 
 
 def _apply_watermark(
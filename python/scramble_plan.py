@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Precomputed tile-scramble plans shared by the scramble_* modules.
+
+A ScramblePlan is built once per (width, height, n, m, perm) and turns the
+per-tile slice/mirror/copy loop of scramble_frame / unscramble_frame into a
+single cv2.remap per frame.  Both directions are derived from the same
+permutation, so one plan serves scramble and unscramble.
+
+A HueShiftPlan does the same for the "color" algorithm: the per-cell hue
+shifts become one per-pixel offset plane, so the add mod 180 is a few
+whole-frame uint8 ops instead of an int32 `%` per cell.
+"""
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from frame_buffers import BufferPool
+
+
+def _cell_bounds(w: int, h: int, n: int, m: int) -> Tuple[List[int], List[int]]:
+    """Cell boundaries, identical to cell_rects() in the scramble modules."""
+    xs = [round(i * w / m) for i in range(m + 1)]
+    ys = [round(j * h / n) for j in range(n + 1)]
+    return xs, ys
+
+
+class ScramblePlan:
+    """
+    Gather maps for scrambling/unscrambling frames of a fixed size.
+
+    perm_dest_to_src_0: index = dest tile, value = source tile.
+    mirror: apply the (src ^ dest) % 4 tile flips used by scramble_frame.
+
+    Tiles whose source and destination cells differ in size (uneven grids)
+    cannot be expressed as a pure gather; they are resized with
+    cv2.INTER_LINEAR after the remap, exactly like the per-tile code did.
+    """
+
+    def __init__(self, width: int, height: int, n: int, m: int,
+                 perm_dest_to_src_0: Sequence[int], mirror: bool = True):
+        N = n * m
+        if len(perm_dest_to_src_0) != N:
+            raise ValueError("Permutation length does not equal n*m")
+
+        self.width = width
+        self.height = height
+        self.n = n
+        self.m = m
+        self.mirror = mirror
+        self.perm = [int(p) for p in perm_dest_to_src_0]
+
+        inv = [0] * N
+        for dest_idx, src_idx in enumerate(self.perm):
+            inv[src_idx] = dest_idx
+        self.inv_perm = inv
+
+        self._xs, self._ys = _cell_bounds(width, height, n, m)
+        self._maps = {}
+
+    def _cell(self, idx: int) -> Tuple[int, int, int, int]:
+        r, c = divmod(idx, self.m)
+        return self._xs[c], self._ys[r], self._xs[c + 1], self._ys[r + 1]
+
+    def _build(self, perm: List[int]):
+        """Build (map_x, map_y, resize_tiles) for a dest -> src permutation."""
+        map_x = np.zeros((self.height, self.width), dtype=np.float32)
+        map_y = np.zeros((self.height, self.width), dtype=np.float32)
+        resize_tiles = []
+
+        for dest_idx, src_idx in enumerate(perm):
+            sx0, sy0, sx1, sy1 = self._cell(src_idx)
+            dx0, dy0, dx1, dy1 = self._cell(dest_idx)
+            # 0: no mirror, 1: horizontal, 2: vertical, 3: both
+            mirror_mode = (src_idx ^ dest_idx) % 4 if self.mirror else 0
+
+            if (sx1 - sx0, sy1 - sy0) != (dx1 - dx0, dy1 - dy0):
+                resize_tiles.append(((sx0, sy0, sx1, sy1), (dx0, dy0, dx1, dy1), mirror_mode))
+                continue
+
+            cols = np.arange(sx0, sx1, dtype=np.float32)
+            rows = np.arange(sy0, sy1, dtype=np.float32)
+            if mirror_mode & 1:
+                cols = cols[::-1]
+            if mirror_mode & 2:
+                rows = rows[::-1]
+            map_x[dy0:dy1, dx0:dx1] = cols[None, :]
+            map_y[dy0:dy1, dx0:dx1] = rows[:, None]
+
+        return map_x, map_y, resize_tiles
+
+    def _maps_for(self, inverse: bool):
+        if inverse not in self._maps:
+            self._maps[inverse] = self._build(self.inv_perm if inverse else self.perm)
+        return self._maps[inverse]
+
+    def _apply(self, frame: np.ndarray, inverse: bool,
+               out: Optional[np.ndarray]) -> np.ndarray:
+        h, w = frame.shape[:2]
+        if (w, h) != (self.width, self.height):
+            raise ValueError(f"Frame is {w}x{h}, plan was built for {self.width}x{self.height}")
+
+        map_x, map_y, resize_tiles = self._maps_for(inverse)
+        if out is None:
+            out = np.empty_like(frame)
+        cv2.remap(frame, map_x, map_y, cv2.INTER_NEAREST, dst=out)
+
+        for (sx0, sy0, sx1, sy1), (dx0, dy0, dx1, dy1), mirror_mode in resize_tiles:
+            src_region = frame[sy0:sy1, sx0:sx1]
+            if mirror_mode == 1:
+                src_region = src_region[:, ::-1]
+            elif mirror_mode == 2:
+                src_region = src_region[::-1, :]
+            elif mirror_mode == 3:
+                src_region = src_region[::-1, ::-1]
+            out[dy0:dy1, dx0:dx1] = cv2.resize(np.ascontiguousarray(src_region),
+                                               (dx1 - dx0, dy1 - dy0),
+                                               interpolation=cv2.INTER_LINEAR)
+        return out
+
+    def scramble(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Scramble `frame`, writing into `out` (allocated if None)."""
+        return self._apply(frame, False, out)
+
+    def unscramble(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Unscramble `frame`, writing into `out` (allocated if None)."""
+        return self._apply(frame, True, out)
+
+
+@lru_cache(maxsize=8)
+def _cached_plan(width: int, height: int, n: int, m: int,
+                 perm: Tuple[int, ...], mirror: bool) -> ScramblePlan:
+    return ScramblePlan(width, height, n, m, perm, mirror)
+
+
+def get_scramble_plan(width: int, height: int, n: int, m: int,
+                      perm_dest_to_src_0: Sequence[int], mirror: bool = True) -> ScramblePlan:
+    """Return a (cached) ScramblePlan for the given frame size and permutation."""
+    return _cached_plan(width, height, n, m, tuple(int(p) for p in perm_dest_to_src_0), mirror)
+
+
+class HueShiftPlan:
+    """
+    Per-pixel hue offsets for color scrambling frames of a fixed size.
+
+    hue_shifts: one shift per cell (0..max_shift on the 0-128 scale), mapped
+    to OpenCV's 0-179 hue range with int((shift / 128) * 179) like the
+    per-cell code.  Cells with a zero shift are copied through untouched (no
+    HSV round trip), also like the per-cell code.
+
+    The BGR<->HSV conversions still run cell by cell (into views of shared
+    buffers): OpenCV rounds the SIMD body and the scalar tail of each row
+    slightly differently, so whole-frame conversions raise the scramble /
+    unscramble round-trip error.  Per cell, output matches the old per-cell
+    code bit for bit.
+    """
+
+    def __init__(self, width: int, height: int, n: int, m: int,
+                 hue_shifts: Sequence[int]):
+        if len(hue_shifts) != n * m:
+            raise ValueError("Hue shifts must match grid size")
+
+        self.width = width
+        self.height = height
+        xs, ys = _cell_bounds(width, height, n, m)
+
+        # Cell index of every row / column; indexing a per-cell array with
+        # these expands it to a (height, width) plane
+        self._cell_row = np.repeat(np.arange(n), np.diff(ys))[:, None]
+        self._cell_col = np.repeat(np.arange(m), np.diff(xs))[None, :]
+
+        self.cell_offsets = np.array([int((s / 128.0) * 179) for s in hue_shifts],
+                                     dtype=np.int16).reshape(n, m)
+
+        # (y0, y1, x0, x1) of the cells that get an HSV round trip, and of
+        # the zero-shift cells, restored from the input frame
+        cells = [(ys[idx // m], ys[idx // m + 1], xs[idx % m], xs[idx % m + 1])
+                 for idx in range(n * m)]
+        self.shift_cells = [c for c, shift in zip(cells, hue_shifts) if shift != 0]
+        self.keep_cells = [c for c, shift in zip(cells, hue_shifts) if shift == 0]
+        self._planes = {}
+
+    def _planes_for(self, inverse: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (offset, threshold) uint8 planes. The offset is reduced to 0..179, so
+        hue + offset wraps past 179 exactly where hue >= threshold = 180 - offset.
+        """
+        if inverse not in self._planes:
+            cell = (-self.cell_offsets if inverse else self.cell_offsets) % 180
+            offset = cell.astype(np.uint8)[self._cell_row, self._cell_col]
+            threshold = (180 - cell).astype(np.uint8)[self._cell_row, self._cell_col]
+            self._planes[inverse] = (offset, threshold)
+        return self._planes[inverse]
+
+    def _apply(self, frame: np.ndarray, inverse: bool, out: Optional[np.ndarray],
+               scratch: Optional[BufferPool]) -> np.ndarray:
+        h, w = frame.shape[:2]
+        if (w, h) != (self.width, self.height):
+            raise ValueError(f"Frame is {w}x{h}, plan was built for {self.width}x{self.height}")
+
+        offset, threshold = self._planes_for(inverse)
+        hue = wraps = None
+        if scratch is not None:
+            hsv = scratch.get("hue_hsv", (h, w, 3))
+            hue = scratch.get("hue_h", (h, w))
+            wraps = scratch.get("hue_wraps", (h, w))
+        else:
+            hsv = np.empty((h, w, 3), dtype=np.uint8)
+        if out is None or out.shape != frame.shape:
+            out = np.empty_like(frame)
+
+        for y0, y1, x0, x1 in self.shift_cells:
+            cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV, dst=hsv[y0:y1, x0:x1])
+        hue = cv2.extractChannel(hsv, 0, dst=hue)
+
+        # (hue + offset) % 180 in uint8: mark the wrapping pixels, add with
+        # uint8 wraparound, then take 180 off the marked ones
+        wraps = cv2.compare(hue, threshold, cv2.CMP_GE, dst=wraps)
+        hue += offset
+        hue -= cv2.bitwise_and(wraps, 180, dst=wraps)
+        cv2.insertChannel(hue, hsv, 0)
+
+        for y0, y1, x0, x1 in self.shift_cells:
+            cv2.cvtColor(hsv[y0:y1, x0:x1], cv2.COLOR_HSV2BGR, dst=out[y0:y1, x0:x1])
+        for y0, y1, x0, x1 in self.keep_cells:
+            out[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+        return out
+
+    def scramble(self, frame: np.ndarray, out: Optional[np.ndarray] = None,
+                 scratch: Optional[BufferPool] = None) -> np.ndarray:
+        """
+        Apply the hue shifts to `frame`, writing into `out` (allocated if None).
+        The HSV intermediates come from `scratch` when given.
+        """
+        return self._apply(frame, False, out, scratch)
+
+    def unscramble(self, frame: np.ndarray, out: Optional[np.ndarray] = None,
+                   scratch: Optional[BufferPool] = None) -> np.ndarray:
+        """Apply the negated hue shifts (int() truncation makes them exact inverses)."""
+        return self._apply(frame, True, out, scratch)
+
+
+@lru_cache(maxsize=8)
+def _cached_hue_plan(width: int, height: int, n: int, m: int,
+                     hue_shifts: Tuple[int, ...]) -> HueShiftPlan:
+    return HueShiftPlan(width, height, n, m, hue_shifts)
+
+
+def get_hue_shift_plan(width: int, height: int, n: int, m: int,
+                       hue_shifts: Sequence[int]) -> HueShiftPlan:
+    """Return a (cached) HueShiftPlan for the given frame size and hue shifts."""
+    return _cached_hue_plan(width, height, n, m, tuple(int(s) for s in hue_shifts))
@@ -7,10 +7,23 @@ import os
 import secrets
 import sys
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
 
 import numpy as np
 
+from frame_buffers import BufferPool
+from prng import fisher_yates_permutation, mulberry32_floats
+from scramble_plan import (
+    HueShiftPlan, ScramblePlan, get_hue_shift_plan, get_scramble_plan,
+)
+from video_io import (
+    VideoIOOptions, open_video_reader, open_video_writer,
+    add_video_io_args, video_io_options_from_args,
+)
+from video_pipeline import ProgressCallback, run_frame_pipeline
+from wm_marker import bits_key, blend_sprite, marker_sprite
+
 
 def mulberry32(seed: int):
     """
@@ -55,15 +68,8 @@ def seeded_permutation(size: int, seed: int) -> List[int]:
     Create a Fisher–Yates shuffled permutation array.
     dest index i will take from source srcs[i]
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
-    srcs = list(range(size))
-
-    # Fisher–Yates shuffle
-    for i in range(size - 1, 0, -1):
-        j = math.floor(rand() * (i + 1))
-        srcs[i], srcs[j] = srcs[j], srcs[i]
-
-    return srcs
+    # Swap targets come from one vectorized mulberry32 draw (see prng.py)
+    return fisher_yates_permutation(size, seed)
 
 def one_based(a: List[int]) -> List[int]:
     return [x + 1 for x in a]
@@ -234,8 +240,18 @@ def wm_get_positions(
     """
     Compute up to `count` non-overlapping (x, y) marker positions for frame_idx.
     Mirrors getMarkerPositions() in watermark-encoder-v2.html.
+    Positions only change every frames_per_pos frames, so each epoch is
+    searched once (_wm_epoch_positions).
     """
     epoch = frame_idx // max(1, frames_per_pos)
+    return list(_wm_epoch_positions(epoch, count, width, height, marker_w, marker_h,
+                                    mode, margin_min_pct, margin_max_pct))
+
+
+@lru_cache(maxsize=64)
+def _wm_epoch_positions(epoch: int, count: int, width: int, height: int,
+                        marker_w: int, marker_h: int, mode: str,
+                        margin_min_pct: float, margin_max_pct: float) -> Tuple[tuple, ...]:
     seed  = (epoch * 99991 + count * 31337 + 7) & 0xFFFFFFFF
     rng   = mulberry32(seed)
 
@@ -312,25 +328,7 @@ def wm_get_positions(
         if not overlap:
             positions.append((ix, iy))
 
-    return positions
-
-
-_WM_FINDER = [[1, 1, 1], [1, 0, 1], [1, 1, 1]]
-_WM_BIT_MAP_V: Optional[Dict[str, int]] = None
-
-
-def _wm_bit_map_v() -> Dict[str, int]:
-    global _WM_BIT_MAP_V
-    if _WM_BIT_MAP_V is None:
-        bmap: Dict[str, int] = {}
-        idx = 0
-        for row in range(5):
-            for col in range(5):
-                if not (1 <= row <= 3 and 1 <= col <= 3):
-                    bmap[f"{row}-{col}"] = idx
-                    idx += 1
-        _WM_BIT_MAP_V = bmap
-    return _WM_BIT_MAP_V
+    return tuple(positions)
 
 
 def draw_wm_marker(
@@ -343,36 +341,7 @@ def draw_wm_marker(
 ) -> None:
     """Blend a 5×5 binary-grid watermark marker onto frame (in-place, BGR)."""
     cell = max(1, int(8 * scale))
-    size = cell * 5
-    bit_map = _wm_bit_map_v()
-    frame_h, frame_w = frame.shape[:2]
-
-    marker = np.zeros((size, size, 3), dtype=np.uint8)
-    for row in range(5):
-        for col in range(5):
-            is_finder = 1 <= row <= 3 and 1 <= col <= 3
-            if is_finder:
-                val   = _WM_FINDER[row - 1][col - 1]
-                color = (0, 0, 0) if val else (255, 255, 255)
-            else:
-                bit_idx = bit_map[f"{row}-{col}"]
-                bit     = binary_data[bit_idx] if bit_idx < len(binary_data) else 0
-                color   = (255, 255, 255) if bit else (0, 0, 0)
-            r0, c0 = row * cell, col * cell
-            marker[r0:r0 + cell, c0:c0 + cell] = color
-
-    cv2.rectangle(marker, (0, 0), (size - 1, size - 1), (128, 128, 128), 1)
-
-    x1 = min(x + size, frame_w)
-    y1 = min(y + size, frame_h)
-    mw, mh = x1 - x, y1 - y
-    if mw <= 0 or mh <= 0:
-        return
-
-    roi     = frame[y:y1, x:x1].astype(np.float32)
-    patch   = marker[:mh, :mw].astype(np.float32)
-    blended = roi * (1.0 - alpha) + patch * alpha
-    frame[y:y1, x:x1] = blended.astype(np.uint8)
+    blend_sprite(frame, marker_sprite(bits_key(binary_data), cell), x, y, alpha)
 
 
 def apply_watermark(
@@ -386,12 +355,17 @@ def apply_watermark(
     wm_placement: str,
     wm_min_margin: float,
     wm_max_margin: float,
+    out: Optional[np.ndarray] = None,
 ) -> np.ndarray:
     """
     Overlay watermark markers on a copy of `frame`.
     For photos pass frame_idx=0 for a fixed single position.
+    Pass `out` to draw into a caller-owned buffer instead (out=frame draws in place).
     """
-    out    = frame.copy()
+    if out is None:
+        out = frame.copy()
+    elif out is not frame:
+        np.copyto(out, frame)
     binary = wm_to_binary(wm_id, 16)
     cell   = max(1, int(8 * wm_scale))
     mw, mh = cell * 5, cell * 5
@@ -413,67 +387,32 @@ def scramble_frame(frame: np.ndarray,
                    n: int,
                    m: int,
                    perm_dest_to_src_0: list[int],
-                   src_rects: list[Rect],
-                   dest_rects: list[Rect]) -> np.ndarray:
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Scramble a single frame according to the permutation.
     perm_dest_to_src_0: index = dest tile, value = source tile.
-    """
-    h, w, c = frame.shape
-    out = np.zeros_like(frame)
-
-    N = n * m
-    if len(perm_dest_to_src_0) != N:
-        raise ValueError("Permutation length does not equal n*m")
-
-    for dest_idx in range(N):
-        src_idx = perm_dest_to_src_0[dest_idx]
-        sR = src_rects[src_idx]
-        dR = dest_rects[dest_idx]
-
-        # slice ranges
-        sy0, sy1 = sR.y0, sR.y1
-        sx0, sx1 = sR.x0, sR.x1
-        dy0, dy1 = dR.y0, dR.y1
-        dx0, dx1 = dR.x0, dR.x1
-
-        # Apply mirroring based on XOR of src and dest permutation indices.
-        # Using XOR gives more varied distribution than src alone, and is symmetric
-        # so unscramble_frame (which calls this with inv_perm) automatically
-        # re-applies the same flip, undoing it correctly.
-        # 0: no mirror, 1: horizontal, 2: vertical, 3: both
-        mirror_mode = (src_idx ^ dest_idx) % 4
-        src_region = frame[sy0:sy1, sx0:sx1, :]
-
-        if mirror_mode == 1:
-            src_region = src_region[:, ::-1, :]
-        elif mirror_mode == 2:
-            src_region = src_region[::-1, :, :]
-        elif mirror_mode == 3:
-            src_region = src_region[::-1, ::-1, :]
-
-        # Copy region (height, width, channels)
-        out[dy0:dy1, dx0:dx1, :] = src_region
 
-    return out
+    Delegates to a cached ScramblePlan (one cv2.remap per frame), which
+    derives the cell_rects() layout itself.  Pass `out` to reuse a buffer.
+    """
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0)
+    return plan.scramble(frame, out)
 
 
 def unscramble_frame(frame: np.ndarray,
                      n: int,
                      m: int,
                      perm_dest_to_src_0: list[int],
-                     src_rects: list[Rect],
-                     dest_rects: list[Rect]) -> np.ndarray:
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Unscramble a single frame by using the inverse permutation.
-    If perm maps dest -> src, then inv maps src -> dest.
+    If perm maps dest -> src, then inv maps src -> dest; the plan precomputes
+    the inverse once instead of per frame.
     """
-    inv_perm = inverse_permutation(perm_dest_to_src_0)
-    # Now inv_perm[index = dest] = src ? No: arr[dest] = src -> inv[src] = dest
-    # For unscramble, we want dest cell to get pixels from original (scrambled) frame's corresponding cell.
-    # Reusing the scramble_frame function with inv_perm achieves that.
-    return scramble_frame(frame, n, m, inv_perm, src_rects, dest_rects)
-
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0)
+    return plan.unscramble(frame, out)
 
 def process_video(input_path: str,
                   output_path: str,
@@ -491,7 +430,11 @@ def process_video(input_path: str,
                   wm_duration: int = 30,
                   wm_placement: str = "random",
                   wm_min_margin: float = 5.0,
-                  wm_max_margin: float = 30.0) -> str:
+                  wm_max_margin: float = 30.0,
+                  workers: int = 1,
+                  io_options: Optional[VideoIOOptions] = None,
+                  progress: Optional[ProgressCallback] = None,
+                  buffers: Optional[BufferPool] = None) -> str:
     """
     Process a video: scramble or unscramble according to mode and algorithm.
 
@@ -506,6 +449,13 @@ def process_video(input_path: str,
         wm_placement: "random", "corners", "edges", "center", or "custom"
         wm_min_margin: Min edge margin % for custom placement
         wm_max_margin: Max edge margin % for custom placement
+        workers: Transform threads; > 1 runs a threaded decode → transform → encode pipeline
+        io_options: Video I/O backend and encoder settings (codec, preset, CRF, threads);
+                    None = ffmpeg pipes with default settings if installed, else OpenCV
+        progress: Called as progress(frames_done, total_frames) after each written
+                  frame (e.g. by the job API); raising from it aborts processing
+        buffers: BufferPool the per-frame stages write into (a new one per call if
+                 None); pass one in to read its allocation counter afterwards
 
     Returns path to params JSON (for scramble mode).
     """
@@ -513,7 +463,7 @@ def process_video(input_path: str,
     if not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input video not found: {input_path}")
 
-    cap = cv2.VideoCapture(input_path)
+    cap = open_video_reader(input_path, io_options)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open video: {input_path}")
 
@@ -549,47 +499,44 @@ def process_video(input_path: str,
         else:
             raise ValueError("mode must be 'scramble' or 'unscramble'")
         
-        # Precompute rectangles for spatial scrambling
-        src_rects = cell_rects(width, height, n, m)
-        dest_rects = cell_rects(width, height, n, m)
+        # Precompute the tile gather maps once; frames are remapped into a reused buffer
+        plan = ScramblePlan(width, height, n, m, perm_dest_to_src_0)
         
     elif algorithm == "color":
         # Generate hue shifts for color scrambling
         hue_shifts = generate_hue_shifts(n, m, seed, max_hue_shift)
         
-        # Precompute rectangles for color scrambling
-        rects = cell_rects(width, height, n, m)
+        # Precompute the per-pixel hue-offset plane once for the whole video
+        hue_plan = HueShiftPlan(width, height, n, m, hue_shifts)
         
     else:
         raise ValueError("algorithm must be 'spatial' or 'color'")
 
     # Prepare writer with appropriate codec for output format
     fourcc, _ = get_fourcc_for_output(output_path)
-    out = cv2.VideoWriter(output_path, fourcc, float(fps), (width, height))
+    out = open_video_writer(output_path, fps, (width, height), fourcc, io_options)
     if not out.isOpened():
         cap.release()
         raise RuntimeError(f"Could not open output video for writing: {output_path}")
 
-    frame_idx = 0
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-
-        if frame is None:
-            break
+    # Serial runs write each frame before transforming the next, so they reuse
+    # one output buffer; threaded pipelines take a fresh output per frame
+    pool = buffers or BufferPool()
+    reuse_output = workers <= 1
 
+    def transform(frame: np.ndarray, frame_idx: int) -> np.ndarray:
         # Process frame based on algorithm
+        frame_out = pool.output("frame_out", (height, width, 3), reuse_output)
         if algorithm == "spatial":
             if mode == "scramble":
-                processed = scramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+                processed = plan.scramble(frame, frame_out)
             else:
-                processed = unscramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+                processed = plan.unscramble(frame, frame_out)
         elif algorithm == "color":
             if mode == "scramble":
-                processed = color_scramble_frame(frame, n, m, hue_shifts, rects)
+                processed = hue_plan.scramble(frame, frame_out, pool)
             else:
-                processed = color_unscramble_frame(frame, n, m, hue_shifts, rects)
+                processed = hue_plan.unscramble(frame, frame_out, pool)
 
         if wm_id is not None:
             processed = apply_watermark(
@@ -597,14 +544,24 @@ def process_video(input_path: str,
                 wm_id, wm_alpha, wm_scale,
                 wm_count, wm_duration, wm_placement,
                 wm_min_margin, wm_max_margin,
+                out=processed,
             )
+        return processed
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-        out.write(processed)
-        frame_idx += 1
+    def report(frames_done: int) -> None:
+        progress(frames_done, total_frames)
 
-    cap.release()
-    out.release()
-    print(f"✓ {frame_idx} frames processed → {output_path}")
+    try:
+        stats = run_frame_pipeline(cap, out, transform, workers=workers,
+                                   on_frame=report if progress is not None else None)
+    finally:
+        cap.release()
+        out.release()
+    print(f"✓ {stats.frames} frames processed → {output_path}")
+    print(f"  {stats.summary()}")
+    print(f"  {pool.summary()}")
 
     # Save params JSON (only for scramble mode)
     params_path = ""
@@ -637,17 +594,23 @@ def process_video_by_percentage(input_path: str,
                   wm_duration: int = 30,
                   wm_placement: str = "random",
                   wm_min_margin: float = 5.0,
-                  wm_max_margin: float = 30.0) -> str:
+                  wm_max_margin: float = 30.0,
+                  workers: int = 1,
+                  io_options: Optional[VideoIOOptions] = None,
+                  progress: Optional[ProgressCallback] = None) -> str:
     """
     Process a video: scramble or unscramble according to mode.
     Only scrambles a certain percentage of tiles based on the percentage parameter.
+    workers > 1 runs a threaded decode → transform → encode pipeline;
+    io_options selects the video I/O backend and encoder settings;
+    progress(frames_done, total_frames) is called after each written frame.
     Returns path to params JSON (for scramble mode).
     """
 
     if not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input video not found: {input_path}")
 
-    cap = cv2.VideoCapture(input_path)
+    cap = open_video_reader(input_path, io_options)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open video: {input_path}")
 
@@ -752,32 +715,25 @@ def process_video_by_percentage(input_path: str,
     else:
         raise ValueError("mode must be 'scramble' or 'unscramble'")
 
-    # Precompute rectangles for video frames (src and dest shapes are same)
-    src_rects = cell_rects(width, height, n, m)
-    dest_rects = cell_rects(width, height, n, m)
+    # Precompute the tile gather maps once; frames are remapped into pooled buffers
+    plan = ScramblePlan(width, height, n, m, perm_dest_to_src_0)
+    pool = BufferPool()
 
     # Prepare video writer with appropriate codec for output format
     fourcc, _ = get_fourcc_for_output(output_path)
-    out = cv2.VideoWriter(output_path, fourcc, float(fps), (width, height))
+    out = open_video_writer(output_path, fps, (width, height), fourcc, io_options)
     if not out.isOpened():
         cap.release()
         raise RuntimeError(f"Could not open output video for writing: {output_path}")
 
     # Process all frames
-    frame_idx = 0
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-
-        if frame is None:
-            break
-
+    def transform(frame: np.ndarray, frame_idx: int) -> np.ndarray:
         # Apply the same partial scramble/unscramble to each frame
+        frame_out = pool.output("frame_out", (height, width, 3), workers <= 1)
         if mode == "scramble":
-            processed = scramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+            processed = plan.scramble(frame, frame_out)
         else:
-            processed = unscramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+            processed = plan.unscramble(frame, frame_out)
 
         if wm_id is not None:
             processed = apply_watermark(
@@ -785,19 +741,27 @@ def process_video_by_percentage(input_path: str,
                 wm_id, wm_alpha, wm_scale,
                 wm_count, wm_duration, wm_placement,
                 wm_min_margin, wm_max_margin,
+                out=processed,
             )
+        return processed
 
-        out.write(processed)
-        frame_idx += 1
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
+    def report(frames_done: int) -> None:
         # Print progress every 30 frames
-        if frame_idx % 30 == 0:
-            print(f"Processed {frame_idx} frames...")
+        if frames_done % 30 == 0:
+            print(f"Processed {frames_done} frames...")
+        if progress is not None:
+            progress(frames_done, total_frames)
 
-    cap.release()
-    out.release()
+    try:
+        stats = run_frame_pipeline(cap, out, transform, workers=workers, on_frame=report)
+    finally:
+        cap.release()
+        out.release()
 
-    print(f"✓ Processed {frame_idx} frames total")
+    print(f"✓ Processed {stats.frames} frames total")
+    print(f"  {stats.summary()}")
 
     # Save params JSON (only for scramble mode)
     params_path = ""
@@ -821,16 +785,10 @@ def generate_hue_shifts(n: int, m: int, seed: int, max_shift: int = 128) -> List
     Generate random hue shifts for each cell in the grid.
     Returns a list of hue shift values (0 to max_shift) for each cell.
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
     N = n * m
-    shifts = []
-    
-    for _ in range(N):
-        # Generate random shift from 0 to max_shift
-        shift = int(rand() * (max_shift + 1))
-        shifts.append(shift)
-    
-    return shifts
+    # Random shift from 0 to max_shift per cell, one vectorized draw
+    rand = mulberry32_floats(seed & 0xFFFFFFFF, N)
+    return (rand * (max_shift + 1)).astype(np.int64).tolist()
 
 
 def apply_hue_shift_to_region(region: np.ndarray, hue_shift: int) -> np.ndarray:
@@ -864,28 +822,18 @@ def color_scramble_frame(frame: np.ndarray,
                         cell_rects: List[Rect]) -> np.ndarray:
     """
     Apply color scrambling (hue shifts) to each cell in the frame.
+
+    Delegates to a cached HueShiftPlan (a per-pixel hue-offset plane, with
+    per-cell HSV conversions); the rects are the cell_rects() layout the plan
+    derives itself.
     """
     h, w, c = frame.shape
-    out = frame.copy()
     
     N = n * m
     if len(hue_shifts) != N or len(cell_rects) != N:
         raise ValueError("Hue shifts and cell rects must match grid size")
     
-    for cell_idx in range(N):
-        rect = cell_rects[cell_idx]
-        hue_shift = hue_shifts[cell_idx]
-        
-        # Extract the cell region
-        region = frame[rect.y0:rect.y1, rect.x0:rect.x1, :]
-        
-        # Apply hue shift
-        shifted_region = apply_hue_shift_to_region(region, hue_shift)
-        
-        # Place back in output frame
-        out[rect.y0:rect.y1, rect.x0:rect.x1, :] = shifted_region
-    
-    return out
+    return get_hue_shift_plan(w, h, n, m, hue_shifts).scramble(frame)
 
 
 def color_unscramble_frame(frame: np.ndarray,
@@ -896,9 +844,13 @@ def color_unscramble_frame(frame: np.ndarray,
     """
     Reverse color scrambling by applying negative hue shifts.
     """
-    # Create inverse hue shifts
-    inverse_shifts = [-shift for shift in hue_shifts]
-    return color_scramble_frame(frame, n, m, inverse_shifts, cell_rects)
+    h, w, c = frame.shape
+    
+    N = n * m
+    if len(hue_shifts) != N or len(cell_rects) != N:
+        raise ValueError("Hue shifts and cell rects must match grid size")
+    
+    return get_hue_shift_plan(w, h, n, m, hue_shifts).unscramble(frame)
 
 
 def color_params_to_json(seed: int, n: int, m: int, hue_shifts: List[int], max_shift: int) -> Dict[str, Any]:
@@ -951,6 +903,11 @@ def main():
     parser.add_argument("--wm-max-margin", type=float, default=30.0,
                         help="Max edge margin %% for custom placement (default: 30)")
 
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Frame transform threads. >1 enables the threaded decode/transform/encode pipeline (default: 1)")
+
+    add_video_io_args(parser)
+
     args = parser.parse_args()
 
     # Validate max-hue-shift range
@@ -977,6 +934,8 @@ def main():
                 wm_placement=args.wm_placement,
                 wm_min_margin=args.wm_min_margin,
                 wm_max_margin=args.wm_max_margin,
+                workers=args.workers,
+                io_options=video_io_options_from_args(args),
             )
         else:
             # if percentage is not provided or equal to 100%, use normal processing
@@ -997,6 +956,8 @@ def main():
                 wm_placement=args.wm_placement,
                 wm_min_margin=args.wm_min_margin,
                 wm_max_margin=args.wm_max_margin,
+                workers=args.workers,
+                io_options=video_io_options_from_args(args),
             )
         print(f"Done. Output video: {args.output}")
         if args.mode == "scramble" and params_path:
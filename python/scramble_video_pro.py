@@ -5,12 +5,31 @@ import json
 import math
 import os
 import secrets
+import shutil
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
 
 import numpy as np
 
+from frame_buffers import BufferPool
+from prng import fisher_yates_permutation, mulberry32_floats
+from scramble_plan import (
+    HueShiftPlan, ScramblePlan, get_hue_shift_plan, get_scramble_plan,
+)
+from video_io import (
+    VideoIOOptions, open_video_reader, open_video_writer,
+    add_video_io_args, video_io_options_from_args,
+)
+from video_pipeline import (
+    ProgressCallback, run_frame_pipeline, probe_keyframes, split_frame_ranges,
+    concat_segments,
+)
+from wm_marker import bits_key, blend_sprite, marker_sprite
+
 
 def mulberry32(seed: int):
     """
@@ -55,15 +74,8 @@ def seeded_permutation(size: int, seed: int) -> List[int]:
     Create a Fisher–Yates shuffled permutation array.
     dest index i will take from source srcs[i]
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
-    srcs = list(range(size))
-
-    # Fisher–Yates shuffle
-    for i in range(size - 1, 0, -1):
-        j = math.floor(rand() * (i + 1))
-        srcs[i], srcs[j] = srcs[j], srcs[i]
-
-    return srcs
+    # Swap targets come from one vectorized mulberry32 draw (see prng.py)
+    return fisher_yates_permutation(size, seed)
 
 def one_based(a: List[int]) -> List[int]:
     return [x + 1 for x in a]
@@ -253,10 +265,78 @@ def get_lr_border_positions(n: int, m: int, k_lr: int, k_tb: int) -> List[tuple]
     return positions
 
 
+# Low-pass filters for the HPF split. hpf_unscramble_frame only adds
+# LPF + (HPF - 128), so every mode round-trips; the fast ones trade the exact
+# Gaussian response for a cost that does not grow with blur_ksize.
+LPF_MODES = ("gaussian", "box", "pyramid")
+
+
+def _gaussian_sigma(ksize: int) -> float:
+    """The sigma cv2.GaussianBlur derives for sigmaX=0."""
+    return 0.3 * ((ksize - 1) * 0.5 - 1) + 0.8
+
+
+def _level_buffer(scratch: Optional[BufferPool], name: str,
+                  shape: Tuple[int, ...]) -> Optional[np.ndarray]:
+    return scratch.get(name, shape) if scratch is not None else None
+
+
+def hpf_lowpass(frame: np.ndarray, blur_ksize: int, lpf_mode: str = "gaussian",
+                dst: Optional[np.ndarray] = None,
+                scratch: Optional[BufferPool] = None) -> np.ndarray:
+    """
+    Low-pass `frame` for the HPF split.
+
+    gaussian: cv2.GaussianBlur with a blur_ksize kernel (the original behaviour)
+    box:      three stacked box filters with the same sigma (central limit
+              approximation); constant cost per pixel for any kernel size
+    pyramid:  pyrDown/pyrUp through log2(sigma) levels; cheapest, softer edges
+              (the intermediate levels come from `scratch` when given)
+    """
+    if lpf_mode == "gaussian":
+        return cv2.GaussianBlur(frame, (blur_ksize, blur_ksize), 0, dst=dst)
+
+    sigma = _gaussian_sigma(blur_ksize)
+    if lpf_mode == "box":
+        # Three boxes of width w have variance 3 * (w^2 - 1) / 12 = sigma^2
+        w = max(1, int(round(math.sqrt(4 * sigma * sigma + 1))))
+        w += 1 - w % 2  # odd, so the filter stays centred
+        dst = cv2.blur(frame, (w, w), dst=dst)
+        cv2.blur(dst, (w, w), dst=dst)
+        return cv2.blur(dst, (w, w), dst=dst)
+
+    if lpf_mode == "pyramid":
+        levels = max(1, int(round(math.log2(max(sigma, 1.0)))))
+        sizes = []
+        small = frame
+        for level in range(levels):
+            if min(small.shape[:2]) < 2:
+                break
+            sizes.append((small.shape[1], small.shape[0]))
+            down_shape = ((small.shape[0] + 1) // 2, (small.shape[1] + 1) // 2) + small.shape[2:]
+            small = cv2.pyrDown(small, dst=_level_buffer(scratch, f"pyr_down{level}", down_shape))
+        if not sizes:
+            # Too small to downsample
+            if dst is None:
+                return frame.copy()
+            dst[...] = frame
+            return dst
+        for level in range(len(sizes) - 1, 0, -1):
+            w, h = sizes[level]
+            small = cv2.pyrUp(small, dst=_level_buffer(scratch, f"pyr_up{level}", (h, w) + frame.shape[2:]),
+                              dstsize=(w, h))
+        return cv2.pyrUp(small, dst=dst, dstsize=sizes[0])
+
+    raise ValueError(f"lpf_mode must be one of {LPF_MODES}")
+
+
 def hpf_scramble_frame(frame: np.ndarray, n: int, m: int,
                        perm_dest_to_src_0: List[int], blur_ksize: int,
                        k_lr: int, k_tb: int, border_positions: List[tuple],
-                       tile_h: int, tile_w: int) -> np.ndarray:
+                       tile_h: int, tile_w: int,
+                       lpf_mode: str = "gaussian",
+                       out: Optional[np.ndarray] = None,
+                       scratch: Optional[BufferPool] = None) -> np.ndarray:
     """
     Scramble a single frame using LPF/HPF frequency decomposition.
 
@@ -265,6 +345,10 @@ def hpf_scramble_frame(frame: np.ndarray, n: int, m: int,
     3. Create an expanded canvas with LPF in the center
     4. Place HPF tiles on left/right borders in permuted order
     5. Top/bottom strips remain empty (black) for watermarks/attribution
+
+    lpf_mode selects the low-pass filter (see hpf_lowpass). `out` is a canvas
+    from a previous call to overwrite (its empty strips are never written, so
+    they stay black); the LPF / int16 HPF intermediates come from `scratch`.
     """
     h, w = frame.shape[:2]
     ch = frame.shape[2] if len(frame.shape) > 2 else 1
@@ -275,48 +359,40 @@ def hpf_scramble_frame(frame: np.ndarray, n: int, m: int,
     out_h = rows_out * tile_h
     out_w = cols_out * tile_w
 
-    # 1. Decompose: LPF via Gaussian blur, HPF = original - LPF
-    lpf = cv2.GaussianBlur(frame, (blur_ksize, blur_ksize), 0)
-    hpf = frame.astype(np.int16) - lpf.astype(np.int16)
+    # 1. Decompose: LPF via low-pass filter, HPF = original - LPF
+    scratch = scratch or BufferPool()
+    lpf = hpf_lowpass(frame, blur_ksize, lpf_mode,
+                      dst=scratch.get("hpf_lpf", frame.shape), scratch=scratch)
+    hpf = scratch.get("hpf_i16", frame.shape, np.int16)
+    np.subtract(frame, lpf, out=hpf, dtype=np.int16)
     # Shift HPF into [0, 255] range for storage (add 128)
-    hpf_shifted = np.clip(hpf + 128, 0, 255).astype(np.uint8)
-
-    # 2. Cut HPF into n*m tiles
-    N = n * m
-    hpf_tiles = []
-    for r in range(n):
-        for c_idx in range(m):
-            y0, y1 = r * tile_h, (r + 1) * tile_h
-            x0, x1 = c_idx * tile_w, (c_idx + 1) * tile_w
-            tile = hpf_shifted[y0:y1, x0:x1].copy()
-            hpf_tiles.append(tile)
+    hpf += 128
+    np.clip(hpf, 0, 255, out=hpf)
+    hpf_shifted = scratch.get("hpf_u8", frame.shape)
+    np.copyto(hpf_shifted, hpf, casting="unsafe")
 
     # 3. Create output canvas (zeros = black corners)
-    if has_channels:
-        out = np.zeros((out_h, out_w, ch), dtype=np.uint8)
-    else:
-        out = np.zeros((out_h, out_w), dtype=np.uint8)
+    out_shape = (out_h, out_w, ch) if has_channels else (out_h, out_w)
+    if out is None or out.shape != out_shape:
+        out = np.zeros(out_shape, dtype=np.uint8)
 
     # 4. Place LPF in center (crop to exact tile-aligned size)
     center_y = k_tb * tile_h
     center_x = k_lr * tile_w
     lpf_h = n * tile_h
     lpf_w = m * tile_w
-    if has_channels:
-        out[center_y:center_y + lpf_h, center_x:center_x + lpf_w, :] = lpf[:lpf_h, :lpf_w]
-    else:
-        out[center_y:center_y + lpf_h, center_x:center_x + lpf_w] = lpf[:lpf_h, :lpf_w]
+    out[center_y:center_y + lpf_h, center_x:center_x + lpf_w] = lpf[:lpf_h, :lpf_w]
 
-    # 5. Place HPF tiles on border according to scramble permutation
+    # 2 + 5. Copy HPF tiles straight onto the border according to the permutation
+    N = n * m
     for dest_idx in range(min(N, len(border_positions))):
         src_idx = perm_dest_to_src_0[dest_idx]
+        sy0 = (src_idx // m) * tile_h
+        sx0 = (src_idx % m) * tile_w
         br, bc = border_positions[dest_idx]
         y0 = br * tile_h
         x0 = bc * tile_w
-        if has_channels:
-            out[y0:y0 + tile_h, x0:x0 + tile_w, :] = hpf_tiles[src_idx]
-        else:
-            out[y0:y0 + tile_h, x0:x0 + tile_w] = hpf_tiles[src_idx]
+        out[y0:y0 + tile_h, x0:x0 + tile_w] = hpf_shifted[sy0:sy0 + tile_h, sx0:sx0 + tile_w]
 
     return out
 
@@ -325,7 +401,9 @@ def hpf_unscramble_frame(frame: np.ndarray, n: int, m: int,
                           perm_dest_to_src_0: List[int],
                           k_lr: int, k_tb: int, border_positions: List[tuple],
                           tile_h: int, tile_w: int,
-                          orig_h: int, orig_w: int) -> np.ndarray:
+                          orig_h: int, orig_w: int,
+                          out: Optional[np.ndarray] = None,
+                          scratch: Optional[BufferPool] = None) -> np.ndarray:
     """
     Unscramble an HPF-scrambled frame back to the original.
 
@@ -333,73 +411,59 @@ def hpf_unscramble_frame(frame: np.ndarray, n: int, m: int,
     2. Extract and un-permute HPF tiles from the left/right borders
     3. Reassemble HPF image from tiles
     4. Reconstruct: original = LPF + (HPF_shifted - 128)
+
+    The result is written into `out` (orig_h x orig_w, allocated if None);
+    the reassembled HPF and the int16 sum come from `scratch`.
     """
     ch = frame.shape[2] if len(frame.shape) > 2 else 1
     has_channels = len(frame.shape) > 2
     N = n * m
+    scratch = scratch or BufferPool()
 
-    # 1. Extract LPF from center
+    # 1. LPF is the center region (read in place)
     center_y = k_tb * tile_h
     center_x = k_lr * tile_w
     lpf_h = n * tile_h
     lpf_w = m * tile_w
-    lpf = frame[center_y:center_y + lpf_h, center_x:center_x + lpf_w].copy()
+    lpf = frame[center_y:center_y + lpf_h, center_x:center_x + lpf_w]
 
-    # 2. Extract HPF tiles from border and place back in original order
+    # 2 + 3. Copy HPF tiles from the border back to their original positions
     # perm[dest_idx] = src_idx means border position dest_idx holds original tile src_idx
-    hpf_tiles = [None] * N
-    for dest_idx in range(min(N, len(border_positions))):
+    hpf_shape = (lpf_h, lpf_w, ch) if has_channels else (lpf_h, lpf_w)
+    hpf_shifted = scratch.get("hpf_u8", hpf_shape)
+    placed = min(N, len(border_positions))
+    if placed < N:
+        hpf_shifted.fill(128)  # tiles without a border slot reconstruct as LPF only
+    for dest_idx in range(placed):
         src_idx = perm_dest_to_src_0[dest_idx]
+        sy0 = (src_idx // m) * tile_h
+        sx0 = (src_idx % m) * tile_w
         br, bc = border_positions[dest_idx]
         y0 = br * tile_h
         x0 = bc * tile_w
-        tile = frame[y0:y0 + tile_h, x0:x0 + tile_w].copy()
-        hpf_tiles[src_idx] = tile  # place back in original position
-
-    # 3. Reassemble HPF image from tiles in original order
-    if has_channels:
-        hpf_shifted = np.full((lpf_h, lpf_w, ch), 128, dtype=np.uint8)
-    else:
-        hpf_shifted = np.full((lpf_h, lpf_w), 128, dtype=np.uint8)
-
-    for idx in range(N):
-        if hpf_tiles[idx] is not None:
-            r = idx // m
-            c_idx = idx % m
-            y0 = r * tile_h
-            x0 = c_idx * tile_w
-            if has_channels:
-                hpf_shifted[y0:y0 + tile_h, x0:x0 + tile_w, :] = hpf_tiles[idx]
-            else:
-                hpf_shifted[y0:y0 + tile_h, x0:x0 + tile_w] = hpf_tiles[idx]
+        hpf_shifted[sy0:sy0 + tile_h, sx0:sx0 + tile_w] = frame[y0:y0 + tile_h, x0:x0 + tile_w]
 
     # 4. Reconstruct: original = LPF + (HPF_shifted - 128)
-    hpf_raw = hpf_shifted.astype(np.int16) - 128
-    reconstructed = np.clip(lpf.astype(np.int16) + hpf_raw, 0, 255).astype(np.uint8)
-
-    # 5. Handle potential size mismatch with original dimensions
-    rh, rw = reconstructed.shape[:2]
-    if rh == orig_h and rw == orig_w:
-        return reconstructed
-
-    if has_channels:
-        result = np.zeros((orig_h, orig_w, ch), dtype=np.uint8)
-    else:
-        result = np.zeros((orig_h, orig_w), dtype=np.uint8)
-
-    copy_h = min(rh, orig_h)
-    copy_w = min(rw, orig_w)
-    if has_channels:
-        result[:copy_h, :copy_w, :] = reconstructed[:copy_h, :copy_w, :]
-    else:
-        result[:copy_h, :copy_w] = reconstructed[:copy_h, :copy_w]
-
-    return result
+    reconstructed = scratch.get("hpf_i16", hpf_shape, np.int16)
+    np.add(lpf, hpf_shifted, out=reconstructed, dtype=np.int16)
+    reconstructed -= 128
+    np.clip(reconstructed, 0, 255, out=reconstructed)
+
+    # 5. Write into the original dimensions (zero padded if they differ)
+    out_shape = (orig_h, orig_w, ch) if has_channels else (orig_h, orig_w)
+    if out is None or out.shape != out_shape:
+        out = np.empty(out_shape, dtype=np.uint8)
+    copy_h = min(lpf_h, orig_h)
+    copy_w = min(lpf_w, orig_w)
+    if (copy_h, copy_w) != (orig_h, orig_w):
+        out.fill(0)
+    np.copyto(out[:copy_h, :copy_w], reconstructed[:copy_h, :copy_w], casting="unsafe")
+    return out
 
 
 def hpf_params_to_json(seed: int, n: int, m: int, perm_dest_to_src_0: List[int],
                        blur_ksize: int, k_lr: int, k_tb: int, tile_h: int, tile_w: int,
-                       orig_h: int, orig_w: int) -> Dict[str, Any]:
+                       orig_h: int, orig_w: int, lpf_mode: str = "gaussian") -> Dict[str, Any]:
     """
     Convert HPF scramble parameters to JSON for saving/restoring.
     """
@@ -411,6 +475,7 @@ def hpf_params_to_json(seed: int, n: int, m: int, perm_dest_to_src_0: List[int],
         "m": int(m),
         "perm1based": one_based(perm_dest_to_src_0),
         "blur_ksize": int(blur_ksize),
+        "lpf_mode": lpf_mode,
         "border_cols_lr": int(k_lr),
         "watermark_rows_tb": int(k_tb),
         "tile_h": int(tile_h),
@@ -449,8 +514,18 @@ def wm_get_positions(
     """
     Compute up to `count` non-overlapping (x, y) marker positions for frame_idx.
     Mirrors getMarkerPositions() in watermark-encoder-v2.html.
+    Positions only change every frames_per_pos frames, so each epoch is
+    searched once (_wm_epoch_positions).
     """
     epoch = frame_idx // max(1, frames_per_pos)
+    return list(_wm_epoch_positions(epoch, count, width, height, marker_w, marker_h,
+                                    mode, margin_min_pct, margin_max_pct))
+
+
+@lru_cache(maxsize=64)
+def _wm_epoch_positions(epoch: int, count: int, width: int, height: int,
+                        marker_w: int, marker_h: int, mode: str,
+                        margin_min_pct: float, margin_max_pct: float) -> Tuple[tuple, ...]:
     seed  = (epoch * 99991 + count * 31337 + 7) & 0xFFFFFFFF
     rng   = mulberry32(seed)
 
@@ -528,30 +603,7 @@ def wm_get_positions(
         if not overlap:
             positions.append((ix, iy))
 
-    return positions
-
-
-_WM_FINDER = [
-    [1, 1, 1],
-    [1, 0, 1],
-    [1, 1, 1],
-]
-
-_WM_BIT_MAP: Optional[Dict[str, int]] = None
-
-
-def _wm_bit_map() -> Dict[str, int]:
-    global _WM_BIT_MAP
-    if _WM_BIT_MAP is None:
-        bmap: Dict[str, int] = {}
-        idx = 0
-        for row in range(5):
-            for col in range(5):
-                if not (1 <= row <= 3 and 1 <= col <= 3):
-                    bmap[f"{row}-{col}"] = idx
-                    idx += 1
-        _WM_BIT_MAP = bmap
-    return _WM_BIT_MAP
+    return tuple(positions)
 
 
 def draw_wm_marker(
@@ -564,43 +616,11 @@ def draw_wm_marker(
 ) -> None:
     """
     Blend a 5×5 binary-grid watermark marker onto `frame` (in-place, BGR).
-    Mirrors drawMarker() in watermark-encoder-v2.html.
+    Mirrors drawMarker() in watermark-encoder-v2.html; the sprite is cached per
+    (bits, cell size) and only the marker's ROI is blended (see wm_marker.py).
     """
     cell = max(1, int(8 * scale))
-    size = cell * 5
-    bit_map = _wm_bit_map()
-    frame_h, frame_w = frame.shape[:2]
-
-    # Build marker patch
-    marker = np.zeros((size, size, 3), dtype=np.uint8)
-    for row in range(5):
-        for col in range(5):
-            is_finder = 1 <= row <= 3 and 1 <= col <= 3
-            if is_finder:
-                val   = _WM_FINDER[row - 1][col - 1]
-                color = (0, 0, 0) if val else (255, 255, 255)
-            else:
-                bit_idx = bit_map[f"{row}-{col}"]
-                bit     = binary_data[bit_idx] if bit_idx < len(binary_data) else 0
-                color   = (255, 255, 255) if bit else (0, 0, 0)
-            r0, c0 = row * cell, col * cell
-            marker[r0:r0 + cell, c0:c0 + cell] = color
-
-    # Gray border
-    cv2.rectangle(marker, (0, 0), (size - 1, size - 1), (128, 128, 128), 1)
-
-    # Clip to frame bounds
-    x1 = min(x + size, frame_w)
-    y1 = min(y + size, frame_h)
-    mw, mh = x1 - x, y1 - y
-    if mw <= 0 or mh <= 0:
-        return
-
-    # Alpha-blend
-    roi     = frame[y:y1, x:x1].astype(np.float32)
-    patch   = marker[:mh, :mw].astype(np.float32)
-    blended = roi * (1.0 - alpha) + patch * alpha
-    frame[y:y1, x:x1] = blended.astype(np.uint8)
+    blend_sprite(frame, marker_sprite(bits_key(binary_data), cell), x, y, alpha)
 
 
 def apply_watermark(
@@ -614,12 +634,17 @@ def apply_watermark(
     wm_placement: str,
     wm_min_margin: float,
     wm_max_margin: float,
+    out: Optional[np.ndarray] = None,
 ) -> np.ndarray:
     """
     Overlay watermark markers on a copy of `frame`.
     All parameters mirror the controls in watermark-encoder-v2.html.
+    Pass `out` to draw into a caller-owned buffer instead (out=frame draws in place).
     """
-    out    = frame.copy()
+    if out is None:
+        out = frame.copy()
+    elif out is not frame:
+        np.copyto(out, frame)
     binary = wm_to_binary(wm_id, 16)
     cell   = max(1, int(8 * wm_scale))
     mw     = cell * 5
@@ -643,67 +668,32 @@ def scramble_frame(frame: np.ndarray,
                    n: int,
                    m: int,
                    perm_dest_to_src_0: list[int],
-                   src_rects: list[Rect],
-                   dest_rects: list[Rect]) -> np.ndarray:
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Scramble a single frame according to the permutation.
     perm_dest_to_src_0: index = dest tile, value = source tile.
-    """
-    h, w, c = frame.shape
-    out = np.zeros_like(frame)
-
-    N = n * m
-    if len(perm_dest_to_src_0) != N:
-        raise ValueError("Permutation length does not equal n*m")
 
-    for dest_idx in range(N):
-        src_idx = perm_dest_to_src_0[dest_idx]
-        sR = src_rects[src_idx]
-        dR = dest_rects[dest_idx]
-
-        # slice ranges
-        sy0, sy1 = sR.y0, sR.y1
-        sx0, sx1 = sR.x0, sR.x1
-        dy0, dy1 = dR.y0, dR.y1
-        dx0, dx1 = dR.x0, dR.x1
-
-        # Apply mirroring based on XOR of src and dest permutation indices.
-        # Using XOR gives more varied distribution than src alone, and is symmetric
-        # so unscramble_frame (which calls this with inv_perm) automatically
-        # re-applies the same flip, undoing it correctly.
-        # 0: no mirror, 1: horizontal, 2: vertical, 3: both
-        mirror_mode = (src_idx ^ dest_idx) % 4
-        src_region = frame[sy0:sy1, sx0:sx1, :]
-
-        if mirror_mode == 1:
-            src_region = src_region[:, ::-1, :]
-        elif mirror_mode == 2:
-            src_region = src_region[::-1, :, :]
-        elif mirror_mode == 3:
-            src_region = src_region[::-1, ::-1, :]
-
-        # Copy region (height, width, channels)
-        out[dy0:dy1, dx0:dx1, :] = src_region
-
-    return out
+    Delegates to a cached ScramblePlan (one cv2.remap per frame), which
+    derives the cell_rects() layout itself.  Pass `out` to reuse a buffer.
+    """
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0)
+    return plan.scramble(frame, out)
 
 
 def unscramble_frame(frame: np.ndarray,
                      n: int,
                      m: int,
                      perm_dest_to_src_0: list[int],
-                     src_rects: list[Rect],
-                     dest_rects: list[Rect]) -> np.ndarray:
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Unscramble a single frame by using the inverse permutation.
-    If perm maps dest -> src, then inv maps src -> dest.
+    If perm maps dest -> src, then inv maps src -> dest; the plan precomputes
+    the inverse once instead of per frame.
     """
-    inv_perm = inverse_permutation(perm_dest_to_src_0)
-    # Now inv_perm[index = dest] = src ? No: arr[dest] = src -> inv[src] = dest
-    # For unscramble, we want dest cell to get pixels from original (scrambled) frame's corresponding cell.
-    # Reusing the scramble_frame function with inv_perm achieves that.
-    return scramble_frame(frame, n, m, inv_perm, src_rects, dest_rects)
-
+    h, w = frame.shape[:2]
+    plan = get_scramble_plan(w, h, n, m, perm_dest_to_src_0)
+    return plan.unscramble(frame, out)
 
 def process_video(input_path: str,
                   output_path: str,
@@ -715,6 +705,7 @@ def process_video(input_path: str,
                   max_hue_shift: int = 128,
                   blur_ksize: int = 15,
                   watermark_rows: int = 1,
+                  lpf_mode: str = "gaussian",
                   # ── watermark marker options ──
                   wm_id: Optional[int] = None,
                   wm_alpha: float = 0.15,
@@ -723,7 +714,13 @@ def process_video(input_path: str,
                   wm_duration: int = 30,
                   wm_placement: str = "random",
                   wm_min_margin: float = 5.0,
-                  wm_max_margin: float = 30.0) -> str:
+                  wm_max_margin: float = 30.0,
+                  workers: int = 1,
+                  io_options: Optional[VideoIOOptions] = None,
+                  segments: int = 1,
+                  frame_range: Optional[Tuple[int, Optional[int]]] = None,
+                  progress: Optional[ProgressCallback] = None,
+                  buffers: Optional[BufferPool] = None) -> str:
     """
     Process a video: scramble or unscramble according to mode and algorithm.
 
@@ -732,6 +729,8 @@ def process_video(input_path: str,
                    "hpf" for high-pass frequency decomposition scrambling
         max_hue_shift: Maximum hue shift amount (0-128) for color scrambling
         blur_ksize: Gaussian blur kernel size (odd integer) for HPF algorithm
+        lpf_mode: HPF low-pass filter: "gaussian" (exact), "box" or "pyramid" (fast
+                  approximations whose cost does not grow with blur_ksize)
         watermark_rows: Number of empty tile rows on top and bottom for watermarks (HPF only)
         wm_id: 16-bit tracking ID (0-65535) to embed as a visible marker; None = no marker
         wm_alpha: Marker opacity (0.01 – 0.50)
@@ -741,6 +740,17 @@ def process_video(input_path: str,
         wm_placement: Placement zone — "random", "corners", "edges", "center", "custom"
         wm_min_margin: Min edge margin % for custom placement (0 – 45)
         wm_max_margin: Max edge margin % for custom placement (5 – 50)
+        workers: Transform threads; > 1 runs a threaded decode → transform → encode pipeline
+        io_options: Video I/O backend and encoder settings (codec, preset, CRF, threads);
+                    None = ffmpeg pipes with default settings if installed, else OpenCV
+        segments: > 1 splits the video into time ranges processed in parallel worker
+                  processes and concatenated with ffmpeg (see process_video_segmented)
+        frame_range: (start, end) absolute frame indices to process (end=None reads to EOF).
+                     Frame indices stay absolute, so watermark epochs match a full run.
+        progress: Called as progress(frames_done, total_frames) after each written
+                  frame (e.g. by the job API); raising from it aborts processing
+        buffers: BufferPool the per-frame stages write into (a new one per call if
+                 None); pass one in to read its allocation counter afterwards
 
     Returns path to params JSON (for scramble mode).
     """
@@ -748,7 +758,20 @@ def process_video(input_path: str,
     if not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input video not found: {input_path}")
 
-    cap = cv2.VideoCapture(input_path)
+    if segments > 1 and frame_range is None:
+        return process_video_segmented(
+            input_path, output_path, segments,
+            seed=seed, rows=rows, cols=cols, mode=mode, algorithm=algorithm,
+            max_hue_shift=max_hue_shift, blur_ksize=blur_ksize,
+            watermark_rows=watermark_rows, lpf_mode=lpf_mode,
+            wm_id=wm_id, wm_alpha=wm_alpha, wm_scale=wm_scale,
+            wm_count=wm_count, wm_duration=wm_duration,
+            wm_placement=wm_placement, wm_min_margin=wm_min_margin,
+            wm_max_margin=wm_max_margin, workers=workers,
+            io_options=io_options, progress=progress,
+        )
+
+    cap = open_video_reader(input_path, io_options)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open video: {input_path}")
 
@@ -784,16 +807,15 @@ def process_video(input_path: str,
         else:
             raise ValueError("mode must be 'scramble' or 'unscramble'")
         
-        # Precompute rectangles for spatial scrambling
-        src_rects = cell_rects(width, height, n, m)
-        dest_rects = cell_rects(width, height, n, m)
+        # Precompute the tile gather maps once; frames are remapped into a reused buffer
+        plan = ScramblePlan(width, height, n, m, perm_dest_to_src_0)
         
     elif algorithm == "color":
         # Generate hue shifts for color scrambling
         hue_shifts = generate_hue_shifts(n, m, seed, max_hue_shift)
         
-        # Precompute rectangles for color scrambling
-        rects = cell_rects(width, height, n, m)
+        # Precompute the per-pixel hue-offset plane once for the whole video
+        hue_plan = HueShiftPlan(width, height, n, m, hue_shifts)
 
     elif algorithm == "hpf":
         # HPF frequency decomposition scrambling
@@ -804,6 +826,9 @@ def process_video(input_path: str,
         # Ensure watermark_rows is positive
         watermark_rows = max(1, watermark_rows)
 
+        if lpf_mode not in LPF_MODES:
+            raise ValueError(f"lpf_mode must be one of {LPF_MODES}")
+
         perm_dest_to_src_0 = seeded_permutation(N, seed)
 
         # Compute tile dimensions and border layout
@@ -822,7 +847,7 @@ def process_video(input_path: str,
             hpf_out_height = hpf_rows_out * hpf_tile_h
             hpf_orig_h = height
             hpf_orig_w = width
-            print(f"HPF scramble: {n}x{m} grid, blur_ksize={blur_ksize}")
+            print(f"HPF scramble: {n}x{m} grid, blur_ksize={blur_ksize}, lpf={lpf_mode}")
             print(f"  Border: {hpf_k_lr} cols (L/R for HPF), {hpf_k_tb} rows (T/B for watermarks)")
             print(f"  Tile: {hpf_tile_w}x{hpf_tile_h}")
             print(f"  Input:  {width}x{height}")
@@ -855,60 +880,95 @@ def process_video(input_path: str,
 
     # Prepare writer with appropriate codec for output format
     fourcc, _ = get_fourcc_for_output(output_path)
-    out = cv2.VideoWriter(output_path, fourcc, float(fps), (out_width, out_height))
+    out = open_video_writer(output_path, fps, (out_width, out_height), fourcc, io_options)
     if not out.isOpened():
         cap.release()
         raise RuntimeError(f"Could not open output video for writing: {output_path}")
 
-    frame_idx = 0
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-
-        if frame is None:
-            break
+    # Every stage writes into pooled buffers. Serial runs write each frame before
+    # the next is transformed, so they reuse one output buffer; threaded pipelines
+    # keep several frames in flight and take a fresh output per frame (scratch
+    # stays per thread either way).
+    pool = buffers or BufferPool()
+    reuse_output = workers <= 1
+    out_shape = (out_height, out_width, 3)
 
+    def transform(frame: np.ndarray, frame_idx: int) -> np.ndarray:
         # Process frame based on algorithm
         if algorithm == "spatial":
+            frame_out = pool.output("frame_out", out_shape, reuse_output)
             if mode == "scramble":
-                processed = scramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+                processed = plan.scramble(frame, frame_out)
             else:
-                processed = unscramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+                processed = plan.unscramble(frame, frame_out)
         elif algorithm == "color":
+            frame_out = pool.output("frame_out", out_shape, reuse_output)
             if mode == "scramble":
-                processed = color_scramble_frame(frame, n, m, hue_shifts, rects)
+                processed = hue_plan.scramble(frame, frame_out, pool)
             else:
-                processed = color_unscramble_frame(frame, n, m, hue_shifts, rects)
+                processed = hue_plan.unscramble(frame, frame_out, pool)
         elif algorithm == "hpf":
             if mode == "scramble":
+                # Zeroed once: the watermark strips are never written
+                canvas = pool.output("frame_out", out_shape, reuse_output, zero=True)
                 processed = hpf_scramble_frame(frame, n, m, perm_dest_to_src_0,
                                               blur_ksize, hpf_k_lr, hpf_k_tb,
                                               hpf_border_positions,
-                                              hpf_tile_h, hpf_tile_w)
+                                              hpf_tile_h, hpf_tile_w,
+                                              lpf_mode, canvas, pool)
             else:
+                frame_out = pool.output("frame_out", out_shape, reuse_output)
                 processed = hpf_unscramble_frame(frame, n, m, perm_dest_to_src_0,
                                                  hpf_k_lr, hpf_k_tb, hpf_border_positions,
                                                  hpf_tile_h, hpf_tile_w,
-                                                 hpf_orig_h, hpf_orig_w)
+                                                 hpf_orig_h, hpf_orig_w,
+                                                 frame_out, pool)
 
-        # Apply watermark marker overlay (if requested)
+        # Apply watermark marker overlay (if requested), in place on this frame's
+        # buffer -- except on a reused HPF canvas, whose strips are never rewritten
+        # and would keep the previous frames' markers
         if wm_id is not None:
+            wm_out = processed
+            if algorithm == "hpf" and mode == "scramble" and reuse_output:
+                wm_out = pool.get("wm_out", out_shape)
             processed = apply_watermark(
                 processed, frame_idx,
                 wm_id, wm_alpha, wm_scale,
                 wm_count, wm_duration, wm_placement,
                 wm_min_margin, wm_max_margin,
+                out=wm_out,
             )
+        return processed
+
+    first_frame_idx, max_frames = 0, None
+    if frame_range is not None:
+        first_frame_idx, end = frame_range
+        if end is not None:
+            max_frames = end - first_frame_idx
+        if first_frame_idx > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame_idx)
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if max_frames is not None:
+        total_frames = max_frames
+    elif total_frames > 0:
+        total_frames = max(0, total_frames - first_frame_idx)
+
+    def report(frames_done: int) -> None:
+        if frames_done % 100 == 0:
+            print(f"  processed {frames_done} frames…")
+        if progress is not None:
+            progress(frames_done, total_frames)
 
-        out.write(processed)
-        frame_idx += 1
-        if frame_idx % 100 == 0:
-            print(f"  processed {frame_idx} frames…")
-
-    cap.release()
-    out.release()
-    print(f"✓ {frame_idx} frames processed → {output_path}")
+    try:
+        stats = run_frame_pipeline(cap, out, transform, workers=workers, on_frame=report,
+                                   first_frame_idx=first_frame_idx, max_frames=max_frames)
+    finally:
+        cap.release()
+        out.release()
+    print(f"✓ {stats.frames} frames processed → {output_path}")
+    print(f"  {stats.summary()}")
+    print(f"  {pool.summary()}")
 
     # Save params JSON (only for scramble mode)
     params_path = ""
@@ -921,7 +981,7 @@ def process_video(input_path: str,
             params = hpf_params_to_json(seed, n, m, perm_dest_to_src_0,
                                        blur_ksize, hpf_k_lr, hpf_k_tb,
                                        hpf_tile_h, hpf_tile_w,
-                                       hpf_orig_h, hpf_orig_w)
+                                       hpf_orig_h, hpf_orig_w, lpf_mode)
 
         base, ext = os.path.splitext(output_path)
         params_path = base + ".params.json"
@@ -931,23 +991,168 @@ def process_video(input_path: str,
     return params_path
 
 
+def process_video_segmented(input_path: str,
+                            output_path: str,
+                            segments: int,
+                            seed: Optional[int] = None,
+                            **kwargs) -> str:
+    """
+    Run process_video over `segments` time ranges in parallel worker processes.
+
+    Ranges snap to keyframes (via ffprobe) when possible. Each worker opens its own
+    VideoCapture/VideoWriter and keeps absolute frame indices, so watermark epochs
+    (frame_idx // wm_duration) match a serial run. The encoded parts are joined with
+    the ffmpeg concat demuxer. Falls back to a single serial run without ffmpeg.
+
+    kwargs are passed through to process_video. A `progress` callback is not
+    passed to the worker processes; it is called as each segment finishes.
+    Returns path to params JSON (for scramble mode).
+    """
+    progress = kwargs.pop("progress", None)
+    if seed is None:
+        # Every segment must share the same permutation / hue shifts
+        seed = gen_random_seed()
+
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg not found; processing video as a single segment")
+        return process_video(input_path, output_path, seed=seed, progress=progress, **kwargs)
+
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {input_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    ranges = split_frame_ranges(total_frames, segments, probe_keyframes(input_path, fps))
+    if len(ranges) <= 1:
+        return process_video(input_path, output_path, seed=seed, progress=progress, **kwargs)
+
+    # Frame counts from container metadata can be off; the last segment reads to EOF
+    ranges[-1] = (ranges[-1][0], None)
+    print(f"Segmented processing: {len(ranges)} segments starting at frames "
+          f"{[start for start, _ in ranges]}")
+
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    base, ext = os.path.splitext(output_path)
+    part_dir = tempfile.mkdtemp(prefix="segments_", dir=out_dir)
+    part_paths = [os.path.join(part_dir, f"part_{i:03d}{ext}") for i in range(len(ranges))]
+
+    try:
+        with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = {
+                pool.submit(process_video, input_path, part_path,
+                            seed=seed, frame_range=frame_range, **kwargs): frame_range
+                for part_path, frame_range in zip(part_paths, ranges)
+            }
+            frames_done = 0
+            for future in as_completed(futures):
+                future.result()
+                start, end = futures[future]
+                frames_done += (end if end is not None else total_frames) - start
+                if progress is not None:
+                    progress(frames_done, total_frames)
+            part_params = [f.result() for f in futures]
+
+        concat_segments(part_paths, output_path)
+        print(f"✓ {len(ranges)} segments concatenated → {output_path}")
+
+        # Every segment writes identical params; keep the first one
+        params_path = ""
+        if part_params[0]:
+            params_path = base + ".params.json"
+            shutil.move(part_params[0], params_path)
+        return params_path
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+
+def watermark_video(input_path: str,
+                    output_path: str,
+                    wm_id: Optional[int] = None,
+                    wm_alpha: float = 0.15,
+                    wm_scale: float = 1.0,
+                    wm_count: int = 1,
+                    wm_duration: int = 30,
+                    wm_placement: str = "random",
+                    wm_min_margin: float = 5.0,
+                    wm_max_margin: float = 30.0,
+                    workers: int = 1,
+                    io_options: Optional[VideoIOOptions] = None,
+                    progress: Optional[ProgressCallback] = None) -> None:
+    """
+    Re-encode an already unscrambled video with the watermark marker overlay
+    (decode → apply_watermark → encode). Frame indices start at 0, so markers
+    land exactly where process_video(..., mode="unscramble", wm_id=...) puts them.
+    wm_id=None re-encodes without markers. Used by unscramble_cache.py.
+    """
+    if not os.path.isfile(input_path):
+        raise FileNotFoundError(f"Input video not found: {input_path}")
+
+    cap = open_video_reader(input_path, io_options)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {input_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    fourcc, _ = get_fourcc_for_output(output_path)
+    out = open_video_writer(output_path, fps, (width, height), fourcc, io_options)
+    if not out.isOpened():
+        cap.release()
+        raise RuntimeError(f"Could not open output video for writing: {output_path}")
+
+    def transform(frame: np.ndarray, frame_idx: int) -> np.ndarray:
+        if wm_id is None:
+            return frame
+        # The decoded frame belongs to this call, so the markers go on in place
+        return apply_watermark(
+            frame, frame_idx,
+            wm_id, wm_alpha, wm_scale,
+            wm_count, wm_duration, wm_placement,
+            wm_min_margin, wm_max_margin,
+            out=frame,
+        )
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def report(frames_done: int) -> None:
+        if progress is not None:
+            progress(frames_done, total_frames)
+
+    try:
+        stats = run_frame_pipeline(cap, out, transform, workers=workers, on_frame=report)
+    finally:
+        cap.release()
+        out.release()
+    print(f"✓ {stats.frames} frames watermarked → {output_path}")
+    print(f"  {stats.summary()}")
+
+
 def process_video_by_percentage(input_path: str,
                   output_path: str,
                   seed: Optional[int] = None,
                   rows: Optional[int] = None,
                   cols: Optional[int] = None,
                   mode: str = "scramble",
-                  percentage: Optional[int] = 100) -> str:
+                  percentage: Optional[int] = 100,
+                  workers: int = 1,
+                  io_options: Optional[VideoIOOptions] = None,
+                  progress: Optional[ProgressCallback] = None) -> str:
     """
     Process a video: scramble or unscramble according to mode.
     Only scrambles a certain percentage of tiles based on the percentage parameter.
+    workers > 1 runs a threaded decode → transform → encode pipeline;
+    io_options selects the video I/O backend and encoder settings;
+    progress(frames_done, total_frames) is called after each written frame.
     Returns path to params JSON (for scramble mode).
     """
 
     if not os.path.isfile(input_path):
         raise FileNotFoundError(f"Input video not found: {input_path}")
 
-    cap = cv2.VideoCapture(input_path)
+    cap = open_video_reader(input_path, io_options)
     if not cap.isOpened():
         raise RuntimeError(f"Could not open video: {input_path}")
 
@@ -1052,44 +1257,42 @@ def process_video_by_percentage(input_path: str,
     else:
         raise ValueError("mode must be 'scramble' or 'unscramble'")
 
-    # Precompute rectangles for video frames (src and dest shapes are same)
-    src_rects = cell_rects(width, height, n, m)
-    dest_rects = cell_rects(width, height, n, m)
+    # Precompute the tile gather maps once; frames are remapped into pooled buffers
+    plan = ScramblePlan(width, height, n, m, perm_dest_to_src_0)
+    pool = BufferPool()
 
     # Prepare video writer with appropriate codec for output format
     fourcc, _ = get_fourcc_for_output(output_path)
-    out = cv2.VideoWriter(output_path, fourcc, float(fps), (width, height))
+    out = open_video_writer(output_path, fps, (width, height), fourcc, io_options)
     if not out.isOpened():
         cap.release()
         raise RuntimeError(f"Could not open output video for writing: {output_path}")
 
     # Process all frames
-    frame_idx = 0
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-
-        if frame is None:
-            break
-
+    def transform(frame: np.ndarray, frame_idx: int) -> np.ndarray:
         # Apply the same partial scramble/unscramble to each frame
+        frame_out = pool.output("frame_out", (height, width, 3), workers <= 1)
         if mode == "scramble":
-            processed = scramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
-        else:
-            processed = unscramble_frame(frame, n, m, perm_dest_to_src_0, src_rects, dest_rects)
+            return plan.scramble(frame, frame_out)
+        return plan.unscramble(frame, frame_out)
 
-        out.write(processed)
-        frame_idx += 1
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
+    def report(frames_done: int) -> None:
         # Print progress every 30 frames
-        if frame_idx % 30 == 0:
-            print(f"Processed {frame_idx} frames...")
+        if frames_done % 30 == 0:
+            print(f"Processed {frames_done} frames...")
+        if progress is not None:
+            progress(frames_done, total_frames)
 
-    cap.release()
-    out.release()
+    try:
+        stats = run_frame_pipeline(cap, out, transform, workers=workers, on_frame=report)
+    finally:
+        cap.release()
+        out.release()
 
-    print(f"✓ Processed {frame_idx} frames total")
+    print(f"✓ Processed {stats.frames} frames total")
+    print(f"  {stats.summary()}")
 
     # Save params JSON (only for scramble mode)
     params_path = ""
@@ -1113,16 +1316,10 @@ def generate_hue_shifts(n: int, m: int, seed: int, max_shift: int = 128) -> List
     Generate random hue shifts for each cell in the grid.
     Returns a list of hue shift values (0 to max_shift) for each cell.
     """
-    rand = mulberry32(seed & 0xFFFFFFFF)
     N = n * m
-    shifts = []
-    
-    for _ in range(N):
-        # Generate random shift from 0 to max_shift
-        shift = int(rand() * (max_shift + 1))
-        shifts.append(shift)
-    
-    return shifts
+    # Random shift from 0 to max_shift per cell, one vectorized draw
+    rand = mulberry32_floats(seed & 0xFFFFFFFF, N)
+    return (rand * (max_shift + 1)).astype(np.int64).tolist()
 
 
 def apply_hue_shift_to_region(region: np.ndarray, hue_shift: int) -> np.ndarray:
@@ -1156,28 +1353,18 @@ def color_scramble_frame(frame: np.ndarray,
                         cell_rects: List[Rect]) -> np.ndarray:
     """
     Apply color scrambling (hue shifts) to each cell in the frame.
+
+    Delegates to a cached HueShiftPlan (a per-pixel hue-offset plane, with
+    per-cell HSV conversions); the rects are the cell_rects() layout the plan
+    derives itself.
     """
     h, w, c = frame.shape
-    out = frame.copy()
     
     N = n * m
     if len(hue_shifts) != N or len(cell_rects) != N:
         raise ValueError("Hue shifts and cell rects must match grid size")
     
-    for cell_idx in range(N):
-        rect = cell_rects[cell_idx]
-        hue_shift = hue_shifts[cell_idx]
-        
-        # Extract the cell region
-        region = frame[rect.y0:rect.y1, rect.x0:rect.x1, :]
-        
-        # Apply hue shift
-        shifted_region = apply_hue_shift_to_region(region, hue_shift)
-        
-        # Place back in output frame
-        out[rect.y0:rect.y1, rect.x0:rect.x1, :] = shifted_region
-    
-    return out
+    return get_hue_shift_plan(w, h, n, m, hue_shifts).scramble(frame)
 
 
 def color_unscramble_frame(frame: np.ndarray,
@@ -1188,9 +1375,13 @@ def color_unscramble_frame(frame: np.ndarray,
     """
     Reverse color scrambling by applying negative hue shifts.
     """
-    # Create inverse hue shifts
-    inverse_shifts = [-shift for shift in hue_shifts]
-    return color_scramble_frame(frame, n, m, inverse_shifts, cell_rects)
+    h, w, c = frame.shape
+    
+    N = n * m
+    if len(hue_shifts) != N or len(cell_rects) != N:
+        raise ValueError("Hue shifts and cell rects must match grid size")
+    
+    return get_hue_shift_plan(w, h, n, m, hue_shifts).unscramble(frame)
 
 
 def color_params_to_json(seed: int, n: int, m: int, hue_shifts: List[int], max_shift: int) -> Dict[str, Any]:
@@ -1225,6 +1416,8 @@ def main():
                         help="Gaussian blur kernel size (odd integer) for HPF algorithm. Larger = more blur in LPF, more detail in HPF tiles (default: 15)")
     parser.add_argument("--watermark-rows", type=int, default=1,
                         help="Number of empty tile rows on top and bottom for watermarks/attribution (HPF algorithm only, default: 1)")
+    parser.add_argument("--lpf-mode", choices=LPF_MODES, default="gaussian",
+                        help="HPF low-pass filter: 'gaussian' (exact), 'box' or 'pyramid' (fast approximations for large --blur-ksize, default: gaussian)")
     parser.add_argument("--percentage", type=int,
                         help="Percentage of tiles to scramble (0-100). Only for spatial algorithm.")
 
@@ -1247,6 +1440,13 @@ def main():
     parser.add_argument("--wm-max-margin", type=float, default=30.0,
                         help="Max edge margin %% for custom placement (5-50, default: 30)")
 
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Frame transform threads. >1 enables the threaded decode/transform/encode pipeline (default: 1)")
+    parser.add_argument("--segments", type=int, default=1,
+                        help="Split the video into N time ranges processed in parallel processes and joined with ffmpeg (default: 1)")
+
+    add_video_io_args(parser)
+
     args = parser.parse_args()
 
     # Validate max-hue-shift range
@@ -1274,6 +1474,8 @@ def main():
                 mode=args.mode,
                 algorithm=args.algorithm,
                 percentage=args.percentage,
+                workers=args.workers,
+                io_options=video_io_options_from_args(args),
             )
         else:
             # if percentage is not provided or equal to 100%, use normal processing
@@ -1288,6 +1490,7 @@ def main():
                 max_hue_shift=args.max_hue_shift,
                 blur_ksize=args.blur_ksize,
                 watermark_rows=args.watermark_rows,
+                lpf_mode=args.lpf_mode,
                 wm_id=args.wm_id,
                 wm_alpha=args.wm_alpha,
                 wm_scale=args.wm_scale,
@@ -1296,6 +1499,9 @@ def main():
                 wm_placement=args.wm_placement,
                 wm_min_margin=args.wm_min_margin,
                 wm_max_margin=args.wm_max_margin,
+                workers=args.workers,
+                io_options=video_io_options_from_args(args),
+                segments=args.segments,
             )
         print(f"Done. Output video: {args.output}")
         if args.mode == "scramble" and params_path:
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tileable mod-256 noise shared by the scramble_photo* modules.
+
+A noise tile from generate_noise_tile_offsets is added (scramble) or
+subtracted (unscramble) across the whole frame with wrapping uint8
+arithmetic, so apply_noise_sub_mod256 exactly undoes apply_noise_add_mod256.
+"""
+from typing import Optional
+
+import numpy as np
+
+# Rows per band in the noise engine (rounded up to whole tiles); bounds the
+# temporary tiled pattern to about band_rows * width * 3 bytes
+NOISE_BAND_ROWS = 256
+
+
+def _apply_noise_mod256(frame: np.ndarray, tile_offsets: np.ndarray, tile_size: int,
+                        sign: int, out: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Shared engine for apply_noise_add_mod256 / apply_noise_sub_mod256.
+
+    The offsets are reduced mod 256 to a uint8 pattern once, tiled across the
+    frame width, and added band by band with wrapping uint8 arithmetic, which is
+    the same value mod(pixel ± offset, 256) gives.  Bands start on tile rows, so
+    every band uses the same pattern slice.
+    """
+    h, w, c = frame.shape
+    if out is None:
+        out = frame.copy()
+    elif out is not frame:
+        out[...] = frame
+
+    # (tile, tile, 3) offsets → uint8 pattern: +offset or -offset mod 256
+    pattern = (sign * tile_offsets.astype(np.int32).reshape(tile_size, tile_size, 3)) & 0xFF
+    pattern = pattern.astype(np.uint8)
+
+    # Repeat to a band of whole tiles in y and to the frame width in x
+    band_tiles = max(1, -(-min(NOISE_BAND_ROWS, h) // tile_size))
+    band = np.tile(pattern, (band_tiles, -(-w // tile_size), 1))[:, :w]
+    band_h = band.shape[0]
+
+    # Channels 0-2 only; alpha channel (if exists) unchanged
+    for y0 in range(0, h, band_h):
+        rows = min(band_h, h - y0)
+        dst = out[y0:y0 + rows, :, :3]
+        np.add(dst, band[:rows], out=dst)
+
+    return out
+
+
+def apply_noise_add_mod256(frame: np.ndarray, tile_offsets: np.ndarray, tile_size: int,
+                           out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Add tileable noise to an image (for scrambling).
+    Applies modulo 256 arithmetic to handle overflow.
+    
+    Args:
+        frame: Input image (H, W, C) where C >= 3
+        tile_offsets: Noise offsets from generate_noise_tile_offsets
+        tile_size: Size of the tile pattern
+        out: Destination buffer; pass `frame` to add the noise in place
+    
+    Returns:
+        Image with noise added
+    """
+    return _apply_noise_mod256(frame, tile_offsets, tile_size, 1, out)
+
+
+def apply_noise_sub_mod256(frame: np.ndarray, tile_offsets: np.ndarray, tile_size: int,
+                           out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Remove tileable noise from an image (for unscrambling).
+    Applies modulo 256 arithmetic to handle underflow.
+    
+    Args:
+        frame: Input image (H, W, C) where C >= 3
+        tile_offsets: Same noise offsets used in apply_noise_add_mod256
+        tile_size: Size of the tile pattern
+        out: Destination buffer; pass `frame` to remove the noise in place
+    
+    Returns:
+        Image with noise removed
+    """
+    return _apply_noise_mod256(frame, tile_offsets, tile_size, -1, out)
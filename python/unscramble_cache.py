@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Unscramble-once, watermark-many cache for per-buyer video delivery.
+
+Every buyer of a video runs /unscramble-video-pro on the same scrambled upload
+with the same params; only the visible marker (wm_id) differs.  The first
+request stores the clean, marker-free unscrambled frames as a lossless FFV1
+file, keyed by the SHA-256 of the source file plus the unscramble params.
+Later requests decode that file, overlay their own marker and encode
+(scramble_video_pro.watermark_video), skipping the unscramble entirely.
+
+Entries are written to a temp name and renamed into place, so concurrent
+workers never see half-written files.  The directory is bounded by size:
+least recently used entries (by mtime, refreshed on every hit) are evicted
+after each insert (see disk_cache.py).
+"""
+import argparse
+import hashlib
+import os
+import time
+from dataclasses import replace
+from typing import Any, Optional
+
+from config import UNSCRAMBLE_CACHE_FOLDER, UNSCRAMBLE_CACHE_MAX_BYTES
+from disk_cache import DiskLRUCache, file_digest
+from video_io import (
+    LOSSLESS_CODEC, LOSSLESS_EXT, VideoIOOptions, ffmpeg_available,
+)
+from video_pipeline import ProgressCallback
+
+# Bump when the meaning of a cached file changes (e.g. the unscramble math)
+CACHE_FORMAT = 1
+
+# Params that determine the unscrambled frames, per algorithm
+_KEY_PARAMS = {
+    "spatial": ("seed", "rows", "cols"),
+    "color": ("seed", "rows", "cols", "max_hue_shift"),
+    "hpf": ("seed", "rows", "cols", "watermark_rows"),
+}
+
+_WM_PARAMS = ("wm_id", "wm_alpha", "wm_scale", "wm_count", "wm_duration",
+              "wm_placement", "wm_min_margin", "wm_max_margin")
+
+class UnscrambleCache(DiskLRUCache):
+    """Size-bounded on-disk LRU of clean unscrambled videos."""
+
+    label = "Unscramble cache"
+
+    def __init__(self, cache_dir: str = UNSCRAMBLE_CACHE_FOLDER,
+                 max_bytes: int = UNSCRAMBLE_CACHE_MAX_BYTES):
+        super().__init__(cache_dir, max_bytes, LOSSLESS_EXT)
+
+    def key(self, input_path: str, algorithm: str = "spatial",
+            **params: Any) -> str:
+        """Content address for unscrambling input_path with these params."""
+        if algorithm not in _KEY_PARAMS:
+            raise ValueError("algorithm must be 'spatial', 'color', or 'hpf'")
+        parts = [f"v{CACHE_FORMAT}", file_digest(input_path), algorithm]
+        parts += [f"{name}={params.get(name)}" for name in _KEY_PARAMS[algorithm]]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _pass_progress(progress: Optional[ProgressCallback], pass_idx: int,
+                   passes: int) -> Optional[ProgressCallback]:
+    """Report pass `pass_idx` of `passes` equally sized passes as one frame count."""
+    if progress is None:
+        return None
+
+    def report(frames_done: int, total_frames: int) -> None:
+        progress(pass_idx * total_frames + frames_done, passes * total_frames)
+
+    return report
+
+
+def unscramble_video_cached(input_path: str,
+                            output_path: str,
+                            cache: Optional[UnscrambleCache] = None,
+                            workers: int = 1,
+                            io_options: Optional[VideoIOOptions] = None,
+                            progress: Optional[ProgressCallback] = None,
+                            **kwargs) -> bool:
+    """
+    scramble_video_pro.process_video(mode="unscramble") through the cache.
+
+    kwargs are process_video's algorithm params (algorithm, seed, rows, cols,
+    blur_ksize, watermark_rows, max_hue_shift, segments) and wm_* marker options.
+    On a miss the clean video is unscrambled once into the cache and the
+    markers are overlaid from it; on a hit only the overlay pass runs.
+    Without ffmpeg (no lossless intermediate) this is a plain process_video call.
+    Returns True on a cache hit.
+    """
+    import scramble_video_pro
+
+    if not ffmpeg_available() or (io_options is not None and io_options.backend == "opencv"):
+        scramble_video_pro.process_video(input_path, output_path, mode="unscramble",
+                                         workers=workers, io_options=io_options,
+                                         progress=progress, **kwargs)
+        return False
+
+    cache = cache or UnscrambleCache()
+    wm_kwargs = {name: kwargs.pop(name) for name in _WM_PARAMS if name in kwargs}
+    key = cache.key(input_path, **kwargs)
+
+    clean_path = cache.get(key)
+    if clean_path is not None:
+        print(f"⚡ Unscramble cache hit: {key[:12]}…")
+        scramble_video_pro.watermark_video(clean_path, output_path, workers=workers,
+                                           io_options=io_options, progress=progress,
+                                           **wm_kwargs)
+        return True
+
+    print(f"Unscramble cache miss: {key[:12]}…")
+    t0 = time.perf_counter()
+    tmp_path = cache.temp_path(key)
+    lossless = replace(io_options or VideoIOOptions(), codec=LOSSLESS_CODEC)
+    try:
+        scramble_video_pro.process_video(input_path, tmp_path, mode="unscramble",
+                                         workers=workers, io_options=lossless,
+                                         progress=_pass_progress(progress, 0, 2),
+                                         **kwargs)
+        scramble_video_pro.watermark_video(tmp_path, output_path, workers=workers,
+                                           io_options=io_options,
+                                           progress=_pass_progress(progress, 1, 2),
+                                           **wm_kwargs)
+        if cache.put(key, tmp_path) is None:
+            print("Unscramble cache: entry larger than the cache budget, not stored")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"  unscrambled and cached in {time.perf_counter() - t0:.2f}s")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or trim the unscramble cache.")
+    parser.add_argument("--cache-dir", default=UNSCRAMBLE_CACHE_FOLDER,
+                        help=f"Cache directory (default: {UNSCRAMBLE_CACHE_FOLDER})")
+    parser.add_argument("--max-gb", type=float, default=UNSCRAMBLE_CACHE_MAX_BYTES / 1024 ** 3,
+                        help="Size budget in GB used by --evict")
+    parser.add_argument("--evict", action="store_true", help="Evict down to the size budget")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached entry")
+    args = parser.parse_args()
+
+    cache = UnscrambleCache(args.cache_dir, int(args.max_gb * 1024 ** 3))
+    if args.clear:
+        cache.clear()
+    elif args.evict:
+        cache.evict()
+
+    entries = cache.entries()
+    for path, size, mtime in entries:
+        print(f"{os.path.basename(path)}  {size / 1024 ** 2:9.1f} MB  "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(mtime))}")
+    print(f"{len(entries)} entries, {sum(s for _, s, _ in entries) / 1024 ** 2:.1f} MB "
+          f"/ {cache.max_bytes / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Pluggable video I/O for the video scripts.
+
+The ffmpeg backend streams BGR frames through `ffmpeg -f rawvideo` pipes for
+decode and encode, which gives control over the output codec (libx264,
+libx265, libvpx, libvpx-vp9), preset, CRF and thread count, plus lossless
+FFV1 for intermediates that are decoded again later.  The OpenCV
+backend is the original cv2.VideoCapture / cv2.VideoWriter path and is used
+whenever ffmpeg is not installed.
+
+Readers and writers expose the subset of the cv2 API the scripts use
+(read/write/get/set/isOpened/release), so they are drop-in replacements.
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+BACKENDS = ("auto", "ffmpeg", "opencv")
+CODECS = ("libx264", "libx265", "libvpx", "libvpx-vp9", "ffv1")
+PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast",
+           "medium", "slow", "slower", "veryslow")
+
+# Default CRF per codec (roughly equal perceived quality)
+_DEFAULT_CRF = {"libx264": 23, "libx265": 28, "libvpx": 10, "libvpx-vp9": 32}
+
+# Lossless intermediate settings: FFV1 in Matroska, stored as BGR so frames
+# decode back bit-identical (no YUV round trip)
+LOSSLESS_CODEC = "ffv1"
+LOSSLESS_EXT = ".mkv"
+LOSSLESS_FOURCC = "FFV1"
+
+
+@dataclass
+class VideoIOOptions:
+    backend: str = "auto"            # "auto" (ffmpeg if installed), "ffmpeg", or "opencv"
+    codec: Optional[str] = None      # None = chosen from the output extension
+    preset: str = "medium"           # x264/x265 preset; mapped to -cpu-used for libvpx
+    crf: Optional[int] = None        # None = codec default
+    threads: int = 0                 # 0 = let ffmpeg decide
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+@lru_cache(maxsize=None)
+def _passthrough_args() -> Tuple[str, ...]:
+    """
+    Output flags that pass decoded frames through without duplicating or
+    dropping any to fit a constant rate (-fps_mode needs ffmpeg >= 5.1).
+    """
+    try:
+        banner = subprocess.run(["ffmpeg", "-version"], capture_output=True,
+                                text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        banner = ""
+    match = re.match(r"ffmpeg version n?(\d+)\.(\d+)", banner)
+    # Unparseable versions are git builds, which are newer than any release
+    if match and (int(match.group(1)), int(match.group(2))) < (5, 1):
+        return ("-vsync", "0")
+    return ("-fps_mode", "passthrough")
+
+
+def _use_ffmpeg(options: Optional[VideoIOOptions]) -> bool:
+    backend = (options or VideoIOOptions()).backend
+    if backend not in BACKENDS:
+        raise ValueError(f"video backend must be one of {BACKENDS}")
+    if backend == "opencv":
+        return False
+    if ffmpeg_available():
+        return True
+    if backend == "ffmpeg":
+        print("Warning: ffmpeg not found; falling back to OpenCV video I/O")
+    return False
+
+
+def default_codec_for_output(output_path: str) -> str:
+    ext = os.path.splitext(output_path)[1].lower()
+    return "libvpx-vp9" if ext == ".webm" else "libx264"
+
+
+class FFmpegReader:
+    """Decode a video into BGR frames through an ffmpeg rawvideo pipe."""
+
+    def __init__(self, path: str, threads: int = 0):
+        self.path = path
+        self.threads = threads
+
+        # Container metadata comes from OpenCV so get() matches cv2.VideoCapture
+        probe = cv2.VideoCapture(path)
+        self._opened = probe.isOpened()
+        self._props = {
+            prop: probe.get(prop)
+            for prop in (cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_WIDTH,
+                         cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FRAME_COUNT)
+        }
+        probe.release()
+
+        self.width = int(self._props[cv2.CAP_PROP_FRAME_WIDTH])
+        self.height = int(self._props[cv2.CAP_PROP_FRAME_HEIGHT])
+        self._frame_bytes = self.width * self.height * 3
+        self._start_frame = 0
+        self._pos = 0
+        self._proc: Optional[subprocess.Popen] = None
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._pos)
+        return self._props.get(prop, 0.0)
+
+    def set(self, prop: int, value: float) -> bool:
+        """Only CAP_PROP_POS_FRAMES before the first read() is supported."""
+        if prop != cv2.CAP_PROP_POS_FRAMES or self._proc is not None:
+            return False
+        self._start_frame = int(value)
+        self._pos = self._start_frame
+        return True
+
+    def _start(self) -> None:
+        cmd = ["ffmpeg", "-v", "error", "-nostdin"]
+        if self.threads:
+            cmd += ["-threads", str(self.threads)]
+        if self._start_frame > 0:
+            fps = self._props[cv2.CAP_PROP_FPS] or 30.0
+            # Half a frame early so the first frame with pts >= t is exactly start_frame
+            cmd += ["-ss", f"{(self._start_frame - 0.5) / fps:.6f}"]
+        cmd += ["-i", self.path, "-map", "0:v:0", *_passthrough_args(),
+                "-f", "rawvideo", "-pix_fmt", "bgr24", "-"]
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL,
+                                      bufsize=self._frame_bytes)
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """Next frame; like cv2.VideoCapture.read, a matching `image` is filled in place."""
+        if not self._opened or self._frame_bytes == 0:
+            return False, None
+        if self._proc is None:
+            self._start()
+        frame = image
+        if (frame is None or frame.shape != (self.height, self.width, 3)
+                or frame.dtype != np.uint8 or not frame.flags.c_contiguous):
+            frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        if self._proc.stdout.readinto(memoryview(frame).cast("B")) < self._frame_bytes:
+            return False, None
+        self._pos += 1
+        return True, frame
+
+    def release(self) -> None:
+        if self._proc is not None:
+            self._proc.stdout.close()
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+        self._opened = False
+
+
+class FFmpegWriter:
+    """Encode BGR frames through an ffmpeg rawvideo pipe."""
+
+    def __init__(self, output_path: str, fps: float, size: Tuple[int, int],
+                 options: Optional[VideoIOOptions] = None):
+        options = options or VideoIOOptions()
+        self.output_path = output_path
+        self.width, self.height = size
+        self.codec = options.codec or default_codec_for_output(output_path)
+        if self.codec not in CODECS:
+            raise ValueError(f"codec must be one of {CODECS}")
+        if options.preset not in PRESETS:
+            raise ValueError(f"preset must be one of {PRESETS}")
+
+        cmd = [
+            "ffmpeg", "-v", "error", "-nostdin", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{self.width}x{self.height}", "-r", f"{float(fps):.6f}",
+            "-i", "-",
+            "-an", "-c:v", self.codec,
+        ]
+        if self.codec == LOSSLESS_CODEC:
+            # bgr0 keeps the frames in RGB space; slices let ffv1 use several threads
+            cmd += ["-pix_fmt", "bgr0", "-level", "3", "-slices", "4"]
+        else:
+            crf = options.crf if options.crf is not None else _DEFAULT_CRF[self.codec]
+            # 4:2:0 needs even dimensions: odd-sized frames (e.g. HPF canvases)
+            # get a black row/column of padding rather than a yuv444p stream
+            # that many players and browsers cannot decode
+            if self.width % 2 or self.height % 2:
+                cmd += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+            cmd += ["-pix_fmt", "yuv420p", "-crf", str(crf)]
+            if self.codec in ("libvpx", "libvpx-vp9"):
+                # libvpx has no x264-style presets: map them onto -cpu-used (0 = slowest)
+                cpu_used = max(0, 8 - PRESETS.index(options.preset))
+                cmd += ["-b:v", "0", "-deadline", "good", "-cpu-used", str(cpu_used)]
+            else:
+                cmd += ["-preset", options.preset]
+        if options.threads:
+            cmd += ["-threads", str(options.threads)]
+        if os.path.splitext(output_path)[1].lower() in (".mp4", ".mov"):
+            cmd += ["-movflags", "+faststart"]
+        cmd.append(output_path)
+
+        self._stderr = tempfile.TemporaryFile()
+        self._proc: Optional[subprocess.Popen] = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def isOpened(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def write(self, frame: np.ndarray) -> None:
+        if frame.shape[:2] != (self.height, self.width):
+            raise ValueError(f"Frame is {frame.shape[1]}x{frame.shape[0]}, "
+                             f"writer expects {self.width}x{self.height}")
+        try:
+            self._proc.stdin.write(memoryview(np.ascontiguousarray(frame)))
+        except BrokenPipeError:
+            self.release()
+
+    def release(self) -> None:
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        code = proc.wait()
+        self._stderr.seek(0)
+        err = self._stderr.read().decode("utf-8", "replace").strip()
+        self._stderr.close()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg encode failed for {self.output_path}: {err[-500:]}")
+
+
+def open_video_reader(input_path: str, options: Optional[VideoIOOptions] = None):
+    """Open a frame reader for input_path (FFmpegReader or cv2.VideoCapture)."""
+    if _use_ffmpeg(options):
+        return FFmpegReader(input_path, threads=(options or VideoIOOptions()).threads)
+    return cv2.VideoCapture(input_path)
+
+
+def open_video_writer(output_path: str, fps: float, size: Tuple[int, int], fourcc: int,
+                      options: Optional[VideoIOOptions] = None):
+    """
+    Open a frame writer for output_path (FFmpegWriter or cv2.VideoWriter).
+    `fourcc` is only used by the OpenCV fallback.
+    """
+    if _use_ffmpeg(options):
+        return FFmpegWriter(output_path, fps, size, options)
+    return cv2.VideoWriter(output_path, fourcc, float(fps), size)
+
+
+def add_video_io_args(parser) -> None:
+    """Register the shared --video-backend/--codec/--preset/--crf/--encode-threads flags."""
+    parser.add_argument("--video-backend", choices=BACKENDS, default="auto",
+                        help="Video I/O backend: ffmpeg pipes or OpenCV (default: auto = ffmpeg if installed)")
+    parser.add_argument("--codec", choices=CODECS, default=None,
+                        help="ffmpeg video codec (default: libx264, libvpx-vp9 for .webm)")
+    parser.add_argument("--preset", choices=PRESETS, default="medium",
+                        help="Encoder speed/size trade-off (default: medium)")
+    parser.add_argument("--crf", type=int, default=None,
+                        help="Constant rate factor; lower = better quality, bigger files (default: codec-specific)")
+    parser.add_argument("--encode-threads", type=int, default=0,
+                        help="ffmpeg thread count for decode/encode (default: 0 = auto)")
+
+
+def video_io_options_from_args(args) -> VideoIOOptions:
+    return VideoIOOptions(
+        backend=args.video_backend,
+        codec=args.codec,
+        preset=args.preset,
+        crf=args.crf,
+        threads=args.encode_threads,
+    )
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Decode → transform → encode frame pipeline shared by the scramble_video modules.
+
+With workers <= 1 frames are processed serially on the calling thread.  With
+more workers a reader thread decodes into a bounded queue, a pool of transform
+threads processes frames (OpenCV and NumPy release the GIL), and the calling
+thread writes results back in frame order.
+
+The segment helpers at the bottom split a video into frame ranges (snapped to
+keyframes when ffprobe is available) and stitch the encoded parts back
+together with the ffmpeg concat demuxer.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# transform(frame, frame_idx) -> processed frame
+FrameTransform = Callable[[np.ndarray, int], np.ndarray]
+
+# progress(frames_done, total_frames); total_frames is 0 when the container
+# doesn't report a frame count.  Raising from it aborts processing.
+ProgressCallback = Callable[[int, int], None]
+
+_SENTINEL = None
+
+
+@dataclass
+class PipelineStats:
+    frames: int = 0
+    workers: int = 1
+    read_s: float = 0.0       # time spent in cap.read()
+    transform_s: float = 0.0  # summed across transform workers
+    write_s: float = 0.0      # time spent in writer.write()
+    wall_s: float = 0.0
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.wall_s if self.wall_s > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.frames} frames in {self.wall_s:.2f}s ({self.fps:.1f} fps, "
+                f"{self.workers} worker(s)) | read {self.read_s:.2f}s, "
+                f"transform {self.transform_s:.2f}s, write {self.write_s:.2f}s")
+
+
+def _put(q: "queue.Queue", item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once `stop` is set."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_serial(cap, writer, transform: FrameTransform,
+                on_frame: Optional[Callable[[int], None]],
+                first_frame_idx: int, max_frames: Optional[int]) -> PipelineStats:
+    stats = PipelineStats(workers=1)
+    t_start = time.perf_counter()
+    frame_idx = 0
+    # Each frame is written before the next read, so decode into the same buffer
+    frame = None
+    while max_frames is None or frame_idx < max_frames:
+        t0 = time.perf_counter()
+        ok, frame = cap.read(frame)
+        t1 = time.perf_counter()
+        stats.read_s += t1 - t0
+        if not ok or frame is None:
+            break
+
+        processed = transform(frame, first_frame_idx + frame_idx)
+        t2 = time.perf_counter()
+        stats.transform_s += t2 - t1
+
+        writer.write(processed)
+        stats.write_s += time.perf_counter() - t2
+
+        frame_idx += 1
+        if on_frame is not None:
+            on_frame(frame_idx)
+
+    stats.frames = frame_idx
+    stats.wall_s = time.perf_counter() - t_start
+    return stats
+
+
+def run_frame_pipeline(cap,
+                       writer,
+                       transform: FrameTransform,
+                       workers: int = 1,
+                       queue_size: int = 8,
+                       on_frame: Optional[Callable[[int], None]] = None,
+                       first_frame_idx: int = 0,
+                       max_frames: Optional[int] = None) -> PipelineStats:
+    """
+    Read every frame from `cap`, apply `transform`, and write results to `writer`.
+
+    Args:
+        cap: object with read() -> (ok, frame), e.g. cv2.VideoCapture
+        writer: object with write(frame), e.g. cv2.VideoWriter
+        transform: called as transform(frame, frame_idx); must not return a buffer
+                   shared with other frames when workers > 1.  The serial path
+                   decodes every frame into the same array, so a transform may
+                   work on `frame` in place but must not keep it.
+        workers: number of transform threads (<= 1 runs serially)
+        queue_size: capacity of the decode and result queues
+        on_frame: called with the number of frames written so far, after each write
+        first_frame_idx: absolute index of the first frame read from `cap`, passed
+                         through to `transform` (e.g. after seeking to a segment)
+        max_frames: stop after this many frames (None = read until EOF)
+
+    Returns PipelineStats with per-stage timings.
+    """
+    if workers <= 1:
+        return _run_serial(cap, writer, transform, on_frame, first_frame_idx, max_frames)
+
+    stats = PipelineStats(workers=workers)
+    stats_lock = threading.Lock()
+    stop = threading.Event()
+    errors = []
+
+    in_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    out_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    # Bounds frames that are decoded but not yet written, so a slow frame
+    # cannot let the reorder buffer grow without limit.
+    in_flight = threading.Semaphore(2 * queue_size + workers)
+
+    def reader():
+        try:
+            frame_idx = 0
+            while not stop.is_set() and (max_frames is None or frame_idx < max_frames):
+                while not in_flight.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                t0 = time.perf_counter()
+                ok, frame = cap.read()
+                stats.read_s += time.perf_counter() - t0
+                if not ok or frame is None:
+                    in_flight.release()
+                    break
+                if not _put(in_q, (first_frame_idx + frame_idx, frame), stop):
+                    return
+                frame_idx += 1
+        except BaseException as e:  # surfaced on the calling thread
+            errors.append(e)
+            stop.set()
+        finally:
+            for _ in range(workers):
+                _put(in_q, _SENTINEL, stop)
+
+    def worker():
+        busy = 0.0
+        try:
+            while not stop.is_set():
+                try:
+                    item = in_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _SENTINEL:
+                    break
+                frame_idx, frame = item
+                t0 = time.perf_counter()
+                processed = transform(frame, frame_idx)
+                busy += time.perf_counter() - t0
+                if not _put(out_q, (frame_idx - first_frame_idx, processed), stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            with stats_lock:
+                stats.transform_s += busy
+            _put(out_q, _SENTINEL, stop)
+
+    t_start = time.perf_counter()
+    threads = [threading.Thread(target=reader, name="frame-reader", daemon=True)]
+    threads += [threading.Thread(target=worker, name=f"frame-worker-{i}", daemon=True)
+                for i in range(workers)]
+    for t in threads:
+        t.start()
+
+    pending: Dict[int, np.ndarray] = {}
+    next_idx = 0
+    finished_workers = 0
+    try:
+        while finished_workers < workers and not stop.is_set():
+            try:
+                item = out_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _SENTINEL:
+                finished_workers += 1
+                continue
+            frame_idx, processed = item
+            pending[frame_idx] = processed
+            while next_idx in pending:
+                t0 = time.perf_counter()
+                writer.write(pending.pop(next_idx))
+                stats.write_s += time.perf_counter() - t0
+                in_flight.release()
+                next_idx += 1
+                if on_frame is not None:
+                    on_frame(next_idx)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    if pending:
+        raise RuntimeError(f"Frame pipeline lost frame {next_idx}; "
+                           f"{len(pending)} later frame(s) were not written")
+
+    stats.frames = next_idx
+    stats.wall_s = time.perf_counter() - t_start
+    return stats
+
+
+# ── Segment helpers (process pool split + ffmpeg concat) ─────────────────────
+
+def probe_keyframes(input_path: str, fps: float) -> List[int]:
+    """
+    Return frame indices of the video's keyframes using ffprobe.
+    Returns an empty list if ffprobe is unavailable or fails.
+    """
+    if shutil.which("ffprobe") is None:
+        return []
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time",
+        "-of", "csv=p=0",
+        input_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    if result.returncode != 0:
+        return []
+
+    keyframes = set()
+    for line in result.stdout.splitlines():
+        line = line.strip().rstrip(",")
+        try:
+            keyframes.add(int(round(float(line) * fps)))
+        except ValueError:
+            continue
+    return sorted(keyframes)
+
+
+def split_frame_ranges(total_frames: int, segments: int,
+                       keyframes: Optional[List[int]] = None) -> List[Tuple[int, int]]:
+    """
+    Split [0, total_frames) into up to `segments` contiguous (start, end) ranges.
+    Boundaries snap to the nearest keyframe when keyframes are given, so each
+    segment can start decoding without seeking into the middle of a GOP.
+    """
+    segments = max(1, min(segments, total_frames))
+    if segments == 1:
+        return [(0, total_frames)]
+
+    candidates = [k for k in (keyframes or []) if 0 < k < total_frames]
+    bounds = [0]
+    for i in range(1, segments):
+        target = round(i * total_frames / segments)
+        if candidates:
+            target = min(candidates, key=lambda k: abs(k - target))
+        if target > bounds[-1]:
+            bounds.append(target)
+    bounds.append(total_frames)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)
+            if bounds[i + 1] > bounds[i]]
+
+
+def concat_segments(part_paths: List[str], output_path: str) -> None:
+    """Stitch encoded segment files into output_path with the ffmpeg concat demuxer."""
+    list_fd, list_path = tempfile.mkstemp(suffix=".txt", prefix="concat_")
+    try:
+        with os.fdopen(list_fd, "w", encoding="utf-8") as f:
+            for p in part_paths:
+                escaped = os.path.abspath(p).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        cmd = [
+            "ffmpeg", "-v", "error",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            "-y", output_path,
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg concat failed: {result.stderr.strip()[:500]}")
+    finally:
+        os.remove(list_path)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped WAV input and streaming WAV output for the audio scripts.
+
+The audio scripts used to readframes() whole files and upcast them (int16 to
+float64 is an 8x blow-up), often for two files at once.  WavReader maps the
+data chunk instead, so samples are paged in only when a block touches them,
+and callers work through the file in fixed-size blocks (iter_chunks, or
+stft_chunks for overlap-added STFT frames).  WavWriter appends int16 blocks
+and patches the header sizes on close, so output never has to be
+assembled in memory either.
+
+Only 16-bit PCM is supported, which is what every script (and the ffmpeg
+decoder in front of them, see audio_decode.py) produces.
+"""
+import os
+import struct
+import wave
+from collections import namedtuple
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+# Samples per block (per channel) for the chunked loops: 2^20 frames is
+# ~24 s at 44.1 kHz, 2 MB per int16 channel and 8 MB once in float64
+CHUNK_FRAMES = 1 << 20
+
+# STFT frames per overlap-add chunk (~6 s at hop 512)
+STFT_CHUNK_FRAMES = 512
+
+# Same fields as wave's getparams(); accepted by setparams()
+WavParams = namedtuple("WavParams", "nchannels sampwidth framerate nframes comptype compname")
+
+
+def _find_data_chunk(f, path: str) -> Tuple[int, int]:
+    """(offset, size) of the RIFF 'data' chunk, size clamped to the file."""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError(f"Not a RIFF/WAVE file: {path}")
+    file_size = os.fstat(f.fileno()).st_size
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError(f"No data chunk in WAV file: {path}")
+        chunk_id, size = struct.unpack("<4sI", chunk)
+        if chunk_id == b"data":
+            offset = f.tell()
+            # Streamed WAVs (e.g. ffmpeg writing to a pipe) leave the size
+            # as 0 or 0xFFFFFFFF; the data then runs to the end of the file
+            if size == 0 or offset + size > file_size:
+                size = file_size - offset
+            return offset, size
+        f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+class WavReader:
+    """
+    A 16-bit PCM WAV file as a read-only memory map.
+
+    `samples` is the flat, interleaved int16 data (what
+    np.frombuffer(readframes(...)) used to return) and `frames` the same
+    data as (nframes, nchannels).  Slicing either reads only those pages.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with wave.open(path, "rb") as w:
+            params = w.getparams()
+        if params.sampwidth != 2:
+            raise ValueError(f"Only 16-bit PCM WAV is supported: {path} "
+                             f"({8 * params.sampwidth}-bit)")
+        with open(path, "rb") as f:
+            offset, size = _find_data_chunk(f, path)
+
+        frame_bytes = 2 * params.nchannels
+        nframes = size // frame_bytes
+        if nframes == 0:
+            samples = np.zeros(0, dtype=np.int16)
+        else:
+            samples = np.memmap(path, dtype="<i2", mode="r", offset=offset,
+                                shape=(nframes * params.nchannels,))
+        self._set(samples, params._replace(nframes=nframes))
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, framerate: int, nchannels: int = 1,
+                     path: str = "<memory>") -> "WavReader":
+        """A reader over int16 samples already in memory (flat, interleaved)."""
+        reader = cls.__new__(cls)
+        reader.path = path
+        nframes = len(samples) // nchannels
+        reader._set(np.asarray(samples, dtype="<i2")[:nframes * nchannels],
+                    WavParams(nchannels, 2, framerate, nframes, "NONE", "not compressed"))
+        return reader
+
+    def _set(self, samples: np.ndarray, params) -> None:
+        self.params = params
+        self.samples = samples
+        self.frames = samples.reshape(params.nframes, params.nchannels)
+
+    @property
+    def nframes(self) -> int:
+        return self.params.nframes
+
+    @property
+    def nchannels(self) -> int:
+        return self.params.nchannels
+
+    @property
+    def framerate(self) -> int:
+        return self.params.framerate
+
+    def mono(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        int16 mono frames [start, stop): the channel itself for mono files,
+        otherwise the channel mean truncated to int16.
+        """
+        block = self.frames[start:stop]
+        if self.nchannels == 1:
+            return block[:, 0]
+        return block.mean(axis=1).astype(np.int16)
+
+    def close(self) -> None:
+        # The map is released once no block sliced from it is referenced
+        self.samples = self.frames = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WavWriter:
+    """Write a WAV file block by block; sizes are patched in on close()."""
+
+    def __init__(self, path: str, params, nchannels: Optional[int] = None):
+        self.path = path
+        self._wav = wave.open(path, "wb")
+        if nchannels is not None:
+            params = params._replace(nchannels=nchannels)
+        self._wav.setparams(params)
+
+    def write(self, samples: np.ndarray) -> None:
+        """Append int16 samples (flat and interleaved, or (frames, channels))."""
+        self._wav.writeframesraw(np.ascontiguousarray(samples, dtype="<i2").tobytes())
+
+    def close(self) -> None:
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_chunks(total: int, chunk: int = CHUNK_FRAMES) -> Iterator[Tuple[int, int]]:
+    """(start, stop) of consecutive ranges of at most `chunk` covering [0, total)."""
+    for start in range(0, total, chunk):
+        yield start, min(start + chunk, total)
+
+
+def stft_chunks(n_frames: int, n_fft: int, hop: int,
+                chunk_frames: int = STFT_CHUNK_FRAMES) -> Iterator[Tuple[int, int, int]]:
+    """
+    Split STFT frames 0..n_frames-1 for a chunked overlap-add.
+
+    Yields (first, start, stop): computing frames [first, stop) -- the chunk
+    plus the frames before it that still overlap it -- and overlap-adding
+    them in order gives output samples [start * hop, stop * hop) exactly as
+    a whole-signal ISTFT would (the last chunk runs on to the end of its
+    last frame).
+    """
+    context = -(-n_fft // hop) - 1
+    for start, stop in iter_chunks(n_frames, chunk_frames):
+        yield max(0, start - context), start, stop
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Blind detector for the visible watermark markers (layouts in wm_marker.py).
+
+Given a leaked video or photo and no idea which buyer it came from:
+
+1. Sample one frame per watermark epoch.  Marker positions only change every
+   wm_duration frames, so the frames in between are skipped with grab()
+   (demuxed and decoded, but never converted into BGR images).  The two
+   frames either side of each epoch start are read as well: the content
+   barely changes between them while the markers move, so subtracting the
+   earlier one (scaled by 1 - EPOCH_DIFF_ALPHA) leaves the new markers with
+   the image mostly cancelled out.  At low alpha on textured content that
+   difference decodes where the frame itself doesn't.
+2. For every candidate cell size, box-filter the grayscale frame once so each
+   cell mean is a single lookup, then score positions by how far the finder's
+   white cells stand above its black cells (min white - max black).  Shifted,
+   strided views of the box-filtered plane score the whole frame at once,
+   which is multi-scale template matching on the finder pattern without a
+   per-template correlation.
+3. Read all 25 cell means at each peak and threshold the 16 bit cells
+   halfway between the finder's white and black levels.  Decodes whose bits
+   don't clearly separate are dropped; of the rest, the ones whose 25 cells
+   best fit the two-level marker they decode to win where they overlap.
+4. Vote the IDs across sampled frames: a real marker decodes to the same ID
+   epoch after epoch at a new position each time, while false positives
+   scatter over IDs or keep turning up at the same spot of a static scene.
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from wm_marker import (
+    P2_BIT_CELLS, P2_FINDER_BLACK, P2_FINDER_WHITE,
+    V2_BIT_CELLS, V2_FINDER_BLACK, V2_FINDER_WHITE,
+)
+
+# layout -> (white finder cells, black finder cells, bit cells in MSB-first order)
+LAYOUTS: Dict[str, Tuple[Tuple[Tuple[int, int], ...], ...]] = {
+    "v2": (V2_FINDER_WHITE, V2_FINDER_BLACK, V2_BIT_CELLS),
+    "p2": (P2_FINDER_WHITE, P2_FINDER_BLACK, P2_BIT_CELLS),
+}
+
+# Cell sizes tried by default. Video markers use int(8 * wm_scale) px cells
+# (wm_scale 0.5 - 4); photo_pro markers scale with the image, so photos get
+# a wider range.
+VIDEO_CELLS = tuple(range(4, 33))
+IMAGE_CELLS = tuple(range(3, 97))
+
+# Finder contrast (gray levels) a candidate needs; alpha=0.15 on flat content
+# gives ~38
+DEFAULT_MIN_CONTRAST = 10.0
+# Minimum distance of every bit cell from the threshold, as a fraction of half
+# the finder contrast
+DEFAULT_MIN_MARGIN = 0.25
+# Peaks examined per cell size per frame
+DEFAULT_MAX_CANDIDATES = 48
+# Decodes need at least this many 1 bits and 0 bits
+MIN_BIT_BALANCE = 2
+# Cell-mean spread (gray levels) the template fit assumes even on flat
+# content, so a perfectly clean marker doesn't score infinitely high
+FIT_NOISE_FLOOR = 2.0
+# A marker blended at alpha turns the image I under it into (1 - alpha) * I
+# + alpha * marker, so next - (1 - EPOCH_DIFF_ALPHA) * previous is exactly
+# the marker there when the two match (the default wm_alpha), and keeps only
+# |alpha - EPOCH_DIFF_ALPHA| of the image otherwise
+EPOCH_DIFF_ALPHA = 0.15
+
+
+@dataclass
+class MarkerHit:
+    layout: str
+    wm_id: int
+    x: int          # marker top-left
+    y: int
+    cell: int
+    contrast: float  # finder min white - max black, gray levels
+    margin: float    # weakest bit's distance from the threshold (0..1+)
+    fit: float       # white/black level gap over the spread of all 25 cells
+    frame_idx: int = 0
+
+
+def _cell_means(gray: np.ndarray, cell: int) -> np.ndarray:
+    """
+    means[y, x] = mean of the cell whose top-left pixel is (x, y).  Cells are
+    inset by a pixel once they are big enough, so the marker's 1-px border and
+    blur at cell edges don't bleed into the means.
+    """
+    inset = 1 if cell >= 4 else 0
+    k = cell - 2 * inset
+    means = cv2.boxFilter(gray, cv2.CV_32F, (k, k), anchor=(0, 0),
+                          normalize=True, borderType=cv2.BORDER_REPLICATE)
+    return means[inset:, inset:]
+
+
+def _finder_score(means: np.ndarray, cell: int, out_h: int, out_w: int, stride: int,
+                  white: Sequence[Tuple[int, int]],
+                  black: Sequence[Tuple[int, int]]) -> np.ndarray:
+    """
+    min(white cells) - max(black cells) for marker top-left positions on a
+    `stride` grid: score[j, i] is the position (i * stride, j * stride).
+    """
+    def plane(r: int, c: int) -> np.ndarray:
+        return means[r * cell:r * cell + out_h:stride, c * cell:c * cell + out_w:stride]
+
+    lo = plane(*white[0]).copy()
+    for rc in white[1:]:
+        np.minimum(lo, plane(*rc), out=lo)
+    hi = plane(*black[0]).copy()
+    for rc in black[1:]:
+        np.maximum(hi, plane(*rc), out=hi)
+    lo -= hi
+    return lo
+
+
+def _local_peaks(score: np.ndarray, min_score: float, radius: int,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(xs, ys) of up to k local maxima of score above min_score, strongest first."""
+    size = 2 * radius + 1
+    dilated = cv2.dilate(score, np.ones((size, size), np.uint8))
+    ys, xs = np.nonzero((score >= dilated) & (score > min_score))
+    if ys.size > k:
+        keep = np.argpartition(score[ys, xs], -k)[-k:]
+        ys, xs = ys[keep], xs[keep]
+    return xs, ys
+
+
+def _cell_values(means: np.ndarray, cell: int, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """(N, 5, 5) cell means of the markers with top-lefts (xs, ys)."""
+    offsets = np.arange(5) * cell
+    return means[ys[:, None, None] + offsets[None, :, None],
+                 xs[:, None, None] + offsets[None, None, :]]
+
+
+def _levels(values: np.ndarray, layout: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(score, white level, black level) of each (N, 5, 5) candidate."""
+    white, black, _ = LAYOUTS[layout]
+    w = values[:, [r for r, _ in white], [c for _, c in white]]
+    b = values[:, [r for r, _ in black], [c for _, c in black]]
+    return w.min(axis=1) - b.max(axis=1), w.mean(axis=1), b.mean(axis=1)
+
+
+def _decode(values: np.ndarray, layout: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (wm_ids, margins, bits) of (N, 5, 5) candidates, bits as (N, 16) bools.
+    Bits are split halfway between the finder's white and black levels; the
+    margin is the weakest bit's distance from that threshold over half the
+    finder contrast.
+    """
+    _, white_level, black_level = _levels(values, layout)
+    bit_cells = LAYOUTS[layout][2]
+    bits = values[:, [r for r, _ in bit_cells], [c for _, c in bit_cells]]
+    threshold = ((white_level + black_level) / 2)[:, None]
+    half = np.maximum((white_level - black_level) / 2, 1e-6)[:, None]
+
+    ones = bits > threshold
+    weights = 1 << np.arange(len(bit_cells) - 1, -1, -1)
+    wm_ids = (ones * weights).sum(axis=1)
+    margins = (np.abs(bits - threshold) / half).min(axis=1)
+    return wm_ids, margins, ones
+
+
+def _template_fit(values: np.ndarray, layout: str, ones: np.ndarray) -> np.ndarray:
+    """
+    How well each (N, 5, 5) candidate matches the whole marker it decodes to:
+    the gap between its white and black cells' mean levels over the spread of
+    all 25 cells around those two levels.  A real marker is two-level in
+    every cell; an alignment shifted onto a marker's own white bits (whose
+    finder can out-contrast the real one) or onto textured content has bit
+    cells scattered between the levels.
+    """
+    white, _, bit_cells = LAYOUTS[layout]
+    flat = values.reshape(len(values), 25)
+    is_white = np.zeros(flat.shape, dtype=bool)
+    is_white[:, [r * 5 + c for r, c in white]] = True
+    is_white[:, [r * 5 + c for r, c in bit_cells]] = ones
+    n_white = is_white.sum(axis=1)
+    white_level = np.where(is_white, flat, 0).sum(axis=1) / n_white
+    black_level = np.where(is_white, 0, flat).sum(axis=1) / (25 - n_white)
+    resid = flat - np.where(is_white, white_level[:, None], black_level[:, None])
+    spread = np.sqrt((resid * resid).sum(axis=1) / 23)
+    return (white_level - black_level) / (spread + FIT_NOISE_FLOOR)
+
+
+def _finder_on_bits(hit: MarkerHit, other: MarkerHit) -> bool:
+    """Whether hit's white finder cells sit on bit cells of other's marker."""
+    _, _, bit_cells = LAYOUTS[other.layout]
+    for r, c in LAYOUTS[hit.layout][0]:
+        # Centre of the finder cell, in other's cell grid
+        row = (hit.y + (r + 0.5) * hit.cell - other.y) / other.cell
+        col = (hit.x + (c + 0.5) * hit.cell - other.x) / other.cell
+        if 0 <= row < 5 and 0 <= col < 5 and (int(row), int(col)) in bit_cells:
+            return True
+    return False
+
+
+def detect_markers(frame: np.ndarray,
+                   cells: Iterable[int] = VIDEO_CELLS,
+                   layouts: Sequence[str] = ("v2", "p2"),
+                   min_contrast: float = DEFAULT_MIN_CONTRAST,
+                   min_margin: float = DEFAULT_MIN_MARGIN,
+                   max_candidates: int = DEFAULT_MAX_CANDIDATES,
+                   frame_idx: int = 0) -> List[MarkerHit]:
+    """
+    Find and decode markers in one BGR or grayscale frame (or a float32
+    difference of two grayscale frames, see sample_epoch_images).
+
+    Each cell size is scored on a grid strided by a quarter cell (the finder
+    score is flat over a pixel or two either way, so no peak is missed); the
+    peaks are then refined to the exact pixel around their grid point before
+    decoding.  Peaks only suppress each other within half a cell: a marker's
+    white bits make finder-like peaks a cell or two off its true position,
+    often with more finder contrast, and those are told apart by the full
+    template fit afterwards.  IDs whose 16 bits are all but uniform (fewer
+    than MIN_BIT_BALANCE ones or zeros, e.g. 0 and 65535) are dropped: a
+    bright or dark blob in the image decodes to exactly those.
+    """
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+
+    candidates: List[MarkerHit] = []
+    for cell in cells:
+        size = 5 * cell
+        if size > h or size > w:
+            break
+        means = _cell_means(gray, cell)
+        out_h = min(h - size + 1, means.shape[0] - 4 * cell)
+        out_w = min(w - size + 1, means.shape[1] - 4 * cell)
+        stride = max(1, cell // 4)
+
+        for layout in layouts:
+            white, black, bit_cells = LAYOUTS[layout]
+            score = _finder_score(means, cell, out_h, out_w, stride, white, black)
+            gx, gy = _local_peaks(score, min_contrast, max(1, cell // (2 * stride)),
+                                  max_candidates)
+            if gx.size == 0:
+                continue
+
+            # Refine each grid peak over the stride x stride neighbourhood
+            d = np.arange(-(stride - 1), stride)
+            dy, dx = np.meshgrid(d, d, indexing="ij")
+            xs = np.clip(gx[:, None] * stride + dx.ravel()[None, :], 0, out_w - 1)
+            ys = np.clip(gy[:, None] * stride + dy.ravel()[None, :], 0, out_h - 1)
+            values = _cell_values(means, cell, xs.ravel(), ys.ravel())
+            refined, _, _ = _levels(values, layout)
+            best = refined.reshape(xs.shape).argmax(axis=1)
+            rows = np.arange(xs.shape[0])
+            xs, ys = xs[rows, best], ys[rows, best]
+            contrast = refined.reshape(xs.shape[0], -1)[rows, best]
+
+            values = values.reshape(xs.shape[0], -1, 5, 5)[rows, best]
+            wm_ids, margins, ones = _decode(values, layout)
+            fit = _template_fit(values, layout, ones)
+            n_ones = ones.sum(axis=1)
+            n_bits = len(bit_cells)
+            keep = ((margins >= min_margin) & (contrast > min_contrast) &
+                    (n_ones >= MIN_BIT_BALANCE) & (n_ones <= n_bits - MIN_BIT_BALANCE))
+            for i in np.flatnonzero(keep):
+                candidates.append(MarkerHit(layout, int(wm_ids[i]), int(xs[i]), int(ys[i]),
+                                            cell, round(float(contrast[i]), 2),
+                                            round(float(margins[i]), 3),
+                                            round(float(fit[i]), 2), frame_idx))
+
+    # Non-maximum suppression across cell sizes, by template fit: the best
+    # fitting decode wins wherever marker boxes overlap, and no alignment
+    # whose white finder cell lands on a bit cell of a better fitting one is
+    # kept, whatever its layout.  Otherwise layouts are kept apart because a
+    # p2 marker with bits (1,1) and (1,3) clear is also a valid v2 marker;
+    # both readings are reported and left to the vote.
+    candidates.sort(key=lambda hit: hit.fit, reverse=True)
+    hits: List[MarkerHit] = []
+    for cand in candidates:
+        size = 5 * cand.cell
+        if any((cand.layout == h2.layout and
+                cand.x < h2.x + 5 * h2.cell and h2.x < cand.x + size and
+                cand.y < h2.y + 5 * h2.cell and h2.y < cand.y + size) or
+               _finder_on_bits(cand, h2) for h2 in hits):
+            continue
+        hits.append(cand)
+    return hits
+
+
+def _distinct_positions(hits: Sequence[MarkerHit]) -> int:
+    """
+    Number of separate places (more than half a marker apart) hits of the
+    most common cell size (+-1) were found at.  A video's markers all share one
+    size, while an edge that happens to decode keeps matching at many scales.
+    """
+    cells = [hit.cell for hit in hits]
+    modal = max(set(cells), key=lambda c: sum(abs(c - o) <= 1 for o in cells))
+    places: List[MarkerHit] = []
+    for hit in hits:
+        if abs(hit.cell - modal) > 1:
+            continue
+        half = 5 * hit.cell // 2
+        if not any(abs(hit.x - p.x) <= half and abs(hit.y - p.y) <= half for p in places):
+            places.append(hit)
+    return len(places)
+
+
+def vote_ids(hits: Sequence[MarkerHit]) -> List[Dict[str, Any]]:
+    """
+    Rank (layout, wm_id) pairs.  Markers move every epoch while image content
+    mostly stays put, so an ID found at many different positions (of one
+    marker size, see _distinct_positions) is ranked above one found
+    repeatedly at the same spot; ties go to more sampled frames, then to the
+    better template fit.
+    """
+    groups: Dict[Tuple[str, int], List[MarkerHit]] = defaultdict(list)
+    for hit in hits:
+        groups[(hit.layout, hit.wm_id)].append(hit)
+
+    ranked = []
+    for (layout, wm_id), group in groups.items():
+        ranked.append({
+            "wm_id": wm_id,
+            "layout": layout,
+            "positions": _distinct_positions(group),
+            "frames": len({h.frame_idx for h in group}),
+            "markers": len(group),
+            "mean_margin": round(float(np.mean([min(h.margin, 1.0) for h in group])), 3),
+            "mean_contrast": round(float(np.mean([h.contrast for h in group])), 1),
+            "mean_fit": round(float(np.mean([h.fit for h in group])), 2),
+            "cells": sorted({h.cell for h in group}),
+        })
+    ranked.sort(key=lambda r: (r["positions"], r["frames"], r["mean_fit"]), reverse=True)
+    return ranked
+
+
+def sample_epoch_frames(cap: cv2.VideoCapture, wm_duration: int = 30,
+                        epoch_stride: int = 1, max_epochs: Optional[int] = None
+                        ) -> Iterable[Tuple[int, np.ndarray]]:
+    """
+    Yield (frame_idx, frame) for the middle frame of every epoch_stride-th
+    epoch, grab()bing past everything else.
+    """
+    period = max(1, wm_duration) * max(1, epoch_stride)
+    offset = max(1, wm_duration) // 2
+    frame_idx = 0
+    sampled = 0
+    while max_epochs is None or sampled < max_epochs:
+        target = sampled * period + offset
+        while frame_idx < target:
+            if not cap.grab():
+                return
+            frame_idx += 1
+        ok, frame = cap.read()
+        if not ok or frame is None:
+            return
+        yield frame_idx, frame
+        frame_idx += 1
+        sampled += 1
+
+
+def sample_epoch_images(cap: cv2.VideoCapture, wm_duration: int = 30,
+                        epoch_stride: int = 1, max_epochs: Optional[int] = None
+                        ) -> Iterable[Tuple[int, np.ndarray]]:
+    """
+    Like sample_epoch_frames, but for every sampled epoch after the first also
+    yield (start_idx, diff) first: the float32 grayscale difference of the
+    epoch's first frame and (1 - EPOCH_DIFF_ALPHA) times the frame before it.
+    """
+    period = max(1, wm_duration) * max(1, epoch_stride)
+    offset = max(1, wm_duration) // 2
+    frame_idx = 0
+    sampled = 0
+    while max_epochs is None or sampled < max_epochs:
+        start = sampled * period
+        if start > 0:
+            while frame_idx < start - 1:
+                if not cap.grab():
+                    return
+                frame_idx += 1
+            ok_prev, prev = cap.read()
+            ok, first = cap.read()
+            if not ok_prev or not ok:
+                return
+            frame_idx += 2
+            diff = cv2.addWeighted(cv2.cvtColor(first, cv2.COLOR_BGR2GRAY), 1.0,
+                                   cv2.cvtColor(prev, cv2.COLOR_BGR2GRAY),
+                                   EPOCH_DIFF_ALPHA - 1.0, 0.0, dtype=cv2.CV_32F)
+            yield start, diff
+        while frame_idx < start + offset:
+            if not cap.grab():
+                return
+            frame_idx += 1
+        ok, frame = cap.read()
+        if not ok or frame is None:
+            return
+        yield frame_idx, frame
+        frame_idx += 1
+        sampled += 1
+
+
+def detect_video(input_path: str,
+                 wm_duration: int = 30,
+                 epoch_stride: int = 1,
+                 max_epochs: Optional[int] = None,
+                 cells: Iterable[int] = VIDEO_CELLS,
+                 layouts: Sequence[str] = ("v2",),
+                 min_contrast: float = DEFAULT_MIN_CONTRAST,
+                 min_margin: float = DEFAULT_MIN_MARGIN,
+                 max_candidates: int = DEFAULT_MAX_CANDIDATES,
+                 epoch_diffs: bool = True,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Blind marker detection over a video: one sampled frame per epoch, plus
+    the difference across each epoch start unless epoch_diffs is False.
+
+    wm_duration is the marker hold time used when watermarking (frames); a
+    wrong guess still samples every epoch as long as it is not larger than the
+    real one (the differences only help when the epochs start at multiples of
+    it, as they do in an untrimmed leak).  Returns {"ids": ranked votes,
+    "hits": per-marker hits, ...}.
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {input_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cells = tuple(cells)
+
+    t0 = time.perf_counter()
+    sampler = sample_epoch_images if epoch_diffs else sample_epoch_frames
+    hits: List[MarkerHit] = []
+    sampled = 0
+    try:
+        for frame_idx, frame in sampler(cap, wm_duration, epoch_stride, max_epochs):
+            hits += detect_markers(frame, cells, layouts, min_contrast, min_margin,
+                                   max_candidates, frame_idx)
+            sampled += 1
+            if progress is not None:
+                progress(frame_idx + 1, total_frames)
+    finally:
+        cap.release()
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "input": input_path,
+        "ids": vote_ids(hits),
+        "hits": [asdict(h) for h in hits],
+        "frames_total": total_frames,
+        "frames_sampled": sampled,
+        "video_seconds": round(total_frames / fps, 2) if total_frames > 0 else None,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def detect_image(input_path: str,
+                 cells: Iterable[int] = IMAGE_CELLS,
+                 layouts: Sequence[str] = ("v2", "p2"),
+                 min_contrast: float = DEFAULT_MIN_CONTRAST,
+                 min_margin: float = DEFAULT_MIN_MARGIN,
+                 max_candidates: int = DEFAULT_MAX_CANDIDATES) -> Dict[str, Any]:
+    """Blind marker detection on a single photo."""
+    image = cv2.imread(input_path)
+    if image is None:
+        raise FileNotFoundError(f"Could not read image: {input_path}")
+    t0 = time.perf_counter()
+    hits = detect_markers(image, cells, layouts, min_contrast, min_margin, max_candidates)
+    return {
+        "input": input_path,
+        "ids": vote_ids(hits),
+        "hits": [asdict(h) for h in hits],
+        "elapsed_s": round(time.perf_counter() - t0, 2),
+    }
+
+
+def _parse_cells(text: Optional[str]) -> Optional[Tuple[int, ...]]:
+    """'4-32' or '8,12,16' -> tuple of cell sizes."""
+    if not text:
+        return None
+    if "-" in text:
+        lo, hi = text.split("-", 1)
+        return tuple(range(int(lo), int(hi) + 1))
+    return tuple(int(c) for c in text.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find and decode visible watermark markers in a leaked video or photo.")
+    parser.add_argument("input", help="Video or image file")
+    parser.add_argument("--image", action="store_true",
+                        help="Treat input as a photo (default: guess from the extension)")
+    parser.add_argument("--duration", type=int, default=30,
+                        help="Frames each marker position was held (wm_duration, default 30)")
+    parser.add_argument("--epoch-stride", type=int, default=1,
+                        help="Sample every Nth epoch (default 1)")
+    parser.add_argument("--max-epochs", type=int, default=None,
+                        help="Stop after this many sampled frames")
+    parser.add_argument("--no-epoch-diffs", action="store_true",
+                        help="Only decode the sampled frames, not the differences across epoch starts "
+                             "(for leaks trimmed so epochs no longer start at multiples of --duration)")
+    parser.add_argument("--cells", default=None,
+                        help="Cell sizes to try, e.g. '4-32' or '8,16' (default: 4-32 video, 3-96 photo)")
+    parser.add_argument("--layouts", default=None,
+                        help="Comma-separated marker layouts: v2, p2 (default: v2 video, v2,p2 photo)")
+    parser.add_argument("--min-contrast", type=float, default=DEFAULT_MIN_CONTRAST,
+                        help=f"Minimum finder contrast in gray levels (default {DEFAULT_MIN_CONTRAST})")
+    parser.add_argument("--min-margin", type=float, default=DEFAULT_MIN_MARGIN,
+                        help=f"Minimum bit separation, 0-1 (default {DEFAULT_MIN_MARGIN})")
+    parser.add_argument("--top", type=int, default=5, help="IDs to print (default 5)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the full result as JSON")
+    args = parser.parse_args()
+
+    is_image = args.image or args.input.lower().endswith(
+        (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff"))
+    cells = _parse_cells(args.cells)
+    layouts = tuple(args.layouts.split(",")) if args.layouts else None
+    for layout in layouts or ():
+        if layout not in LAYOUTS:
+            parser.error(f"unknown layout {layout!r}; choose from {sorted(LAYOUTS)}")
+
+    try:
+        if is_image:
+            result = detect_image(args.input, cells or IMAGE_CELLS, layouts or ("v2", "p2"),
+                                  args.min_contrast, args.min_margin)
+        else:
+            result = detect_video(args.input, args.duration, args.epoch_stride, args.max_epochs,
+                                  cells or VIDEO_CELLS, layouts or ("v2",),
+                                  args.min_contrast, args.min_margin,
+                                  epoch_diffs=not args.no_epoch_diffs)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not is_image:
+        print(f"Sampled {result['frames_sampled']} of {result['frames_total']} frames "
+              f"in {result['elapsed_s']:.2f}s")
+    print(f"{len(result['hits'])} marker hit(s)")
+    for rank, vote in enumerate(result["ids"][:args.top], 1):
+        print(f"  #{rank}  wm_id={vote['wm_id']:5d}  layout={vote['layout']}  "
+              f"positions={vote['positions']}  frames={vote['frames']}  "
+              f"margin={vote['mean_margin']:.2f}  fit={vote['mean_fit']:.2f}  cells={vote['cells']}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Cached marker sprites and integer ROI blending for the visible watermark
+overlays in the scramble_* modules.
+
+A marker depends only on its bits and cell size, so each sprite is built once
+per (bits, cell) instead of cell by cell for every marker on every frame.
+Blending touches only the marker's ROI: blend_table(alpha)[color, v] holds
+uint8(v * (1 - alpha) + SPRITE_COLORS[color] * alpha) for every ROI value v,
+evaluated once per alpha with the float32 expression the overlays used to run
+per pixel, so the blended pixels are bit-identical and each frame only does a
+table lookup.  Sprites store color * 256, the row offset into the flattened
+table, so the lookup is one add and one np.take.
+"""
+from functools import lru_cache
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Sprite palette: black, the 1-px gray border, white
+SPRITE_COLORS = (0, 128, 255)
+_BLACK, _GRAY, _WHITE = 0, 1, 2
+
+# Marker layouts, as (row, col) cells of the 5x5 grid.
+#
+# v2 (watermark-encoder-v2.html; apply_watermark in the scramble_video* and
+# scramble_photo* modules): the inner 3x3 is the finder, a black ring around a
+# white centre, and the 16 ID bits fill the outer ring row-major, MSB first.
+V2_FINDER_BLACK = tuple((r, c) for r in range(1, 4) for c in range(1, 4) if (r, c) != (2, 2))
+V2_FINDER_WHITE = ((2, 2),)
+V2_BIT_CELLS = tuple((r, c) for r in range(5) for c in range(5)
+                     if not (1 <= r <= 3 and 1 <= c <= 3))
+
+# p2 (apply_watermark_p2 in scramble_photo_pro.py): P2_GRID with the 16 ID
+# bits, MSB first, written over the P2_BIT_CELLS; 1 = white
+P2_GRID = (
+    (1, 1, 1, 1, 1),
+    (1, 0, 0, 0, 1),
+    (1, 0, 1, 0, 1),
+    (1, 0, 0, 0, 1),
+    (1, 1, 1, 1, 1),
+)
+P2_BIT_CELLS = ((0, 1), (0, 2), (0, 3), (1, 0), (2, 0), (3, 0), (4, 0), (4, 1),
+                (4, 2), (4, 3), (3, 4), (2, 4), (1, 4), (0, 4), (1, 3), (1, 1))
+P2_FINDER_BLACK = tuple((r, c) for r in range(5) for c in range(5)
+                        if (r, c) not in P2_BIT_CELLS and not P2_GRID[r][c])
+P2_FINDER_WHITE = tuple((r, c) for r in range(5) for c in range(5)
+                        if (r, c) not in P2_BIT_CELLS and P2_GRID[r][c])
+
+
+def _to_offsets(palette_idx: np.ndarray) -> np.ndarray:
+    """Palette indices -> read-only uint16 blend_table row offsets."""
+    sprite = palette_idx.astype(np.uint16) * 256
+    sprite.flags.writeable = False
+    return sprite
+
+
+@lru_cache(maxsize=256)
+def marker_sprite(bits: Tuple[int, ...], cell: int) -> np.ndarray:
+    """
+    The 5x5 binary-grid marker drawn by drawMarker() in watermark-encoder-v2.html
+    as a (5*cell, 5*cell) sprite: the 3x3 finder in the middle, the 16 bits
+    MSB-first row-major around it (1 = white, missing bits black) and a 1-px
+    gray border.
+    """
+    grid = np.full((5, 5), _BLACK, dtype=np.uint8)
+    for row, col in V2_FINDER_WHITE:
+        grid[row, col] = _WHITE
+    for bit_idx, (row, col) in enumerate(V2_BIT_CELLS):
+        if bit_idx < len(bits) and bits[bit_idx]:
+            grid[row, col] = _WHITE
+
+    sprite = np.repeat(np.repeat(grid, cell, axis=0), cell, axis=1)
+    sprite[[0, -1], :] = _GRAY
+    sprite[:, [0, -1]] = _GRAY
+    return _to_offsets(sprite)
+
+
+@lru_cache(maxsize=256)
+def grid_sprite(grid: Tuple[Tuple[int, ...], ...], cell: int) -> np.ndarray:
+    """A borderless sprite of 0/1 (black/white) cells, cell px each."""
+    cells = np.where(np.array(grid, dtype=np.uint8) == 1, _WHITE, _BLACK).astype(np.uint8)
+    return _to_offsets(np.repeat(np.repeat(cells, cell, axis=0), cell, axis=1))
+
+
+@lru_cache(maxsize=64)
+def blend_table(alpha: float) -> np.ndarray:
+    """(len(SPRITE_COLORS), 256) uint8 table of v * (1 - alpha) + color * alpha."""
+    roi = np.arange(256, dtype=np.float32)
+    colors = np.array(SPRITE_COLORS, dtype=np.float32)[:, None]
+    table = (roi * (1.0 - alpha) + colors * alpha).astype(np.uint8)
+    table.flags.writeable = False
+    return table
+
+
+def blend_sprite(frame: np.ndarray, sprite: np.ndarray, x: int, y: int,
+                 alpha: float) -> None:
+    """Alpha-blend `sprite` onto `frame` in place with its top-left at (x, y),
+    clipped to the frame."""
+    frame_h, frame_w = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1 = min(x + sprite.shape[1], frame_w)
+    y1 = min(y + sprite.shape[0], frame_h)
+    if x1 <= x0 or y1 <= y0:
+        return
+
+    roi = frame[y0:y1, x0:x1]
+    offsets = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+    if roi.ndim == 3:
+        offsets = offsets[:, :, None]
+    np.take(blend_table(float(alpha)).ravel(), offsets + roi, out=roi)
+
+
+def bits_key(binary_data: Sequence[int]) -> Tuple[int, ...]:
+    """Hashable form of a marker's bit list for the sprite caches."""
+    return tuple(int(b) for b in binary_data)
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Warm worker-process pool for the Flask routes.
+
+Instead of spawning `python3 scramble_*.py ...` for every request (interpreter
+startup + cv2/numpy/scipy imports each time, and the result scraped from
+stdout), the routes submit tasks to a pool of long-lived worker processes that
+have already imported the media modules.  Tasks call process_photo /
+process_video / AudioSteganography directly with keyword arguments and return
+a plain dict.
+
+The task functions below mirror the dispatch the scripts' main() functions do
+(percentage vs. full processing, odd blur kernel sizes, ...), so a route gets
+the same output it got from the CLI.
+
+Tasks submitted with submit_job() also report progress: tasks that take a
+`progress` argument get a callback that posts (frames_done, total_frames) to
+the pool's event queue and raises JobCancelled once cancel_job() was called.
+jobs.py turns those events into pollable job records.
+"""
+import importlib
+import inspect
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from config import WORKER_PROCESSES
+
+# Minimum seconds between progress events (and cancel checks) per job
+PROGRESS_INTERVAL_S = 0.5
+
+# How often run() checks on a task with a timeout, and how long past the
+# timeout a task that ignores its in-worker time limit may run before its
+# worker is killed
+WATCHDOG_INTERVAL_S = 1.0
+KILL_GRACE_S = 10.0
+
+# What a Manager dict proxy raises once shutdown() has stopped its manager
+_MANAGER_GONE = (OSError, EOFError)
+
+# Imported once per worker at startup so requests don't pay for them
+_WARM_MODULES = (
+    "numpy", "cv2",
+    "scramble_photo", "scramble_photo_pro",
+    "scramble_video", "scramble_video_pro", "unscramble_cache",
+    "audio_stegano",
+)
+
+
+class WorkerTaskError(RuntimeError):
+    """A task raised inside a worker; carries the original type and traceback."""
+
+    def __init__(self, exc_type: str, message: str, details: str = ""):
+        super().__init__(exc_type, message, details)
+        self.exc_type = exc_type
+        self.message = message
+        self.details = details
+
+    def __str__(self) -> str:
+        return f"{self.exc_type}: {self.message}"
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker by the progress callback of a cancelled job."""
+
+
+class TaskTimeout(BaseException):
+    """
+    Raised inside a worker when a run() task exceeds its time limit.
+    A BaseException, so tasks' own `except Exception` blocks don't swallow it.
+    """
+
+
+# Set in each worker by _init_worker
+_events = None
+_cancelled = None
+_started = None
+# Job id of the task running in this worker (None for plain submit())
+_current_job: Optional[str] = None
+
+
+def _init_worker(events=None, cancelled=None, started=None) -> None:
+    global _events, _cancelled, _started
+    _events, _cancelled, _started = events, cancelled, started
+    for name in _WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"⚠️  Worker {os.getpid()}: could not preload {name}: {e}")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _on_time_limit(signum, frame) -> None:
+    raise TaskTimeout()
+
+
+def _call(fn: Callable[..., Dict[str, Any]], kwargs: Dict[str, Any],
+          time_limit: Optional[float] = None, token: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run a task in the worker, timing it and wrapping any error.
+
+    With a time_limit the task is interrupted (SIGALRM) once it has run that
+    many seconds; `token` records (pid, start time) in the pool's started
+    dict so run() can tell queued tasks from running ones.
+    """
+    t0 = time.perf_counter()
+    if token is not None and _started is not None:
+        _started[token] = (os.getpid(), time.time())
+    alarm = time_limit is not None and hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, _on_time_limit)
+        signal.setitimer(signal.ITIMER_REAL, max(time_limit, 0.001))
+    try:
+        try:
+            result = fn(**kwargs)
+        finally:
+            if alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except TaskTimeout:
+        raise WorkerTaskError("TaskTimeout",
+                              f"task did not finish within {time_limit:g}s") from None
+    except Exception as e:
+        raise WorkerTaskError(type(e).__name__, str(e), traceback.format_exc()) from None
+    result["elapsed_s"] = time.perf_counter() - t0
+    result["pid"] = os.getpid()
+    return result
+
+
+def _report_stage(stage: str) -> None:
+    """Tell the job API which step a job is in (no-op outside submit_job)."""
+    if _events is not None and _current_job is not None:
+        _events.put(("stage", _current_job, stage))
+
+
+def _call_job(job_id: str, fn: Callable[..., Dict[str, Any]],
+              kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Like _call, but posts job events and wires up progress / cancellation."""
+    global _current_job
+    t_start = time.perf_counter()
+    last_post = [0.0]
+
+    def post(*event) -> None:
+        if _events is not None:
+            _events.put((event[0], job_id) + event[1:])
+
+    def progress(frames_done: int, total_frames: int) -> None:
+        now = time.perf_counter()
+        if now - last_post[0] < PROGRESS_INTERVAL_S and frames_done != total_frames:
+            return
+        last_post[0] = now
+        if _cancelled is not None and _cancelled.get(job_id):
+            raise JobCancelled(f"job {job_id} was cancelled")
+        post("progress", frames_done, total_frames, now - t_start)
+
+    if _cancelled is not None and _cancelled.get(job_id):
+        raise WorkerTaskError("JobCancelled", f"job {job_id} was cancelled")
+    post("started", os.getpid())
+    if "progress" in inspect.signature(fn).parameters:
+        kwargs = dict(kwargs, progress=progress)
+    _current_job = job_id
+    try:
+        return _call(fn, kwargs)
+    finally:
+        _current_job = None
+
+
+def _odd_ksize(blur_ksize: int) -> int:
+    if blur_ksize < 1:
+        raise ValueError("blur_ksize must be a positive odd integer")
+    return blur_ksize + 1 if blur_ksize % 2 == 0 else blur_ksize
+
+
+def _make_webm(output_path: str) -> Optional[str]:
+    """VP9/Opus copy of a finished video next to it (same settings as the routes)."""
+    webm_path = os.path.splitext(output_path)[0] + ".webm"
+    cmd = [
+        "ffmpeg", "-i", output_path,
+        "-c:v", "libvpx-vp9", "-crf", "30", "-b:v", "0",
+        "-c:a", "libopus",
+        "-y", webm_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except OSError as e:
+        print(f"⚠️  WebM conversion error: {e}")
+        return None
+    if result.returncode != 0 or not os.path.exists(webm_path):
+        print(f"⚠️  WebM conversion failed: {result.stderr[:200]}")
+        return None
+    return webm_path
+
+
+# ── Tasks (run inside the workers) ───────────────────────────────────────────
+
+def scramble_photo_task(percentage: int = 100, **kwargs) -> Dict[str, Any]:
+    """scramble_photo.py: percentage < 100 uses process_photo_by_percentage."""
+    import scramble_photo
+    if percentage < 100:
+        params_path = scramble_photo.process_photo_by_percentage(percentage=percentage, **kwargs)
+    else:
+        params_path = scramble_photo.process_photo(**kwargs)
+    return {"output_path": kwargs["output_path"], "params_path": params_path}
+
+
+def scramble_photo_pro_task(blur_ksize: int = 15, **kwargs) -> Dict[str, Any]:
+    """scramble_photo_pro.py (HPF)."""
+    import scramble_photo_pro
+    blur_ksize = _odd_ksize(blur_ksize)
+    params_path = scramble_photo_pro.process_photo(blur_ksize=blur_ksize, **kwargs)
+    return {"output_path": kwargs["output_path"], "params_path": params_path,
+            "blur_ksize": blur_ksize}
+
+
+def scramble_video_task(percentage: Optional[int] = None, webm: bool = False,
+                        progress=None, **kwargs) -> Dict[str, Any]:
+    """
+    scramble_video.py: a percentage in [0, 100) uses process_video_by_percentage.
+    webm=True also writes a VP9 .webm copy next to the output.
+    """
+    import scramble_video
+    if percentage is not None and 0 <= percentage < 100:
+        kwargs.pop("algorithm", None)
+        kwargs.pop("max_hue_shift", None)
+        params_path = scramble_video.process_video_by_percentage(
+            percentage=percentage, progress=progress, **kwargs)
+    else:
+        params_path = scramble_video.process_video(progress=progress, **kwargs)
+    result = {"output_path": kwargs["output_path"], "params_path": params_path}
+    if webm and not kwargs["output_path"].lower().endswith(".webm"):
+        _report_stage("webm")
+        result["webm_path"] = _make_webm(kwargs["output_path"])
+    return result
+
+
+def scramble_video_pro_task(blur_ksize: int = 15, webm: bool = False,
+                            cache: bool = False, progress=None,
+                            **kwargs) -> Dict[str, Any]:
+    """
+    scramble_video_pro.py process_video (spatial / color / HPF).
+    cache=True routes unscrambles through unscramble_cache.py.
+    """
+    import scramble_video_pro
+    blur_ksize = _odd_ksize(blur_ksize)
+    result = {"output_path": kwargs["output_path"], "blur_ksize": blur_ksize}
+    if cache and kwargs.get("mode") == "unscramble":
+        import unscramble_cache
+        kwargs.pop("mode")
+        result["params_path"] = ""
+        result["cache_hit"] = unscramble_cache.unscramble_video_cached(
+            blur_ksize=blur_ksize, progress=progress, **kwargs)
+    else:
+        result["params_path"] = scramble_video_pro.process_video(
+            blur_ksize=blur_ksize, progress=progress, **kwargs)
+    if webm and not kwargs["output_path"].lower().endswith(".webm"):
+        _report_stage("webm")
+        result["webm_path"] = _make_webm(kwargs["output_path"])
+    return result
+
+
+def audio_embed_task(original_path: str, output_path: str, data: str,
+                     seed: int = 42) -> Dict[str, Any]:
+    """audio_stegano.py --mode embed."""
+    from audio_stegano import AudioSteganography
+    AudioSteganography(seed=seed).embed_data(original_path, output_path, data)
+    return {"output_path": output_path}
+
+
+def audio_extract_task(original_path: str, modified_path: str,
+                       seed: int = 42) -> Dict[str, Any]:
+    """audio_stegano.py --mode extract; extracted_data is None if nothing decoded."""
+    from audio_stegano import AudioSteganography
+    extracted = AudioSteganography(seed=seed).extract_data(original_path, modified_path)
+    return {"extracted_data": extracted}
+
+
+# ── Pool ─────────────────────────────────────────────────────────────────────
+
+class WorkerPool:
+    """
+    ProcessPoolExecutor whose workers pre-import the media modules.
+
+    Workers use the "spawn" start method so they never inherit the Flask
+    server's threads or locks.  A worker that dies (e.g. a native crash in
+    OpenCV) breaks the executor; the next call replaces it.
+    """
+
+    def __init__(self, max_workers: int = WORKER_PROCESSES):
+        self.max_workers = max(1, int(max_workers))
+        self._ctx = multiprocessing.get_context("spawn")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Job plumbing, shared by every executor this pool creates
+        self.events = self._ctx.Queue()
+        self._manager = None
+        self._cancelled = None
+        self._started = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                if self._manager is None:
+                    self._manager = self._ctx.Manager()
+                    self._cancelled = self._manager.dict()
+                    self._started = self._manager.dict()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=self._ctx,
+                    initializer=_init_worker,
+                    initargs=(self.events, self._cancelled, self._started),
+                )
+            return self._executor
+
+    def _reset(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _kill_worker(self, executor: ProcessPoolExecutor, pid: int) -> None:
+        """Kill a stuck worker and replace its executor (whose other tasks fail)."""
+        print(f"⚠️  Killing worker {pid}: task overran its timeout")
+        self._reset(executor)
+        try:
+            os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+        except ProcessLookupError:
+            pass
+
+    def warm_up(self, timeout: Optional[float] = 120) -> List[int]:
+        """Start every worker now (instead of on first use); returns their pids."""
+        executor = self._get_executor()
+        # Each submit that finds no idle worker spawns a new one
+        futures = [executor.submit(_ping) for _ in range(self.max_workers)]
+        return sorted({f.result(timeout=timeout) for f in futures})
+
+    def _submit(self, *args) -> Future:
+        executor = self._get_executor()
+        try:
+            return executor.submit(*args)
+        except BrokenProcessPool:
+            self._reset(executor)
+            return self._get_executor().submit(*args)
+
+    def submit(self, fn: Callable[..., Dict[str, Any]], **kwargs) -> Future:
+        """Queue fn(**kwargs) on a worker. fn must be a module-level task."""
+        return self._submit(_call, fn, kwargs)
+
+    def submit_job(self, job_id: str, fn: Callable[..., Dict[str, Any]], **kwargs) -> Future:
+        """Like submit(), but posts ("started" / "progress", job_id, ...) to self.events."""
+        return self._submit(_call_job, job_id, fn, kwargs)
+
+    def cancel_job(self, job_id: str) -> None:
+        """Ask a running job to stop at its next progress callback."""
+        self._get_executor()
+        self._cancelled[job_id] = True
+
+    def forget_job(self, job_id: str) -> None:
+        """Drop a finished job's cancel flag (a no-op after shutdown())."""
+        self._discard(self._cancelled, job_id)
+
+    @staticmethod
+    def _discard(shared: Optional[Dict], key: str) -> None:
+        """shared.pop(key) on a Manager dict that may be gone (jobs can outlive shutdown())."""
+        if shared is None:
+            return
+        try:
+            shared.pop(key, None)
+        except _MANAGER_GONE:
+            pass
+
+    def run(self, fn: Callable[..., Dict[str, Any]], timeout: Optional[float] = None,
+            **kwargs) -> Dict[str, Any]:
+        """
+        Run fn(**kwargs) on a worker and return its result dict.
+
+        Raises WorkerTaskError if the task failed, and
+        concurrent.futures.TimeoutError if it ran longer than `timeout`
+        seconds.  The clock starts when a worker picks the task up, not while
+        it waits in the queue.  An overrunning task is interrupted inside its
+        worker, which then takes the next task; if it does not stop within
+        KILL_GRACE_S (e.g. stuck in native code) the worker is killed and the
+        executor replaced.
+        """
+        executor = self._get_executor()
+        started = self._started
+        if timeout is None:
+            future = self.submit(fn, **kwargs)
+        else:
+            token = uuid.uuid4().hex
+            future = self._submit(_call, fn, kwargs, timeout, token)
+        try:
+            if timeout is None:
+                return future.result()
+            return self._wait(executor, future, timeout, started, token)
+        except WorkerTaskError as e:
+            if e.exc_type == "TaskTimeout":
+                raise FuturesTimeoutError(e.message) from None
+            raise
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise WorkerTaskError("BrokenProcessPool",
+                                  "worker process died while running the task")
+        finally:
+            if timeout is not None:
+                self._discard(started, token)
+
+    def _wait(self, executor: ProcessPoolExecutor, future: Future, timeout: float,
+              started: Dict, token: str) -> Dict[str, Any]:
+        """future.result(), killing the worker if the task ignores its time limit."""
+        while True:
+            try:
+                return future.result(timeout=WATCHDOG_INTERVAL_S)
+            except FuturesTimeoutError:
+                try:
+                    entry = started.get(token)
+                except _MANAGER_GONE:
+                    continue  # pool shut down; the task still finishes or fails
+                if entry is None:
+                    continue  # still queued
+                pid, t_start = entry
+                if time.time() - t_start > timeout + KILL_GRACE_S:
+                    self._kill_worker(executor, pid)
+                    future.cancel()
+                    raise FuturesTimeoutError(
+                        f"task did not finish within {timeout:g}s; worker {pid} killed") from None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+            # Their proxies die with the manager
+            self._cancelled = self._started = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> WorkerPool:
+    """The process-wide WorkerPool (created on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool